@@ -0,0 +1,93 @@
+"""
+This script benchmarks the ``merge_scores`` manipulation on many replicate
+signal tracks, where every track covers most of the chromosome so that
+almost every track covers every segment. The current implementation, a
+sweep over the boundaries of all tracks, is compared with the previous
+one, which looked at the current feature of every track at each step.
+Both must produce exactly the same features.
+
+In the current implementation finding the next boundary costs a time
+logarithmic in the number of tracks, but summing the scores of a segment
+is still linear in the number of tracks covering it. The scores are
+summed in the order of the tracks so that the results do not change.
+
+Use it like this::
+
+    $ python dev/benchmarks/merge_scores.py
+    $ python dev/benchmarks/merge_scores.py 50 100 200 400
+"""
+
+# Built-in modules #
+import sys, time, random
+
+# Internal modules #
+from track import common
+from track.manips import merge_scores
+
+################################################################################
+def previous_generate(n_tracks, geometric=False):
+    """The implementation scanning every track, kept for comparison."""
+    sentinel = (sys.maxint, sys.maxint, 0.0)
+    tracks = [common.sentinelize(x, sentinel) for x in n_tracks]
+    elements = [x.next() for x in tracks]
+    tracks_denom = 1.0/len(tracks)
+    if geometric: mean_fn = lambda x: sum(x)**tracks_denom
+    else:         mean_fn = lambda x: sum(x)*tracks_denom
+    for i in xrange(len(tracks)-1, -1, -1):
+        if elements[i] == sentinel:
+            tracks.pop(i)
+            elements.pop(i)
+    while tracks:
+        start = min([x[0] for x in elements])
+        end = min([x[0] for x in elements if x[0] > start] + [x[1] for x in elements])
+        scores = [x[2] for x in elements if x[1] > start and x[0] < end]
+        if scores: yield (start, end, mean_fn(scores))
+        for i in xrange(len(tracks)-1, -1, -1):
+            if elements[i][0] < end:
+                elements[i] = (end, elements[i][1], elements[i][2])
+            if elements[i][1] <= end:
+                elements[i] = tracks[i].next()
+            if elements[i] == sentinel:
+                tracks.pop(i)
+                elements.pop(i)
+
+def signal(count, length, seed):
+    """Makes *count* consecutive features of random lengths up to *length*, with a few gaps."""
+    generator = random.Random(seed)
+    features, start = [], 0
+    for i in xrange(count):
+        if generator.random() < 0.05: start += generator.randint(1, length)
+        end = start + generator.randint(1, length)
+        features.append((start, end, generator.random() * 100))
+        start = end
+    return features
+
+def measure(function, tracks, repeat=3):
+    """Returns the best time out of *repeat* runs and the result."""
+    times = []
+    for i in xrange(repeat):
+        start = time.time()
+        result = list(function([iter(t) for t in tracks]))
+        times.append(time.time() - start)
+    return min(times), result
+
+################################################################################
+def run(sizes=(50, 100, 200, 400), count=200, length=50):
+    print "%8s %8s %12s %12s %8s" % ('tracks', 'segments', 'previous (s)', 'current (s)', 'speedup')
+    for size in sizes:
+        tracks = [signal(count, length, seed) for seed in xrange(size)]
+        previous_time, previous_result = measure(previous_generate,       tracks)
+        current_time,  current_result  = measure(merge_scores.generate,   tracks)
+        if previous_result != current_result: raise Exception("The outputs differ for %i tracks." % size)
+        print "%8i %8i %12.3f %12.3f %7.1fx" % (size, len(current_result), previous_time, current_time, previous_time / max(current_time, 1e-9))
+
+if __name__ == '__main__':
+    sizes = map(int, sys.argv[1:]) or (50, 100, 200, 400)
+    print "Replicate tracks of 200 features up to 50 bp long:"
+    run(sizes)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
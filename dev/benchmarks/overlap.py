@@ -0,0 +1,90 @@
+"""
+This script benchmarks the ``overlap`` manipulation on dense inputs, where
+many long features overlap each other, such as gene bodies against broad
+histone domains, and on sparse inputs. The current implementation, which
+only rebuilds a window when the smallest end it holds is left behind, is
+compared with the previous one, which rebuilt its windows with list
+comprehensions at every step. Both must produce exactly the same features
+in the same order. Most of the time is spent making the output features,
+so the difference is small on both kinds of inputs.
+
+Use it like this::
+
+    $ python dev/benchmarks/overlap.py
+    $ python dev/benchmarks/overlap.py 1000 2000 4000 8000
+
+The sparse inputs are ten times larger than the dense ones.
+"""
+
+# Built-in modules #
+import sys, time, random
+
+# Internal modules #
+from track import common
+from track.manips import overlap
+
+################################################################################
+def previous_generate(X, Y, l):
+    """The implementation with list windows, kept for comparison."""
+    sentinel = (sys.maxint, sys.maxint)
+    X = common.sentinelize(X, sentinel)
+    Y = common.sentinelize(Y, sentinel)
+    x = X.next()
+    y = Y.next()
+    Wx = []
+    Wy = []
+    while x is not sentinel or y is not sentinel:
+        if x[0] < y[0]:
+            Wy = [f for f in Wy if f[1] > x[0]]
+            for f in [f for f in Wy if f[1] > x[0] and x[1] > f[0]]: yield overlap.make_feature(x, f)
+            if x[1] >= y[0]: Wx.append(x)
+            x = X.next()
+        else:
+            Wx = [f for f in Wx if f[1] > y[0]]
+            for f in [f for f in Wx if f[1] > y[0] and y[1] > f[0]]: yield overlap.make_feature(y, f)
+            if y[1] >= x[0]: Wy.append(y)
+            y = Y.next()
+
+def dense_features(count, length, spacing, seed):
+    """Makes *count* sorted features of random lengths up to *length*, starting every *spacing* bases on average.
+    With a long *length* and a short *spacing*, every feature overlaps many others."""
+    generator = random.Random(seed)
+    features, start = [], 0
+    for i in xrange(count):
+        start += generator.randint(0, 2 * spacing)
+        end = start + generator.randint(1, length)
+        features.append((start, end, 'F%i' % i, generator.random(), generator.choice((-1, 1))))
+    return features
+
+def measure(function, X, Y, repeat=5):
+    """Returns the best time out of *repeat* runs and the result."""
+    times = []
+    for i in xrange(repeat):
+        start = time.time()
+        result = list(function(iter(X), iter(Y), None))
+        times.append(time.time() - start)
+    return min(times), result
+
+################################################################################
+def run(sizes=(1000, 2000, 4000, 8000), length=20000, spacing=50):
+    print "%8s %8s %12s %12s %8s" % ('features', 'overlaps', 'previous (s)', 'current (s)', 'speedup')
+    for size in sizes:
+        X = dense_features(size, length, spacing, 1)
+        Y = dense_features(size, length, spacing, 2)
+        previous_time, previous_result = measure(previous_generate, X, Y)
+        current_time,  current_result  = measure(overlap.generate,  X, Y)
+        if previous_result != current_result: raise Exception("The outputs differ for %i features." % size)
+        print "%8i %8i %12.3f %12.3f %7.1fx" % (size, len(current_result), previous_time, current_time, previous_time / max(current_time, 1e-9))
+
+if __name__ == '__main__':
+    sizes = map(int, sys.argv[1:]) or (1000, 2000, 4000, 8000)
+    print "Dense features, up to 20 kb long, every 50 bp on average:"
+    run(sizes, 20000, 50)
+    print "Sparse features, up to 100 bp long, every 50 bp on average:"
+    run([size * 10 for size in sizes], 100, 50)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
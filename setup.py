@@ -25,4 +25,5 @@ setup(
         ext_modules      = [Extension('track.pyrow', ['src/pyrow.c'])],
         scripts          = ['track/track'],
         install_requires = ['genomes'],
+        extras_require   = {'numpy': ['numpy'], 'arrow': ['pyarrow']},
     )
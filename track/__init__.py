@@ -6,25 +6,27 @@ __version_info__ = ('1', '3', '0')
 __version__ = '.'.join(__version_info__)
 __version__ += '-dev' if not RELEASE else ''
 
-__all__ = ['load', 'new', 'convert']
+__all__ = ['load', 'new', 'convert', 'sort']
 
 # Other variables #
-formats = ('sql', 'bed', 'wig', 'gff', 'gtf', 'bedgraph', 'bigwig', 'gzip', 'sga')
+formats = ('sql', 'bed', 'wig', 'gff', 'gtf', 'bedgraph', 'bigwig', 'gzip', 'sga', 'columns', 'arrow', 'parquet')
 
 # Built-in modules #
-import os, re, sqlite3
-from itertools import imap
+import os, re, json, shutil, sqlite3
+from itertools import imap, count
 
 # Internal modules #
 from track.parse import get_parser
-from track.serialize import get_serializer
+from track.serialize import get_serializer, PipelinedSerializer, SerializerTee
+from track.sorting import SortingSerializer
 from track.util import determine_format, join_read_queries, make_cond_from_sel, parse_chr_file
 from track.util import sql_field_types, py_field_types, serialize_chr_file
-from track.util import gzip_inner_format
+from track.util import gzip_inner_format, AttributeRow
 from track.common import check_path, check_file, empty_file, empty_sql_file, temporary_path
 from track.common import JournaledDict, natural_sort, int_to_roman, roman_to_int
 from track.common import Color, pick_iterator_elements, get_next_item, is_gzip
 from track.common import if_url_then_get_url
+from track.blocks import block_fields, make_blocks, decode_block
 
 # Compiled modules #
 from track.pyrow import SuperRow
@@ -33,7 +35,11 @@ from track.pyrow import SuperRow
 from genomes import Assembly
 
 # Constants #
-special_tables = ('attributes', 'chrNames', 'types')
+special_tables = ('attributes', 'chrNames', 'types', 'statistics')
+layouts = ('rowid', 'clustered', 'blocks')
+sequence_field = '_seq'
+block_columns = ('_start', '_end', '_count', '_data')
+encodable_fields = ('name', 'source', 'feature', 'item_rgb', 'attributes')
 minimum_fields = ('start', 'end')
 default_fields = ('start', 'end', 'name', 'score', 'strand')
 signal_fields = ('start', 'end', 'score')
@@ -41,7 +47,7 @@ feature_fields = ('start', 'end', 'name', 'score', 'strand', 'attributes')
 relational_fields = ('start', 'end', 'name', 'score', 'strand', 'attributes', 'group', 'id')
 
 ################################################################################
-def load(path, format=None, readonly=False):
+def load(path, format=None, readonly=False, **kwargs):
     """Loads a track from disk, whatever the format is.
 
        :param path: is the path to track file to load or an URL. If the path is an URL, the file will be downloaded automatically. If the path is a GZIP file, it will be decompressed automatically.
@@ -52,6 +58,8 @@ def load(path, format=None, readonly=False):
        :type  readonly: bool
        :returns: a Track instance
 
+       Any other keyword arguments are passed on to `convert` when the track needs to be converted. For instance, ``sort=True`` makes sure the features of an unsorted text file are stored in order. Such options raise an exception for a track that is already in SQL.
+
        ::
 
             import track
@@ -73,10 +81,13 @@ def load(path, format=None, readonly=False):
     # If sql, just make a track with the path #
     # Otherwise we need to convert the file #
     if format == 'sql':
+        options = sorted(k for k, v in kwargs.items() if v)
+        if 'sort' in options: raise Exception("The track '%s' is already in SQL and is not sorted when loaded, use 'track.sort' to sort it." % path)
+        if options: raise Exception("The options %s only apply to tracks that need to be converted, '%s' is already in SQL." % (options, path))
         return Track(path, readonly)
     else:
         sql_path = temporary_path(".sql") or os.path.splitext(path)[0] + ".sql"
-        convert(source=(path, format), destination=(sql_path, 'sql'))
+        convert(source=(path, format), destination=(sql_path, 'sql'), **kwargs)
         return Track(sql_path, readonly=readonly, orig_path=path, orig_format=format)
 
 #---------------------------------------------------------------------------------#
@@ -114,17 +125,27 @@ def new(path, format=None):
         return Track(sql_path, orig_path=path, orig_format=format)
 
 #---------------------------------------------------------------------------------#
-def convert(source, destination, assembly=None):
+def convert(source, destination, assembly=None, pipelined=False, sort=False, layout=None, encode=None, **kwargs):
     """Converts a track from one format to an other. The *source* file should have a different format from the *destination* file. If either the source or destination are missing a file extension, you can specify their formats using a tuple. See examples below.
 
        :param source: is the path to the original track to load.
        :type  source: string
-       :param destination: is the path to the track to be created.
-       :type  destination: string
+       :param destination: is the path to the track to be created. You can also give a list of destinations, in which case the source is parsed only once and written to every destination in the same pass.
+       :type  destination: string or list
        :param assembly: an optional compatible assembly name. Useful when the destination format needs to contain chromosome meta data and this is not available in the source file.
        :type  assembly: string
+       :param pipelined: if ``True``, the serializer runs in a separate thread and writes the features while the parser is still reading the source. This is useful when both sides are slow, for instance when parsing a large text file into an SQL track. With several destinations, every serializer gets its own thread.
+       :type  pipelined: bool
+       :param sort: if ``True``, the features of every chromosome are written sorted by start and end, whatever their order in the source. The sort is done externally, in runs of bounded size spilled to temporary files, so the source can be larger than the available memory.
+       :type  sort: bool
+       :param layout: the layout of the SQL tracks created, see *Track.layout*. Converting with ``sort=True`` makes writing to the ``clustered`` layout much faster.
+       :type  layout: string
+       :param encode: the text fields stored with dictionary encoding in the SQL tracks created, see *Track.encoded_fields*. If ``True``, the fields ``name``, ``source``, ``feature``, ``item_rgb`` and ``attributes`` are encoded.
+       :type  encode: list or bool
+
+       Any other keyword arguments are passed on to the parser of the source format. For instance, GTF files accept a ``schema`` option.
 
-       :returns: the path to the track created (or a list of track paths in the case of multi-track files).
+       :returns: the path to the track created (or a list of track paths in the case of multi-track files). When *destination* is a list, a list with one such result per destination is returned.
 
        ::
 
@@ -133,6 +154,12 @@ def convert(source, destination, assembly=None):
            track.convert('tracks/genes.sql', 'tracks/genes.bigWig', assembly='hg19')
            track.convert(('tracks/no_extension', 'gff'), 'tracks/genes.sql')
            track.convert(('tmp/4afb0edf', 'bed'), ('tmp/converted', 'wig'))
+           track.convert('tracks/ensembl.gtf', 'tracks/ensembl.sql', schema='line')
+           track.convert('tracks/reads.bed', 'tracks/reads.sql', pipelined=True)
+           track.convert('tracks/unsorted.bed', 'tracks/sorted.bed', sort=True)
+           track.convert('tracks/reads.bed', 'tracks/reads.sql', sort=True, layout='clustered')
+           track.convert('tracks/ensembl.gtf', 'tracks/ensembl.sql', encode=True)
+           track.convert('tracks/pol2.wig', ['tracks/pol2.sql', 'tracks/pol2.bedGraph', 'tracks/pol2.bigWig'], assembly='sacCer2')
     """
     # Parse the source parameter #
     if isinstance(source, tuple):
@@ -146,29 +173,81 @@ def convert(source, destination, assembly=None):
         else:
             source_format = determine_format(source_path)
     # Parse the destination parameter #
-    if isinstance(destination, tuple):
-        destination_path   = destination[0]
-        destination_format = destination[1]
-    else:
-        destination_path   = destination
-        destination_format = determine_format(destination_path)
-    # Check it is not taken #
-    check_path(destination_path)
+    many = isinstance(destination, list)
+    destinations = []
+    for dest in (destination if many else [destination]):
+        if isinstance(dest, tuple): destinations.append(dest)
+        else:                       destinations.append((dest, determine_format(dest)))
+    # Check they are not taken #
+    for path, format in destinations: check_path(path)
     # Special cases #
-    if destination_format == 'bigwig' and source_format != 'sql':
-        source_path = convert((source_path, source_format), temporary_path('.sql'), assembly)
-        source_format = 'sql'
+    deferred = []
+    if source_format != 'sql':
+        deferred = [(path, format) for path, format in destinations if format == 'bigwig']
+    if deferred:
+        destinations = [(path, format) for path, format in destinations if format != 'bigwig']
+        sql_paths = [path for path, format in destinations if format == 'sql']
+        if sql_paths: sql_path = sql_paths[0]
+        else:
+            sql_path = temporary_path('.sql')
+            destinations.append((sql_path, 'sql'))
     # Check it is not empty #
     check_file(source_path)
     # Get a parser #
-    parser = get_parser(source_path, source_format)
-    # Get a serializer #
-    serializer = get_serializer(destination_path, destination_format)
-    # Tell the serializer about the assembly #
-    if assembly: serializer.defineAssembly(assembly)
+    parser = get_parser(source_path, source_format, **kwargs)
+    # Get the serializers #
+    serializers = []
+    for path, format in destinations:
+        if format == 'sql' and (layout or encode):
+            if encode is True: encode = list(encodable_fields)
+            serializer = get_serializer(path, format, layout=layout, encode=encode)
+        else:
+            serializer = get_serializer(path, format)
+        # Tell the serializer about the assembly #
+        if assembly: serializer.defineAssembly(assembly)
+        # Sort before writing #
+        if sort: serializer = SortingSerializer(serializer)
+        # Write in an other thread #
+        if pipelined: serializer = PipelinedSerializer(serializer)
+        serializers.append(serializer)
+    # Parse once, write everywhere #
+    serializer = serializers[0] if len(serializers) == 1 else SerializerTee(serializers)
     # The serializer has a copy of the parser and vice-versa #
     serializer(parser)
-    return parser(serializer)
+    parser(serializer)
+    results = dict((path, s.tracks[0] if len(s.tracks) == 1 else s.tracks) for (path, format), s in zip(destinations, serializers))
+    # Convert the deferred destinations from the new SQL track #
+    for path, format in deferred: results[path] = convert((sql_path, 'sql'), (path, format), assembly)
+    # Return the results in the same order #
+    results = [results[dest[0] if isinstance(dest, tuple) else dest] for dest in (destination if many else [destination])]
+    return results if many else results[0]
+
+#---------------------------------------------------------------------------------#
+def sort(source, destination=None, **kwargs):
+    """Sorts the features of every chromosome of a track by start and end, using a bounded amount of memory. See the *sort* option of `convert`.
+
+       :param source: is the path to the track to sort.
+       :type  source: string
+       :param destination: is the path to the sorted track to be created. If omitted, the source is replaced by its sorted version.
+       :type  destination: string
+
+       Any other keyword arguments are passed on to `convert`.
+
+       :returns: the path to the sorted track.
+
+       ::
+
+           import track
+           track.sort('tracks/unsorted.bed', 'tracks/sorted.sql')
+           track.sort('tracks/unsorted.bed')
+    """
+    if destination: return convert(source, destination, sort=True, **kwargs)
+    # Sort in place #
+    path, format = source if isinstance(source, tuple) else (source, determine_format(source))
+    sorted_path = temporary_path('.' + format)
+    convert((path, format), (sorted_path, format), sort=True, **kwargs)
+    shutil.move(sorted_path, path)
+    return path
 
 ################################################################################
 class Track(object):
@@ -197,6 +276,12 @@ class Track(object):
         self._fields   = []
         self._chrmeta  = JournaledDict()
         self._info     = JournaledDict()
+        self._stats    = {}
+        self._stale    = set()
+        self._stats_modified = False
+        self._sequence = {}
+        self._layouts = {}
+        self._codes    = {}
         # Opening the database #
         self._connection = sqlite3.connect(self.path)
         self._connection.row_factory = SuperRow
@@ -208,6 +293,7 @@ class Track(object):
         # Load some tables #
         self._chrmeta_read()
         self._info_read()
+        self._stats_read()
 
     def __enter__(self):
         """Called when entering the 'with' statement."""
@@ -289,6 +375,12 @@ class Track(object):
 
     def _get_fields_of_table(self, chrom):
         """Return the list of fields for a particular table by querying the SQL for the complete list of column names"""
+        columns = self._get_columns_of_table(chrom)
+        if '_data' in columns: return list(block_fields)
+        return [f for f in columns if f != sequence_field]
+
+    def _get_columns_of_table(self, chrom):
+        """Return the list of columns of a table, including the hidden ones of the clustered and blocks layouts"""
         # Check the table exists #
         if not chrom in self.tables: return []
         # A pragma statement will implicitly issue a commit, don't use #
@@ -297,6 +389,86 @@ class Track(object):
         self._cursor.fetchall()
         return fields
 
+    def _table_layout(self, chrom):
+        """Return the layout with which the table of that chromosome is stored"""
+        if chrom not in self._layouts:
+            columns = self._get_columns_of_table(chrom)
+            if   sequence_field in columns: self._layouts[chrom] = 'clustered'
+            elif '_data' in columns:        self._layouts[chrom] = 'blocks'
+            else:                           self._layouts[chrom] = 'rowid'
+        return self._layouts[chrom]
+
+    def _is_clustered(self, chrom):
+        """Is the table of that chromosome stored with the clustered layout"""
+        return self._table_layout(chrom) == 'clustered'
+
+    def _is_blocked(self, chrom):
+        """Is the table of that chromosome stored with the blocks layout"""
+        return self._table_layout(chrom) == 'blocks'
+
+    def _table_schema(self, fields, layout=None):
+        """Return the column definitions and table options for a new chromosome table with the given fields"""
+        if layout is None: layout = self.layout
+        # Only signal can be stored in blocks #
+        if layout == 'blocks' and set(fields) == set(block_fields):
+            return ','.join(['"_start" integer', '"_end" integer', '"_count" integer', '"_data" blob']), ''
+        columns = ['"' + f + '"' + ' ' + self._sql_type(f) for f in fields]
+        if layout != 'clustered' or 'start' not in fields or 'end' not in fields: return ','.join(columns), ''
+        # Features are stored in order, ties are kept in the order they were written #
+        columns += ['"%s" integer' % sequence_field, 'PRIMARY KEY ("start","end","%s")' % sequence_field]
+        return ','.join(columns), ' WITHOUT ROWID'
+
+    def _sql_type(self, field):
+        """Return the SQL type of the column storing a field, dictionary encoded fields are stored as integer codes"""
+        if field in self.encoded_fields: return 'integer'
+        return sql_field_types.get(field, 'text')
+
+    def _select_field(self, chrom, field):
+        """Return the SQL expression reading a field from the table of a chromosome, decoding it if needed with the joins of *_decode_joins*"""
+        if field not in self.encoded_fields: return '"' + field + '"'
+        return '"_%s_types"."value" AS "%s"' % (field, field)
+
+    def _decode_joins(self, chrom, fields):
+        """Return the joins on the 'types' table that decode the encoded fields among *fields* in the table of a chromosome"""
+        join = ' LEFT JOIN "types" AS "_%(f)s_types" ON "_%(f)s_types"."field"=\'%(f)s\' AND "_%(f)s_types"."code"="%(c)s"."%(f)s"'
+        return ''.join([join % {'f': f, 'c': chrom} for f in fields if f in self.encoded_fields])
+
+    def _get_codes(self, field):
+        """Return the dictionary mapping the values of an encoded field to their integer codes, as found in the 'types' table"""
+        if field not in self._codes:
+            if 'types' in self.tables:
+                query = self._cursor.execute('SELECT "value", "code" from "types" WHERE "field"=?', (field,))
+                self._codes[field] = dict(query.fetchall())
+            else:
+                self._codes[field] = {}
+        return self._codes[field]
+
+    def _encoder(self, field):
+        """Return a function that gives the code of a value, adding the new values to the 'types' table"""
+        codes = self._get_codes(field)
+        cursor = self._connection.cursor()
+        cursor.execute('CREATE table if not exists "types" ("field" text, "code" integer, "value" text, PRIMARY KEY ("field","code"))')
+        def encode(value):
+            if value is None: return None
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+                cursor.execute('INSERT into "types" ("field","code","value") values (?,?,?)', (field, code, value))
+            return code
+        return encode
+
+    def _encode_features(self, data, fields):
+        """Replace the values of encoded fields by their codes in an iterable of features"""
+        encoders = [f in self.encoded_fields and self._encoder(f) for f in fields]
+        return (tuple(e(v) if e else v for e, v in zip(encoders, f)) for f in data)
+
+    def _next_sequence(self, chrom):
+        """Return a counter yielding the tiebreak values of the next features written to a clustered table"""
+        if chrom not in self._sequence:
+            query = "SELECT coalesce(max(\"%s\") + 1, 0) FROM '%s'" % (sequence_field, chrom)
+            self._sequence[chrom] = count(self._cursor.execute(query).fetchone()[0])
+        return self._sequence[chrom]
+
     #-----------------------------------------------------------------------------#
     def cursor(self):
         """Create a new sqlite3 cursor object connected to the track database. You can use this attribute to make your own SQL queries and fetch the results. More information is available on the `sqlite3 documentation pages <http://docs.python.org/library/sqlite3.html>`_.
@@ -328,37 +500,53 @@ class Track(object):
                t.remove('chr19_gl000209_random')
                t.save()
         """
-        if self._info.modified:    self._info_write()
-        if self._chrmeta.modified: self._chrmeta_write()
+        if self._chrmeta.modified:
+            self._chrmeta_write()
+            self._chrmeta.modified = False
         self._make_missing_tables()
         self._make_missing_indexes()
+        if self._stale:            self._stats_update()
+        if self._stats_modified:
+            self._stats_write()
+            self._stats_modified = False
+        if self._info.modified:
+            self._info_write()
+            self._info.modified = False
         self._connection.commit()
 
     def _make_missing_indexes(self):
         """For every chromosomes present in the track, will create an index on the following fields if they exist:
-                * start, end --> chr1_range_idx
+                * start, end --> chr1_range_idx (not needed with the clustered layout, on the blocks with the blocks layout)
                 * score      --> chr1_score_idx
                 * name       --> chr1_name_idx
+           As well as on every field listed in the *indexed_fields* attribute:
+                * gene_id    --> chr1_gene_id_idx
         """
         if self.readonly: return
         try:
             for ch in self:
-                if 'start' in self._get_fields_of_table(ch):
+                if self._is_blocked(ch):
+                    self._cursor.execute("CREATE INDEX if not exists '" + ch + "_range_idx' on '" + ch + "' (_start,_end)")
+                    continue
+                if 'start' in self._get_fields_of_table(ch) and not self._is_clustered(ch):
                     self._cursor.execute("CREATE INDEX if not exists '" + ch + "_range_idx' on '" + ch + "' (start,end)")
                 if 'score' in self._get_fields_of_table(ch):
                     self._cursor.execute("CREATE INDEX if not exists '" + ch + "_score_idx' on '" + ch + "' (score)")
                 if 'name' in self._get_fields_of_table(ch):
                     self._cursor.execute("CREATE INDEX if not exists '" + ch + "_name_idx' on '" + ch + "' (name)")
+                for f in self.indexed_fields:
+                    if f not in self._get_fields_of_table(ch): continue
+                    self._cursor.execute("CREATE INDEX if not exists '" + ch + "_" + f + "_idx' on '" + ch + "' (\"" + f + "\")")
         except sqlite3.OperationalError as err:
             message = "The index creation on the track '%s' failed with the following error: %s"
             raise Exception(message % (self.path, err))
 
     def _make_missing_tables(self):
         """Make sure every chromosome referenced in the 'chrNames' table exists as a table in the database. Will create empty tables."""
-        fields = self.fields or minimum_fields
-        fields = ','.join(['"' + f + '"' + ' ' + sql_field_types.get(f, 'text') for f in fields])
+        columns, options = self._table_schema(self.fields or minimum_fields)
         for chrom_name in sorted(self.chrmeta, key=natural_sort):
-            self._cursor.execute('CREATE table if not exists "' + chrom_name + '" (' + fields + ')')
+            self._cursor.execute('CREATE table if not exists "' + chrom_name + '" (' + columns + ')' + options)
+        self._layouts.clear()
 
     #-----------------------------------------------------------------------------#
     def rollback(self):
@@ -375,6 +563,7 @@ class Track(object):
                t.rollback()
         """
         self._connection.rollback()
+        self._codes.clear()
 
     #-----------------------------------------------------------------------------#
     def vacuum(self):
@@ -454,7 +643,7 @@ class Track(object):
         :param selection: A chromosome name, or a dictionary specifying a region, see below.
         :param fields: is an optional list of fields which will influence the length of the tuples returned and the way in which the information is returned. The default is to read every field available for the given chromosome. If the *track.fields* attribute is set, that will be used.
         :type  fields: list of strings
-        :param order: is an optional sublist of *fields* which will influence the order in which the tuples are yielded. By default results are not sorted.
+        :param order: is an optional sublist of *fields* which will influence the order in which the tuples are yielded. By default results are not sorted. Ordering a whole chromosome by ``start`` costs nothing when the chromosome is known to be stored sorted, see *stats*.
         :type  order: comma-separated string
 
         :returns: a generator object yielding rows. A row can be referenced like a tuple or like a dictionary.
@@ -500,21 +689,40 @@ class Track(object):
         else: raise TypeError, 'The following selection parameter: "' + selection + '" was not understood.'
         # Empty chromosome case #
         if chrom not in self.chromosomes: return ()
+        # Nothing can match according to the statistics #
+        if where and self._outside_stats(selection): return ()
+        # Signal stored in blocks #
+        if self._is_blocked(chrom):
+            return self._read_blocks(chrom, selection if isinstance(selection, dict) else {}, fields or self._fields, order)
         ##### FIELDS #####
-        if not fields and not self._fields: query_fields = "*"
+        # Columns names in the table #
+        available_fields = self._get_fields_of_table(chrom)
+        if not fields and not self._fields:
+            selected_fields = available_fields
+            if self._is_clustered(chrom) or set(available_fields) & set(self.encoded_fields):
+                query_fields = ','.join([self._select_field(chrom, f) for f in available_fields])
+            else:
+                query_fields = "*"
         else:
-            # Columns names in the table #
-            available_fields = self._get_fields_of_table(chrom)
             # Fields attribute is set or not #
-            query_fields = ','.join([f in available_fields and f or py_field_types.get(f, str)().__repr__() for f in fields and fields or self._fields])
+            selected_fields = [f for f in fields and fields or self._fields if f in available_fields]
+            query_fields = ','.join([f in available_fields and self._select_field(chrom, f) or py_field_types.get(f, str)().__repr__() for f in fields and fields or self._fields])
         ##### QUERY #####
-        sql_command = "SELECT " + query_fields + " from '" + chrom + "'"
+        sql_command = "SELECT " + query_fields + " from '" + chrom + "'" + self._decode_joins(chrom, selected_fields)
         # Add the where case #
         if where: sql_command += where
+        # Clustered tables are read in the order of their key, other indexes could be chosen otherwise #
+        if self._is_clustered(chrom) and (not order or order.replace(' ', '') in ('start', 'start,end')):
+            sql_command += ' order by start, end, "' + sequence_field + '"'
+        # A table already in that order is read in the order of its rows, whatever index is scanned #
+        elif order and not where and order.replace(' ', '') in ('start', 'start,end') and self.is_sorted(chrom):
+            sql_command += ' order by "' + chrom + '".rowid'
         # Sorting results #
-        if order: sql_command += ' order by ' + order
+        elif order:
+            sql_command += ' order by ' + order
         # Make a new cursor #
         cursor = self.cursor()
+        if 'attributes' in selected_fields: cursor.row_factory = AttributeRow
         ##### ERROR CATCHING #####
         try:
             cursor.execute(sql_command)
@@ -555,6 +763,7 @@ class Track(object):
         # Check track attributes #
         if self.readonly: return
         self._modified = True
+        self._make_stale(chromosome)
         # Check what the data generator yields #
         if isinstance(data, FeatureStream) and data.kind == SuperRow: data.generator = imap(tuple,data)
         # Guess the fields we are getting #
@@ -576,19 +785,29 @@ class Track(object):
         current_set  = set(current_fields)
         # Maybe we need to create the table #
         if not chrom_exists:
-            fields = ','.join(['"' + field + '"' + ' ' + sql_field_types.get(field, 'text') for field in outgoing_fields])
-            self._write_cursor.execute('CREATE table "' + chromosome + '" (' + fields + ')')
+            columns, options = self._table_schema(outgoing_fields)
+            self._write_cursor.execute('CREATE table "' + chromosome + '" (' + columns + ')' + options)
+            self._layouts.pop(chromosome, None)
             current_fields = outgoing_fields
+        # Signal stored in blocks #
+        elif self._is_blocked(chromosome): pass
         # Or maybe we need to create new columns #
         else:
             for field in outgoing_set - current_set:
-                self._write_cursor.execute('ALTER table "' + chromosome + '" ADD "' + field + '" ' + sql_field_types.get(field, 'text'))
+                self._write_cursor.execute('ALTER table "' + chromosome + '" ADD "' + field + '" ' + self._sql_type(field))
+        if self._is_blocked(chromosome): return self._write_blocks(chromosome, data, incoming_fields)
         # Adjust size #
         if outgoing_set > incoming_set:
             outgoing_fields = incoming_fields
         if outgoing_set < incoming_set:
             indicies = tuple([incoming_fields.index(f) for f in outgoing_fields])
             data = pick_iterator_elements(data, indicies)
+        # Text columns stored as dictionary codes #
+        if set(outgoing_fields) & set(self.encoded_fields): data = self._encode_features(data, outgoing_fields)
+        # Clustered tables need a tiebreak for every feature #
+        if self._is_clustered(chromosome):
+            data = imap(lambda f, i: tuple(f) + (i,), data, self._next_sequence(chromosome))
+            outgoing_fields = list(outgoing_fields) + [sequence_field]
         # Protect names for SQL query #
         outgoing_fields = ['"' + f + '"' for f in outgoing_fields]
         question_marks = '(' + ','.join(['?' for x in xrange(len(outgoing_fields))]) + ')'
@@ -605,6 +824,72 @@ class Track(object):
             message3 = message3 % (Color.b_ylw, Color.end, get_next_item(data))
             raise Exception(message1 + message2 + message3)
 
+    def _write_blocks(self, chromosome, data, fields):
+        """Encode features in blocks and write them to a chromosome stored with the blocks layout."""
+        if not set(block_fields) <= set(fields):
+            raise Exception("The chromosome '%s' is stored in blocks and needs the fields %s, not %s." % (chromosome, block_fields, fields))
+        s, e, v = [list(fields).index(f) for f in block_fields]
+        def features():
+            for f in data:
+                if f[v] is None: raise Exception("The chromosome '%s' is stored in blocks and every feature needs a score, not %s." % (chromosome, tuple(f)))
+                yield f[s], f[e], f[v]
+        sql_command = 'INSERT into "' + chromosome + '" (' + ','.join(block_columns) + ') values (?,?,?,?)'
+        self._write_cursor.executemany(sql_command, make_blocks(features()))
+
+    def _read_blocks(self, chrom, selection, fields, order):
+        """Decode the blocks of a chromosome stored with the blocks layout. Only the blocks overlapping the selection are read."""
+        # Which blocks #
+        conditions = []
+        if 'start' in selection: conditions.append('_end > %i' % selection['start'])
+        if 'end'   in selection: conditions.append('_start < %i' % selection['end'])
+        where = conditions and ' WHERE ' + ' AND '.join(conditions) or ''
+        sql_command = "SELECT _data from '" + chrom + "'" + where + ' order by _start'
+        # Which features #
+        strict = selection.get('inclusion') == 'strict'
+        conditions = []
+        if 'start' in selection:
+            conditions.append(lambda f, x=selection['start']: f[1] > x)
+            if strict: conditions.append(lambda f, x=selection['start']: f[0] >= x)
+        if 'end' in selection:
+            conditions.append(lambda f, x=selection['end']: f[0] < x)
+            if strict: conditions.append(lambda f, x=selection['end']: f[1] <= x)
+        if 'score' in selection:
+            if not isinstance(selection['score'], tuple): raise Exception("Score intervals must be tuples of size 2")
+            conditions.append(lambda f, x=selection['score']: x[0] <= f[2] <= x[1])
+        if 'strand' in selection: raise Exception("The chromosome '%s' is stored in blocks and has no strand." % chrom)
+        # Which columns #
+        fields = fields or list(block_fields)
+        columns = [(block_fields.index(f), None) if f in block_fields else (None, py_field_types.get(f, str)()) for f in fields]
+        project = lambda f: tuple(f[i] if i is not None else default for i, default in columns)
+        # Which order #
+        order = [o.strip() for o in order.split(',') if o.strip()] if order else []
+        if not order: key = None
+        elif order[:2] in (['start'], ['start', 'end']) and self._blocks_sorted(chrom, where): key = None
+        elif order[:2] in (['start'], ['start', 'end']): key = lambda f: f[:2]
+        elif set(order) <= set(block_fields): key = lambda f: [f[block_fields.index(o)] for o in order]
+        else: raise Exception("The chromosome '%s' is stored in blocks and cannot be sorted on %s." % (chrom, order))
+        cursor = self.cursor()
+        cursor.execute(sql_command)
+        def generator():
+            features = (f for (data,) in cursor for f in decode_block(data))
+            if conditions: features = (f for f in features if all(c(f) for c in conditions))
+            if key:        features = sorted(features, key=key)
+            for f in features: yield project(f)
+        return FeatureStream(generator(), fields, kind=tuple)
+
+    def _blocks_sorted(self, chrom, where=''):
+        """Are the blocks of a chromosome in order, as recorded in its statistics when the track was saved. Only chromosomes modified since then are checked again."""
+        if self.stats(chrom): return self.is_sorted(chrom)
+        return self._blocks_in_order(chrom, where)
+
+    def _blocks_in_order(self, chrom, where=''):
+        """Features are only sorted within a block. Blocks that were written out of order are detected by a start lying before the end of a previous block."""
+        last_end = None
+        for start, end in self.cursor().execute("SELECT _start, _end from '" + chrom + "'" + where + ' order by _start'):
+            if last_end is not None and start < last_end: return False
+            last_end = max(last_end, end)
+        return True
+
     #-----------------------------------------------------------------------------#
     def insert(self, chromosome, feature):
         """Insert one feature into an existing chromosome.
@@ -622,6 +907,16 @@ class Track(object):
             with track.load('tracks/example.sql') as t:
                 t.insert('chr1', (10, 20, 'A')
         """
+        if self._is_blocked(chromosome): return self.write(chromosome, [feature], list(block_fields))
+        self._make_stale(chromosome)
+        if self.encoded_fields:
+            feature = self._encode_features([feature], self._get_fields_of_table(chromosome)[:len(feature)]).next()
+        if self._is_clustered(chromosome):
+            fields = ','.join(['"' + f + '"' for f in self._get_fields_of_table(chromosome)[:len(feature)] + [sequence_field]])
+            feature = tuple(feature) + (self._next_sequence(chromosome).next(),)
+            question_marks = '(' + ','.join(['?' for x in xrange(len(feature))]) + ')'
+            self._write_cursor.execute('insert into "' + chromosome + '" (' + fields + ') values ' + question_marks, feature)
+            return
         question_marks = '(' + ','.join(['?' for x in xrange(len(feature))]) + ')'
         self._write_cursor.execute('insert into "' + chromosome + '" values ' + question_marks, feature)
 
@@ -650,7 +945,10 @@ class Track(object):
             for x in chromosome: self.remove(x)
         else:
             self._cursor.execute("DROP table '" + chromosome + "'")
+            self._layouts.pop(chromosome, None)
+            self._sequence.pop(chromosome, None)
             if chromosome in self.chrmeta: self.chrmeta.pop(chromosome)
+            self._make_stale(chromosome)
 
     #-----------------------------------------------------------------------------#
     def delete_fields(self, fields):
@@ -673,7 +971,7 @@ class Track(object):
         self._modified = True
         if self.readonly: return
         # SQLite doesn't support dropping columns directly #
-        sql_script = '''CREATE TABLE "%(chrom)s_tmp" (%(types)s);
+        sql_script = '''CREATE TABLE "%(chrom)s_tmp" (%(types)s)%(options)s;
         INSERT INTO "%(chrom)s_tmp" SELECT %(names)s FROM "%(chrom)s";
         DROP TABLE "%(chrom)s";
         ALTER TABLE "%(chrom)s_tmp" RENAME TO "%(chrom)s";'''
@@ -682,6 +980,7 @@ class Track(object):
             current_fields = self._get_fields_of_table(chrom)
             # Should anything change ? #
             if not set(fields) & set(current_fields): continue
+            self._make_stale(chrom)
             # What will be the fields now ? #
             new_fields = [f for f in current_fields if f not in fields]
             # Do we have anything left ? #
@@ -689,9 +988,11 @@ class Track(object):
                 self.remove(chrom)
                 return
             # Drop all the columns #
+            if self._is_blocked(chrom): raise Exception("The chromosome '%s' is stored in blocks, its fields cannot be changed." % chrom)
+            types, options = self._table_schema(new_fields, self._table_layout(chrom))
+            if options: new_fields = new_fields + [sequence_field]
             names = ','.join(['"' + f + '"' for f in new_fields])
-            types = ','.join(['"' + f + '"' + ' ' + sql_field_types.get(f, 'text') for f in new_fields])
-            custom_sql_script = sql_script % dict(chrom=chrom, names=names, types=types)
+            custom_sql_script = sql_script % dict(chrom=chrom, names=names, types=types, options=options)
             self._cursor.executescript(custom_sql_script)
 
     #-----------------------------------------------------------------------------#
@@ -732,14 +1033,25 @@ class Track(object):
             message = "The command <%s%s%s> on the track '%s' failed with error:\n %s%s%s"
             message = message % (Color.cyn, command, Color.end, self.path, Color.u_red, err, Color.end)
             raise Exception(message)
+        for cache in (self._layouts, self._sequence):
+            if previous_name in cache: cache[new_name] = cache.pop(previous_name)
         # Drop indexes #
         self._cursor.execute("drop index IF EXISTS '" + previous_name + "_range_idx'")
         self._cursor.execute("drop index IF EXISTS '" + previous_name + "_score_idx'")
         self._cursor.execute("drop index IF EXISTS '" + previous_name + "_name_idx'")
+        for f in self.indexed_fields:
+            self._cursor.execute("drop index IF EXISTS '" + previous_name + "_" + f + "_idx'")
         # Rename the chrmeta #
         if previous_name in self.chrmeta:
             self.chrmeta[new_name] = self.chrmeta[previous_name]
             self.chrmeta.pop(previous_name)
+        # Keep the statistics #
+        if previous_name in self._stats:
+            self._stats[new_name] = self._stats.pop(previous_name)
+            self._stats_modified = True
+        else:
+            self._make_stale(new_name)
+        self._stale.discard(previous_name)
 
     #-----------------------------------------------------------------------------#
     def search(self, query_dict, fields=None, chromosome=None, exact_match=False):
@@ -769,12 +1081,21 @@ class Track(object):
             fields = self.fields
         # Generate condition #
         for k,v in query_dict.items():
-            if exact_match: conditions.append(' %s = "%s" ' % (k,v))
-            else:           conditions.append(' %s like "%%%s%%" ' % (k,v))
+            # Encoded fields are compared on their codes #
+            if k in self.encoded_fields:
+                if exact_match:
+                    code = self._get_codes(k).get(v)
+                    conditions.append(' 0 ' if code is None else ' %s = %i ' % (k,code))
+                else:
+                    conditions.append(' %s IN (SELECT "code" FROM "types" WHERE "field"=\'%s\' AND "value" like "%%%s%%") ' % (k,k,v))
+            elif exact_match: conditions.append(' %s = "%s" ' % (k,v))
+            else:             conditions.append(' %s like "%%%s%%" ' % (k,v))
         where = ' WHERE ' + ' AND '.join(conditions)
+        select = lambda chrom: ', '.join([f in self.encoded_fields and self._select_field(chrom, f) or f for f in fields])
+        source = lambda chrom: ' from "%s"' % chrom + self._decode_joins(chrom, fields)
         # Iterate on chromosomes #
-        if chromosome: query_str = 'SELECT ' + ', '.join(fields) + ' from "%s"' % chromosome + where
-        else:          query_str = ' UNION '.join(['SELECT "%s",' % chrom + ', '.join(fields) + ' from "%s"' % chrom + where for chrom in self])
+        if chromosome: query_str = 'SELECT ' + select(chromosome) + source(chromosome) + where
+        else:          query_str = ' UNION '.join(['SELECT "%s",' % chrom + select(chrom) + source(chrom) + where for chrom in self])
         # Execute it #
         cursor = self.cursor()
         return cursor.execute(query_str)
@@ -826,12 +1147,16 @@ class Track(object):
         # Case chromosome name #
         elif isinstance(selection, basestring):
             if selection not in self.chromosomes: return 0
-            sql_request = "select COUNT(*) from '" + selection + "'"
+            if 'count' in self.stats(selection): return self.stats(selection)['count']
+            if self._is_blocked(selection): sql_request = "select coalesce(sum(_count), 0) from '" + selection + "'"
+            else:                           sql_request = "select COUNT(*) from '" + selection + "'"
         # Case span dictionary #
         elif isinstance(selection, dict):
             chrom = selection['chr']
             if chrom not in self.chromosomes: return 0
+            if self._is_blocked(chrom): return sum(1 for f in self.read(selection, ['start']))
             sql_request = "select COUNT(*) from '" + chrom + "' where " + make_cond_from_sel(selection)
+            if self._outside_stats(selection): return 0
         # Other cases #
         else: raise TypeError, 'The following selection parameter: "' + selection + '" was not understood'
         # Return the results #
@@ -850,7 +1175,7 @@ class Track(object):
            with track.load('tracks/example.sql') as t:
                t.ucsc_to_ensembl()
         """
-        for chrom in self.chromosomes: self._cursor.execute("update '" + chrom + "' set start=start+1")
+        self._shift_starts(+1)
 
     def ensembl_to_ucsc(self):
         """Converts all entries of a track from the Ensembl standard to the UCSC standard effectively subtracting one from every start position.
@@ -863,7 +1188,15 @@ class Track(object):
            with track.load('tracks/rp_genes.bed') as t:
                t.ensembl_to_ucsc()
         """
-        for chrom in self.chromosomes: self._cursor.execute("update '" + chrom + "' set start=start-1")
+        self._shift_starts(-1)
+
+    def _shift_starts(self, offset):
+        """Add *offset* to the start position of every feature in the track."""
+        for chrom in self.chromosomes:
+            if self._is_blocked(chrom): raise Exception("The chromosome '%s' is stored in blocks, its start positions cannot be shifted." % chrom)
+        for chrom in self.chromosomes:
+            self._cursor.execute("update '" + chrom + "' set start=start+(?)", (offset,))
+            self._make_stale(chrom)
 
     #-----------------------------------------------------------------------------#
     def get_full_score_vector(self, chromosome):
@@ -1022,6 +1355,100 @@ class Track(object):
         for k in sorted(self.info.keys(), key=natural_sort):
             self._cursor.execute('INSERT into "attributes" ("key","value") values (?,?)', (k, self.info[k]))
 
+    def _stats_read(self):
+        """Populate the statistics of the chromosomes with the contents of the 'statistics' table."""
+        if not 'statistics' in self.tables: return
+        query = self._cursor.execute('SELECT chromosome, value from "statistics"')
+        self._stats = dict((k, json.loads(v)) for k, v in query.fetchall())
+
+    def _stats_write(self):
+        """Rewrite the 'statistics' table so that it reflects the statistics of the chromosomes."""
+        if self.readonly: return
+        self._cursor.execute('DROP table IF EXISTS "statistics"')
+        if not self._stats: return
+        self._cursor.execute('CREATE table "statistics" ("chromosome" text, "value" text)')
+        for k in sorted(self._stats.keys(), key=natural_sort):
+            self._cursor.execute('INSERT into "statistics" ("chromosome","value") values (?,?)', (k, json.dumps(self._stats[k], sort_keys=True)))
+
+    #-----------------------------------------------------------------------------#
+    def stats(self, chromosome):
+        """Statistics about the features of a chromosome, computed when the track is saved after being written to and stored in the 'statistics' table. They are used to avoid unnecessary work, for instance ``read`` skips sorting a table that is already in order, ``count`` does not need to scan it, a region or score interval lying outside of the range of a chromosome is answered without a query and manipulations such as ``overlap`` use a simpler algorithm on features known not to overlap each other. For instance:
+
+              ``{'count': 6, 'sorted': True, 'overlapping': False, 'min_start': 0, 'max_end': 230208, 'min_score': 0.1, 'max_score': 12.0}``
+
+        The dictionary is empty when nothing is known about that chromosome, for instance if it was modified since the last save or if the track was created by an older version of this package.
+
+        ::
+
+            import track
+            with track.load('tracks/rp_genes.bed') as t:
+                print t.stats('chr1')['count']
+        """
+        return self._stats.get(chromosome, {})
+
+    def is_sorted(self, chromosome):
+        """Returns ``True`` if the features of *chromosome* are known to be stored sorted by start and end. See *stats*."""
+        return self.stats(chromosome).get('sorted', False) or self._is_clustered(chromosome)
+
+    def is_overlapping(self, chromosome):
+        """Returns ``False`` if the features of *chromosome* are known not to overlap each other, ``True`` otherwise. See *stats*."""
+        return self.stats(chromosome).get('overlapping', True)
+
+    def _outside_stats(self, selection):
+        """Returns ``True`` if the statistics of the chromosome show that no feature can match the selection dictionary."""
+        stats = self.stats(selection['chr'])
+        if 'start' in selection and stats.get('max_end') is not None and stats['max_end'] <= selection['start']: return True
+        if 'end' in selection and stats.get('min_start') is not None and stats['min_start'] >= selection['end']: return True
+        if 'score' in selection and stats.get('max_score') is not None:
+            low, high = selection['score']
+            if stats['max_score'] < low or stats['min_score'] > high: return True
+        return False
+
+    def _make_stale(self, chromosome):
+        """Forget the statistics of a chromosome that is being modified."""
+        self._stale.add(chromosome)
+        if self._stats.pop(chromosome, None) is not None: self._stats_modified = True
+
+    def _stats_update(self):
+        """Compute the statistics of every chromosome modified since the last save."""
+        for chrom in self._stale:
+            fields = self._get_fields_of_table(chrom)
+            if not fields: continue
+            if self._is_blocked(chrom):
+                query = "SELECT coalesce(sum(_count), 0), min(_start), max(_end) FROM '%s'"
+                stats = dict(zip(('count', 'min_start', 'max_end'), self._cursor.execute(query % chrom).fetchone()))
+                stats['sorted'] = self._blocks_in_order(chrom)
+                self._stats[chrom] = stats
+                continue
+            stats = {'count': self._cursor.execute("SELECT count(*) FROM '%s'" % chrom).fetchone()[0]}
+            if 'start' in fields and 'end' in fields:
+                query = "SELECT min(start), max(end) FROM '%s'"
+                stats['min_start'], stats['max_end'] = self._cursor.execute(query % chrom).fetchone()
+                if self._is_clustered(chrom):
+                    # Compare every feature with the one following it in the key order #
+                    query = "SELECT count(*) FROM '%(chrom)s' a WHERE (SELECT b.start FROM '%(chrom)s' b WHERE b.start > a.start" \
+                            " OR (b.start = a.start AND (b.end > a.end OR (b.end = a.end AND b.%(seq)s > a.%(seq)s)))" \
+                            " ORDER BY b.start, b.end, b.%(seq)s LIMIT 1) < a.end"
+                    stats['sorted'] = True
+                    stats['overlapping'] = bool(self._cursor.execute(query % {'chrom': chrom, 'seq': sequence_field}).fetchone()[0])
+                else:
+                    # Compare every feature with the one stored after it #
+                    query = "SELECT count(*), coalesce(sum(b.start < a.start OR (b.start = a.start AND b.end < a.end)), 0)," \
+                            " coalesce(sum(b.start < a.end), 0) FROM '%s' a JOIN '%s' b ON b.rowid = a.rowid + 1"
+                    pairs, unsorted, overlaps = self._cursor.execute(query % (chrom, chrom)).fetchone()
+                    # Only conclusive when no rows were ever deleted #
+                    if pairs == max(stats['count'] - 1, 0):
+                        stats['sorted'] = not unsorted
+                        # Sorted features that do not overlap their successor never overlap #
+                        if not unsorted: stats['overlapping'] = bool(overlaps)
+            if 'score' in fields:
+                # Placeholders such as '.' are text and never match a score interval #
+                query = "SELECT min(score), max(score) FROM '%s' WHERE typeof(score) IN ('integer', 'real')"
+                stats['min_score'], stats['max_score'] = self._cursor.execute(query % chrom).fetchone()
+            self._stats[chrom] = stats
+        self._stale = set()
+        self._stats_modified = True
+
     @property
     def datatype(self):
         """Giving a datatype to your track is optional. The default datatype is ``None``. Other possible datatypes are ``features``, ``signal`` or ``relational``. Changing the datatype imposes some conditions on the entries that the track contains. This attribute is stored inside the *info* dictionary.
@@ -1040,6 +1467,68 @@ class Track(object):
             raise Exception("The datatype you are trying to use is invalid: '" + str(value) + "'.")
         self.info['datatype'] = value
 
+    @property
+    def indexed_fields(self):
+        """A list of extra fields on which an index is created when the track is saved, in addition to the default ``start``, ``end``, ``score`` and ``name`` indexes. This attribute is stored inside the *info* dictionary.
+
+        ::
+
+            import track
+            with track.load('tracks/genes.gtf', attributes_to_columns=['gene_id']) as t:
+                print t.indexed_fields
+        """
+        value = self.info.get('indexed_fields')
+        return value and value.split(',') or []
+
+    @indexed_fields.setter
+    def indexed_fields(self, value):
+        self.info['indexed_fields'] = ','.join(value)
+
+    @property
+    def layout(self):
+        """How new chromosome tables are stored. The default layout is ``rowid``, where features are stored in the order they are written and an index on ``start`` and ``end`` is added. With the ``clustered`` layout, every table is kept ordered on ``start`` and ``end`` (SQLite ``WITHOUT ROWID`` tables, which need SQLite 3.8.2 or newer), so range and ordered reads are sequential and no range index is needed. Writing unsorted features to a clustered table is slower. With the ``blocks`` layout, chromosomes containing only ``start``, ``end`` and ``score`` are stored as compressed blocks of consecutive features, which makes signal tracks several times smaller. Scores are then kept as single precision floats. The features of a chromosome should be written in order, otherwise they are sorted every time they are read in order. This attribute is stored inside the *info* dictionary.
+
+        ::
+
+            import track
+            with track.new('tmp/track.sql') as t:
+                t.layout = 'clustered'
+                t.write('chr1', [(10, 20, 'A', 0.0, 1)])
+        """
+        return self.info.get('layout', 'rowid')
+
+    @layout.setter
+    def layout(self, value):
+        if value not in layouts:
+            raise Exception("The layout you are trying to use is invalid: '" + str(value) + "'.")
+        if value == 'clustered' and sqlite3.sqlite_version_info < (3, 8, 2):
+            raise Exception("The clustered layout needs SQLite 3.8.2 or newer, this is SQLite %s." % sqlite3.sqlite_version)
+        self.info['layout'] = value
+
+    @property
+    def encoded_fields(self):
+        """A list of text fields stored with dictionary encoding. Every distinct value of these fields is written once in the 'types' table and the chromosome tables only contain its integer code. This makes tracks with few distinct names, sources or attributes smaller and lets ``search`` compare integers. Values are decoded transparently by ``read``. This attribute can only be set before anything is written to the track and is stored inside the *info* dictionary.
+
+        ::
+
+            import track
+            with track.new('tmp/track.sql') as t:
+                t.encoded_fields = ['name', 'source']
+                t.write('chr1', [(10, 20, 'exon', 'SGD'), (30, 40, 'exon', 'SGD')], ['start', 'end', 'name', 'source'])
+        """
+        value = self.info.get('encoded_fields')
+        return value and value.split(',') or []
+
+    @encoded_fields.setter
+    def encoded_fields(self, value):
+        if value == self.encoded_fields: return
+        if self.chromosomes:
+            raise Exception("The encoded fields of the track '%s' cannot be changed once it contains chromosomes." % self.path)
+        for field in value:
+            if sql_field_types.get(field, 'text') != 'text':
+                raise Exception("The field '%s' is not a text field and cannot be encoded." % field)
+        self.info['encoded_fields'] = ','.join(value)
+
     @property
     def name(self):
         """Giving a name to your track is optional. The default name is the filename. This attribute is stored inside the *info* dictionary."""
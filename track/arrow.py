@@ -0,0 +1,252 @@
+"""
+This module implements the reading and writing of tracks as Apache Arrow
+IPC files and as Parquet files. Both are stored as a single table with a
+``chr`` column followed by the fields of the track. The column types are
+derived from ``sql_field_types``. Every chromosome is written as one
+record batch (Arrow) or one row group (Parquet), with its features sorted
+by start and end, so that reading a region only touches one chromosome
+and can skip the others without decoding them. The info and chrmeta of
+the track are stored in the metadata of the schema. Values of numerical
+fields that are not numbers, such as the '.' placeholders of some formats,
+are null in the field and kept in an extra text column named after it.
+
+This module requires the pyarrow package. It can be imported without it,
+but reading or writing a track then raises an ``ImportError``.
+"""
+
+# Built-in modules #
+import json
+
+# Internal modules #
+from track.util import sql_field_types
+from track.common import natural_sort
+
+# Extra modules #
+try:
+    import numpy, pyarrow, pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Constants #
+if pyarrow: arrow_types = {'integer': pyarrow.int64(), 'real': pyarrow.float64(), 'text': pyarrow.string()}
+chrom_field = 'chr'
+text_suffix = ':text'
+
+################################################################################
+def check_pyarrow():
+    """Raises an ImportError if the pyarrow package is missing."""
+    if pyarrow is None: raise ImportError("The Arrow and Parquet formats require the pyarrow package.")
+
+def make_schema(fields, info=None, chrmeta=None, texts=()):
+    """Returns the Arrow schema of a track with the given fields. The fields
+    listed in *texts* are followed by the column holding their placeholders.
+
+    ::
+
+        from track.arrow import make_schema
+        schema = make_schema(['start', 'score'], texts=['score'])
+        print schema.names
+    """
+    columns = [pyarrow.field(chrom_field, pyarrow.string(), False)]
+    for f in fields:
+        columns.append(pyarrow.field(f, arrow_types[sql_field_types.get(f, 'text')]))
+        if f in texts: columns.append(pyarrow.field(f + text_suffix, pyarrow.string()))
+    metadata = {'track:fields': json.dumps(list(fields)), 'track:info': json.dumps(dict(info or {})),
+                'track:chrmeta': json.dumps(dict(chrmeta or {}))}
+    return pyarrow.schema(columns, metadata=metadata)
+
+def make_array(values, kind):
+    """Converts a list of values to an Arrow array. Values that cannot be converted, such as the '.' placeholders
+    of some formats, become nulls and are returned in a second array of text, which is None if there are none.
+
+    ::
+
+        import pyarrow
+        from track.arrow import make_array
+        values, texts = make_array([1.5, '.'], pyarrow.float64())
+    """
+    try:
+        return pyarrow.array(values, type=kind), None
+    except (pyarrow.ArrowException, ValueError, TypeError):
+        if   kind == pyarrow.string(): convert = lambda v: v if isinstance(v, basestring) else str(v)
+        elif kind == pyarrow.int64():  convert = int
+        else:                          convert = float
+        converted, texts = [], []
+        for v in values:
+            try:
+                converted.append(None if v is None else convert(v))
+                texts.append(None)
+            except (ValueError, TypeError):
+                converted.append(None)
+                texts.append(v if isinstance(v, basestring) else str(v))
+        return pyarrow.array(converted, type=kind), pyarrow.array(texts, type=pyarrow.string())
+
+def restore_text(values, texts):
+    """Puts the placeholders kept in *texts* back in the list of *values*."""
+    return [v if t is None else t for v, t in zip(values, texts)]
+
+def make_batch(chrom, fields, columns):
+    """Makes the record batch of one chromosome from a dictionary of columns, sorting the features by start and end.
+    Its schema has no metadata and only has the text columns that are needed."""
+    count = len(columns[fields[0]]) if fields else 0
+    order = None
+    if 'start' in columns and 'end' in columns and count > 1:
+        starts, ends = numpy.array(columns['start'], dtype=numpy.int64), numpy.array(columns['end'], dtype=numpy.int64)
+        in_order = (starts[1:] > starts[:-1]) | ((starts[1:] == starts[:-1]) & (ends[1:] >= ends[:-1]))
+        if not in_order.all(): order = numpy.lexsort((ends, starts)).tolist()
+    arrays, texts = [pyarrow.array([chrom] * count, type=pyarrow.string())], []
+    for f in fields:
+        values = columns[f] if order is None else [columns[f][i] for i in order]
+        array, text = make_array(values, arrow_types[sql_field_types.get(f, 'text')])
+        arrays.append(array)
+        if text is not None:
+            arrays.append(text)
+            texts.append(f)
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=make_schema(fields, texts=texts))
+
+def batch_columns(batch, fields):
+    """The inverse of `make_batch`, returns a dictionary of lists with the placeholders put back.
+    Fields that are not in the batch are null."""
+    names = batch.schema.names
+    columns = {}
+    for f in fields:
+        if f not in names:
+            columns[f] = [None] * batch.num_rows
+            continue
+        columns[f] = batch.column(names.index(f)).to_pylist()
+        if f + text_suffix in names: columns[f] = restore_text(columns[f], batch.column(names.index(f + text_suffix)).to_pylist())
+    return columns
+
+def conform_batch(batch, schema):
+    """Gives a record batch the columns and metadata of *schema*, the columns it does not have are null."""
+    names = batch.schema.names
+    arrays = [batch.column(names.index(n)) if n in names else pyarrow.array([None] * batch.num_rows, type=t)
+              for n, t in zip(schema.names, schema.types)]
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+def to_numpy(column):
+    """Converts an Arrow array or chunked array of numbers without nulls to a NumPy array."""
+    chunks = column.chunks if hasattr(column, 'chunks') else [column]
+    if not chunks: return numpy.zeros(0, dtype=numpy.int64)
+    return numpy.concatenate([chunk.to_numpy() for chunk in chunks])
+
+################################################################################
+class ArrowReader(object):
+    """Reads a track stored as an Arrow IPC file (memory mapped) or as a Parquet file.
+    The info, chrmeta and fields are read from the schema metadata.
+
+    ::
+
+        from track.arrow import ArrowReader
+        with ArrowReader('tracks/pol2.parquet', 'parquet') as t:
+            for feature in t.read({'chr':'chr1', 'start':1000, 'end':2000}): print feature
+    """
+
+    def __init__(self, path, format):
+        check_pyarrow()
+        self.path   = path
+        self.format = format
+        if format == 'parquet':
+            self.file   = pyarrow.parquet.ParquetFile(path)
+            self.schema = self.file.schema.to_arrow_schema()
+            self.groups = [self.file.metadata.row_group(i) for i in xrange(self.file.num_row_groups)]
+            self.chroms = [self._statistics(g, chrom_field)[0] for g in self.groups]
+        else:
+            self.source = pyarrow.memory_map(path, 'r')
+            self.file   = pyarrow.ipc.open_file(self.source)
+            self.schema = self.file.schema
+            self.chroms = [self.file.get_batch(i).column(0)[0].as_py() if self.file.get_batch(i).num_rows else None
+                           for i in xrange(self.file.num_record_batches)]
+        metadata = self.schema.metadata or {}
+        self.fields  = [str(f) for f in json.loads(metadata.get('track:fields', 'null') or json.dumps(self.schema.names[1:]))
+                        if not f.endswith(text_suffix)]
+        self.info    = json.loads(metadata.get('track:info', '{}'))
+        self.chrmeta = json.loads(metadata.get('track:chrmeta', '{}'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, errtype, value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.chromosomes)
+
+    def close(self):
+        if self.format != 'parquet': self.source.close()
+
+    @property
+    def chromosomes(self):
+        """The chromosomes present in the file and in the chrmeta, in natural order."""
+        names = set(c for c in self.chroms if c is not None) | set(self.chrmeta)
+        return sorted(names, key=natural_sort)
+
+    def _statistics(self, group, name):
+        """Returns the minimum and maximum of a column in a row group, as recorded in the Parquet footer."""
+        column = group.column(self.schema.names.index(name))
+        statistics = column.statistics
+        if statistics is None or not statistics.has_min_max: return None, None
+        low, high = statistics.min, statistics.max
+        if isinstance(low, bytes): low, high = low.decode('utf-8'), high.decode('utf-8')
+        return low, high
+
+    def _skip(self, index, chrom, start, end):
+        """Can the row group or record batch at *index* be skipped without reading it."""
+        if self.chroms[index] is not None and self.chroms[index] != chrom: return True
+        if self.format != 'parquet' or 'start' not in self.fields or 'end' not in self.fields: return False
+        group = self.groups[index]
+        if group.num_rows == 0: return True
+        min_start, max_start = self._statistics(group, 'start')
+        min_end,   max_end   = self._statistics(group, 'end')
+        if start is not None and max_end   is not None and max_end   <= start: return True
+        if end   is not None and min_start is not None and min_start >= end:  return True
+        return False
+
+    def _tables(self, chrom, start, end, columns):
+        """Yields the record batches or tables possibly containing features of the selection."""
+        for index in xrange(len(self.chroms)):
+            if self._skip(index, chrom, start, end): continue
+            if self.format == 'parquet': yield self.file.read_row_group(index, columns=columns)
+            else:                        yield self.file.get_batch(index)
+
+    def read(self, selection=None, fields=None):
+        """Yields features as tuples. *selection* is a chromosome name, a dictionary
+        with the keys ``chr``, ``start`` and ``end`` or a list of these, like in *Track.read*."""
+        if selection is None: selection = self.chromosomes
+        if isinstance(selection, (list, tuple)):
+            for sel in selection:
+                chrom = sel['chr'] if isinstance(sel, dict) else sel
+                for feature in self.read(sel, fields): yield (chrom,) + feature
+            return
+        fields = fields or self.fields
+        if isinstance(selection, dict): chrom, start, end = selection['chr'], selection.get('start'), selection.get('end')
+        else:                           chrom, start, end = selection, None, None
+        ranged = (start is not None or end is not None) and 'start' in self.fields and 'end' in self.fields
+        columns = [chrom_field] + [f for f in self.fields if f in fields or (ranged and f in ('start', 'end'))]
+        columns += [f + text_suffix for f in columns[1:] if f + text_suffix in self.schema.names]
+        for table in self._tables(chrom, start, end, columns):
+            names = table.schema.names
+            # Only convert the rows overlapping the region, found with NumPy #
+            if ranged and table.num_rows:
+                mask = numpy.ones(table.num_rows, dtype=bool)
+                if start is not None: mask &= to_numpy(table.column(names.index('end')))   > start
+                if end   is not None: mask &= to_numpy(table.column(names.index('start'))) < end
+                indices = numpy.flatnonzero(mask)
+                if not len(indices): continue
+                low, high = int(indices[0]), int(indices[-1]) + 1
+                table, mask = table.slice(low, high - low), mask[low:high].tolist()
+            else:
+                mask = None
+            values = dict((n, table.column(names.index(n)).to_pylist()) for n in names)
+            for n in names:
+                if n.endswith(text_suffix): values[n[:-len(text_suffix)]] = restore_text(values[n[:-len(text_suffix)]], values[n])
+            # Batches without statistics may contain other chromosomes #
+            rows = [i for i in xrange(table.num_rows) if values[chrom_field][i] == chrom and (mask is None or mask[i])]
+            picked = [values[f] if f in values else [None] * table.num_rows for f in fields]
+            for i in rows: yield tuple(column[i] for column in picked)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
@@ -0,0 +1,182 @@
+"""
+This module converts many tracks at once, using several processes.
+"""
+
+# Built-in modules #
+import os, glob, time, hashlib, multiprocessing
+
+# Internal modules #
+import track
+from track.common import iterate_lines
+
+# Constants #
+hash_registry = '.track_md5'
+
+################################################################################
+def expand_sources(patterns, format, output_dir=None):
+    """Makes a list of conversion jobs from shell-like wildcards. Each file matched gets a destination with the same name, the *format* extension and sitting in *output_dir* (or next to the source if missing).
+
+       :returns: a list of ``(source, destination, assembly)`` tuples.
+
+       ::
+
+            from track.batch import expand_sources
+            jobs = expand_sources(['tracks/*.bed', 'tracks/*.wig'], 'sql', 'tmp/')
+    """
+    jobs = []
+    for pattern in patterns:
+        for source in sorted(glob.glob(pattern)) or [pattern]:
+            directory = output_dir or os.path.dirname(source)
+            name = os.path.splitext(os.path.basename(source))[0] + '.' + format
+            jobs.append((source, os.path.join(directory, name), None))
+    return jobs
+
+def read_manifest(path):
+    """Reads a manifest file listing one conversion per line. Each line contains a source path, a destination path and optionally an assembly name, separated by whitespace. Lines starting with ``#`` are ignored.
+
+       :returns: a list of ``(source, destination, assembly)`` tuples.
+    """
+    jobs = []
+    for number, line in iterate_lines(path):
+        items = line.split()
+        if len(items) not in (2, 3): raise Exception("The manifest line %i should contain a source, a destination and optionally an assembly." % (number + 1))
+        jobs.append((items[0], items[1], items[2] if len(items) == 3 else None))
+    return jobs
+
+def check_destinations(jobs):
+    """Raises an exception if two jobs would write to the same destination, for instance when sources with the same name in different directories are converted to one output directory."""
+    seen = {}
+    for source, destination, assembly in jobs:
+        key = os.path.abspath(destination)
+        if key in seen: raise Exception("The sources '%s' and '%s' would both be converted to '%s'." % (seen[key], source, destination))
+        seen[key] = source
+
+################################################################################
+def md5_file(path, block_size=2**20):
+    """Computes the MD5 hexdigest of a file without loading it in memory."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(block_size), ''): digest.update(block)
+    return digest.hexdigest()
+
+def read_hashes(directory):
+    """Reads the MD5 of the sources recorded at the last conversions into *directory*.
+
+       :returns: a dictionary of destination file names to hexdigests.
+    """
+    path = os.path.join(directory, hash_registry)
+    if not os.path.exists(path): return {}
+    with open(path) as handle: return dict(line.rstrip('\n').split('\t', 1) for line in handle if '\t' in line)
+
+def write_hashes(directory, hashes):
+    """Records the MD5 of the sources converted into *directory*, in a single hidden file."""
+    with open(os.path.join(directory, hash_registry), 'w') as handle:
+        for name in sorted(hashes): handle.write('%s\t%s\n' % (name, hashes[name]))
+
+def is_up_to_date(source, destination, check='mtime', hashes=None):
+    """Tells if a destination does not need to be converted again.
+
+       :param check: either ``'mtime'``, in which case the destination must be newer than the source, or ``'hash'``, in which case the MD5 of the source must match the one recorded for the destination at the last conversion, see `read_hashes`.
+       :type  check: string
+       :param hashes: the recorded hashes of the destination's directory, read again if missing.
+       :type  hashes: dict
+       :returns: a boolean.
+    """
+    if not os.path.exists(destination): return False
+    if check == 'mtime': return os.path.getmtime(destination) >= os.path.getmtime(source)
+    if check == 'hash':
+        if hashes is None: hashes = read_hashes(os.path.dirname(destination) or '.')
+        return hashes.get(os.path.basename(destination)) == md5_file(source)
+    raise Exception("The check '%s' is not supported, use 'mtime' or 'hash'." % check)
+
+################################################################################
+def convert_one(job):
+    """Does a single conversion inside a worker process. Errors are caught and reported instead of interrupting the other conversions.
+
+       :returns: a dictionary describing the result.
+    """
+    source, destination, assembly, check = job
+    report = {'source': source, 'destination': destination, 'error': None}
+    start = time.time()
+    try:
+        if os.path.exists(destination): os.remove(destination)
+        track.convert(source, destination, assembly)
+        if check == 'hash': report['md5'] = md5_file(source)
+    except Exception as err:
+        # A partial destination would be newer than the source and look up to date #
+        if os.path.exists(destination): os.remove(destination)
+        report['error'] = '%s: %s' % (err.__class__.__name__, err)
+    report['seconds'] = time.time() - start
+    report['bytes'] = os.path.getsize(source) if os.path.exists(source) else 0
+    return report
+
+def convert_many(jobs, processes=1, check='mtime', force=False, callback=None):
+    """Converts a list of tracks using a pool of worker processes. Destinations that are already up to date are skipped.
+
+       :param jobs: a list of ``(source, destination, assembly)`` tuples, as returned by `expand_sources` or `read_manifest`.
+       :type  jobs: list
+       :param processes: the number of conversions to run at the same time.
+       :type  processes: int
+       :param check: how to decide if a destination is up to date, see `is_up_to_date`.
+       :type  check: string
+       :param force: if ``True``, every destination is converted again.
+       :type  force: bool
+       :param callback: an optional function called with every report as soon as it is available.
+       :type  callback: function
+       :raises: an exception if two jobs have the same destination, see `check_destinations`.
+       :returns: a list of reports, one per job. Each report is a dictionary with the keys ``source``, ``destination``, ``error``, ``seconds`` and ``bytes``. Skipped jobs have an extra key ``skipped`` set to ``True``.
+
+       ::
+
+            from track.batch import read_manifest, convert_many
+            reports = convert_many(read_manifest('tracks/manifest.txt'), processes=8)
+    """
+    check_destinations(jobs)
+    # The recorded hashes of every output directory #
+    directory = lambda path: os.path.dirname(path) or '.'
+    hashes = {}
+    if check == 'hash':
+        for source, destination, assembly in jobs:
+            if directory(destination) not in hashes: hashes[directory(destination)] = read_hashes(directory(destination))
+    reports, todo = [], []
+    for source, destination, assembly in jobs:
+        if not force and os.path.exists(source) and is_up_to_date(source, destination, check, hashes.get(directory(destination))):
+            report = {'source': source, 'destination': destination, 'error': None,
+                      'seconds': 0.0, 'bytes': 0, 'skipped': True}
+            reports.append(report)
+            if callback: callback(report)
+        else:
+            todo.append((source, destination, assembly, check))
+    # Small batches do not need a pool #
+    if processes <= 1 or len(todo) <= 1:
+        results = (convert_one(job) for job in todo)
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap_unordered(convert_one, todo)
+    for report in results:
+        reports.append(report)
+        if callback: callback(report)
+    if processes > 1 and len(todo) > 1:
+        pool.close()
+        pool.join()
+    # Record the new hashes #
+    changed = set()
+    for report in reports:
+        if report.get('md5') and not report['error']:
+            hashes[directory(report['destination'])][os.path.basename(report['destination'])] = report.pop('md5')
+            changed.add(directory(report['destination']))
+    for path in changed: write_hashes(path, hashes[path])
+    return reports
+
+def format_report(report):
+    """Makes one line of text describing a conversion and its throughput."""
+    if report.get('skipped'): return "skipped  %s (up to date)" % report['destination']
+    if report['error']:       return "failed   %s -> %s (%s)" % (report['source'], report['destination'], report['error'])
+    speed = report['bytes'] / 2.0**20 / max(report['seconds'], 1e-6)
+    return "done     %s -> %s (%.2f s, %.2f MB/s)" % (report['source'], report['destination'], report['seconds'], speed)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
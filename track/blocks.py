@@ -0,0 +1,84 @@
+"""
+This module implements the compact storage of signal tracks. A chromosome
+is cut in blocks of consecutive features. In every block, the starts are
+stored as gaps from the previous end, followed by the lengths and by the
+scores as single precision floats. The three arrays are concatenated and
+compressed with zlib. Only the blocks overlapping a region need to be
+decoded to read it.
+"""
+
+# Built-in modules #
+import sys, zlib
+from array import array
+
+# Constants #
+BLOCK_SIZE = 4096
+block_fields = ('start', 'end', 'score')
+
+################################################################################
+def encode_block(features):
+    """Encode a list of ``(start, end, score)`` tuples sorted by start.
+
+       :returns: a binary string.
+
+       ::
+
+           >>> decode_block(encode_block([(10, 20, 1.0), (20, 25, 2.0), (40, 41, 0.5)]))
+           [(10, 20, 1.0), (20, 25, 2.0), (40, 41, 0.5)]
+    """
+    gaps, lengths, scores = array('i'), array('i'), array('f')
+    last_end = 0
+    for start, end, score in features:
+        gaps.append(start - last_end)
+        lengths.append(end - start)
+        scores.append(score)
+        last_end = end
+    # Always store little-endian #
+    if sys.byteorder == 'big':
+        for a in (gaps, lengths, scores): a.byteswap()
+    return zlib.compress(gaps.tostring() + lengths.tostring() + scores.tostring())
+
+def decode_block(data):
+    """Decode a binary string made by `encode_block`.
+
+       :returns: a list of ``(start, end, score)`` tuples.
+    """
+    data = zlib.decompress(str(data))
+    count = len(data) / 12
+    gaps, lengths, scores = array('i'), array('i'), array('f')
+    gaps.fromstring(data[:4*count])
+    lengths.fromstring(data[4*count:8*count])
+    scores.fromstring(data[8*count:])
+    if sys.byteorder == 'big':
+        for a in (gaps, lengths, scores): a.byteswap()
+    # The first gap is relative to zero #
+    end = 0
+    result = []
+    for gap, length, score in zip(gaps, lengths, scores):
+        start = end + gap
+        end = start + length
+        result.append((start, end, score))
+    return result
+
+def make_blocks(features, block_size=BLOCK_SIZE):
+    """Cut an iterable of ``(start, end, score)`` tuples in blocks.
+
+       :returns: a generator yielding ``(first_start, max_end, count, data)`` tuples.
+    """
+    block = []
+    for feature in features:
+        block.append(feature)
+        if len(block) == block_size:
+            yield make_block(block)
+            block = []
+    if block: yield make_block(block)
+
+def make_block(block):
+    block.sort()
+    return block[0][0], max(f[1] for f in block), len(block), buffer(encode_block(block))
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
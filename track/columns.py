@@ -0,0 +1,334 @@
+"""
+This module implements the columnar track format. A track is stored in a
+single file containing one NumPy array per chromosome and per field, so
+that opening it requires no parsing at all: every column is memory mapped
+and only the pages actually used are read from disk. Features are stored
+sorted by start and end, region lookups are done by binary search.
+
+The file is laid out as follows:
+
+    * 8 bytes of magic string.
+    * The arrays, each one starting on a 64 byte boundary and stored little-endian.
+    * A JSON header with the info, the chrmeta, the fields and the position of every array.
+    * The length of the JSON header as an 8 byte little-endian integer.
+    * The same 8 bytes of magic string.
+
+Integer fields are stored as int32, or int64 when their values do not fit.
+Integer fields containing nulls are followed by an array of bytes marking them.
+The score is stored as float32, other real fields as float64. Text fields,
+and numerical fields containing text, are stored as an array of offsets
+followed by an array of bytes.
+
+This module requires NumPy.
+"""
+
+# Built-in modules #
+import json, struct
+
+# Internal modules #
+from track.util import py_field_types
+from track.common import natural_sort
+
+# Extra modules #
+import numpy
+
+# Constants #
+MAGIC      = 'TRKCOL01'
+ALIGNMENT  = 64
+BATCH_SIZE = 8192
+
+################################################################################
+def make_column(field, values):
+    """Converts a list of values to a NumPy array with the type used to store *field*.
+    Text fields are returned as a tuple of offsets and bytes arrays,
+    integer fields containing nulls as a NumPy masked array.
+
+    ::
+
+        >>> make_column('start', [10, 20]).dtype
+        dtype('int32')
+        >>> make_column('end', [10, 2**40]).dtype
+        dtype('int64')
+        >>> make_column('frame', [2, None]).tolist()
+        [2, None]
+        >>> make_column('score', [0.5, None]).tolist()
+        [0.5, nan]
+        >>> [a.tolist() for a in make_column('name', ['A', '', 'BC'])]
+        [[0, 1, 1, 3], [65, 66, 67]]
+        >>> len(make_column('score', ['.', 1.0]))
+        2
+    """
+    kind = py_field_types.get(field, str)
+    try:
+        if kind is int:
+            array = numpy.array([v or 0 for v in values], dtype=numpy.int64)
+            if not len(array) or (array.min() >= -2**31 and array.max() < 2**31): array = array.astype(numpy.int32)
+            if None in values: return numpy.ma.MaskedArray(array, mask=[v is None for v in values])
+            return array
+        if kind is float:
+            return numpy.array(values, dtype=numpy.float32 if field == 'score' else numpy.float64)
+    # Some formats leave placeholders such as '.' in numerical fields #
+    except (ValueError, TypeError):
+        pass
+    # Text is stored as offsets and bytes #
+    values = [v.encode('utf-8') if isinstance(v, unicode) else str(v) if v is not None else '' for v in values]
+    offsets = numpy.zeros(len(values) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(v) for v in values], out=offsets[1:])
+    return offsets, numpy.frombuffer(''.join(values), dtype=numpy.uint8)
+
+def map_array(path, description):
+    """Memory maps an array written in the file at *path*, as described in its header."""
+    if not description['shape']: return numpy.zeros(0, dtype=description['dtype'])
+    return numpy.memmap(path, dtype=description['dtype'], mode='r',
+                        offset=description['offset'], shape=(description['shape'],))
+
+def map_column(path, description):
+    """Memory maps a column written in the file at *path*, a `TextColumn` for text
+    fields and a NumPy masked array for integer fields containing nulls."""
+    if 'data' in description:  return TextColumn(map_array(path, description['offsets']), map_array(path, description['data']))
+    if 'nulls' in description: return numpy.ma.MaskedArray(map_array(path, description), mask=map_array(path, description['nulls']).view(bool))
+    return map_array(path, description)
+
+################################################################################
+class TextColumn(object):
+    """A read-only sequence of strings stored as offsets and bytes."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data    = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice): return self.take(xrange(*index.indices(len(self))))
+        return self.data[self.offsets[index]:self.offsets[index+1]].tostring()
+
+    def take(self, indices):
+        """Returns the strings at the given positions as a list."""
+        offsets, data = self.offsets, self.data
+        return [data[offsets[i]:offsets[i+1]].tostring() for i in indices]
+
+################################################################################
+class ColumnarWriter(object):
+    """Writes a columnar track file, one chromosome at a time. The features
+    of a chromosome are sorted by start and end before being written. A
+    chromosome written a second time is read back and merged with the new
+    features, the space of its first copy is lost.
+
+    ::
+
+        from track.columns import ColumnarWriter
+        with ColumnarWriter('tmp/track.columns', ['start', 'end', 'score']) as writer:
+            writer.write('chr1', [(10, 20, 1.5), (0, 5, 2.0)])
+            writer.info = {'datatype': 'signal'}
+    """
+
+    def __init__(self, path, fields):
+        self.path    = path
+        self.fields  = list(fields)
+        self.info    = {}
+        self.chrmeta = {}
+        self.chromosomes = {}
+
+    def __enter__(self):
+        self.file = open(self.path, 'wb')
+        self.file.write(MAGIC)
+        return self
+
+    def __exit__(self, errtype, value, traceback):
+        if not errtype: self.close()
+        else:           self.file.close()
+
+    def add_array(self, array):
+        """Writes an array on the next aligned position of the file and returns its description."""
+        array = numpy.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+        padding = -self.file.tell() % ALIGNMENT
+        self.file.write('\0' * padding)
+        description = {'dtype': array.dtype.str, 'offset': self.file.tell(), 'shape': len(array)}
+        self.file.write(array.tostring())
+        return description
+
+    def write(self, chrom, features=None, columns=None):
+        """Writes a chromosome, given either as an iterable of features or as a dictionary of columns.
+        Fields missing from the columns get their default value."""
+        if columns is None:
+            features = list(features)
+            columns = dict(zip(self.fields, zip(*features))) if features else dict((f, ()) for f in self.fields)
+        length = max([len(v) for v in columns.values()] or [0])
+        columns = dict((f, columns[f] if f in columns else [py_field_types.get(f, str)()] * length) for f in self.fields)
+        if chrom in self.chromosomes:
+            previous = self.read_back(chrom)
+            columns = dict((f, previous[f] + list(columns[f])) for f in self.fields)
+        columns = dict((f, make_column(f, columns[f])) for f in self.fields)
+        count = len(columns[self.fields[0]][0]) - 1 if isinstance(columns[self.fields[0]], tuple) else len(columns[self.fields[0]])
+        description = {'count': count, 'columns': {}}
+        # Sort the features #
+        order = None
+        if 'start' in columns and 'end' in columns:
+            starts, ends = columns['start'], columns['end']
+            in_order = (starts[1:] > starts[:-1]) | ((starts[1:] == starts[:-1]) & (ends[1:] >= ends[:-1]))
+            if not in_order.all(): order = numpy.lexsort((ends, starts))
+            description['max_length'] = int((ends - starts).max()) if count else 0
+        for field in self.fields:
+            column = columns[field]
+            if isinstance(column, tuple):
+                if order is not None:
+                    text = TextColumn(*column).take(order)
+                    column = make_column(field, text)
+                description['columns'][field] = {'offsets': self.add_array(column[0]), 'data': self.add_array(column[1])}
+            else:
+                if order is not None: column = column[order]
+                description['columns'][field] = self.add_array(numpy.ma.getdata(column))
+                if numpy.ma.is_masked(column): description['columns'][field]['nulls'] = self.add_array(numpy.ma.getmaskarray(column).view(numpy.uint8))
+        self.chromosomes[chrom] = description
+
+    def read_back(self, chrom):
+        """Reads the columns of a chromosome already written, as lists, with the default value for the fields it did not have."""
+        self.file.flush()
+        description = self.chromosomes.pop(chrom)
+        columns = {}
+        for field in self.fields:
+            if field not in description['columns']:
+                columns[field] = [py_field_types.get(field, str)()] * description['count']
+                continue
+            column = map_column(self.path, description['columns'][field])
+            if isinstance(column, TextColumn): columns[field] = column.take(xrange(len(column)))
+            elif column.dtype.kind == 'f':     columns[field] = [None if v != v else v for v in column.tolist()]
+            else:                              columns[field] = column.tolist()
+        return columns
+
+    def close(self):
+        """Writes the header and closes the file."""
+        header = json.dumps({'info': dict(self.info), 'chrmeta': dict(self.chrmeta), 'fields': self.fields,
+                             'chromosomes': self.chromosomes}, sort_keys=True)
+        self.file.write(header)
+        self.file.write(struct.pack('<Q', len(header)))
+        self.file.write(MAGIC)
+        self.file.close()
+
+################################################################################
+class ColumnarTrack(object):
+    """A columnar track file opened for reading. Columns are memory mapped
+    NumPy arrays, nothing is read from the file before it is needed.
+
+    ::
+
+        from track.columns import ColumnarTrack
+        with ColumnarTrack('tracks/pol2.columns') as t:
+            scores = t.column('chr1', 'score')
+            print scores.mean()
+            for feature in t.read({'chr':'chr1', 'start':1000, 'end':2000}): print feature
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as handle:
+            if handle.read(len(MAGIC)) != MAGIC: raise Exception("The file '%s' is not a columnar track." % path)
+            handle.seek(-8 - len(MAGIC), 2)
+            length, = struct.unpack('<Q', handle.read(8))
+            if handle.read(len(MAGIC)) != MAGIC: raise Exception("The columnar track '%s' is truncated." % path)
+            handle.seek(-8 - len(MAGIC) - length, 2)
+            header = json.loads(handle.read(length))
+        self.info    = header['info']
+        self.chrmeta = header['chrmeta']
+        self.fields  = [str(f) for f in header['fields']]
+        self._chromosomes = header['chromosomes']
+        self._columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, errtype, value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.chromosomes)
+
+    def __contains__(self, key):
+        return key in self._chromosomes
+
+    @property
+    def chromosomes(self):
+        """The list of chromosomes, in natural order."""
+        return sorted(self._chromosomes, key=natural_sort)
+
+    def close(self):
+        """Forgets the memory maps. They are unmapped when the last reference to them disappears."""
+        self._columns = {}
+
+    def column(self, chrom, field):
+        """Returns the values of one field on one chromosome. Numerical fields are
+        returned as memory mapped NumPy arrays, masked where there are nulls, text fields as a `TextColumn`."""
+        key = (chrom, field)
+        if key not in self._columns:
+            if chrom not in self._chromosomes: raise Exception("The chromosome '%s' doesn't exist." % chrom)
+            description = self._chromosomes[chrom]['columns'].get(field)
+            if description is None: raise Exception("The field '%s' doesn't exist in '%s'." % (field, self.path))
+            self._columns[key] = map_column(self.path, description)
+        return self._columns[key]
+
+    def count(self, chrom):
+        """Returns the number of features on a chromosome."""
+        return self._chromosomes[chrom]['count'] if chrom in self._chromosomes else 0
+
+    def region(self, chrom, start, end):
+        """Returns the positions of the features overlapping the interval between *start* and *end* as a NumPy array.
+        The lookup is a binary search on the sorted starts, narrowed by the length of the longest feature."""
+        starts, ends = self.column(chrom, 'start'), self.column(chrom, 'end')
+        max_length = self._chromosomes[chrom].get('max_length', 0)
+        low  = starts.searchsorted(start - max_length, 'right')
+        high = starts.searchsorted(end, 'left')
+        return low + numpy.flatnonzero(ends[low:high] > start)
+
+    def read(self, selection=None, fields=None):
+        """Yields features as tuples. *selection* is a chromosome name or a dictionary
+        with the keys ``chr``, ``start`` and ``end``, like in *Track.read*."""
+        if selection is None:
+            selection = self.chromosomes
+        if isinstance(selection, (list, tuple)):
+            for sel in selection:
+                chrom = sel['chr'] if isinstance(sel, dict) else sel
+                for feature in self.read(sel, fields): yield (chrom,) + feature
+            return
+        fields = fields or self.fields
+        chrom = selection['chr'] if isinstance(selection, dict) else selection
+        if chrom not in self._chromosomes: return
+        # Which features #
+        count = self.count(chrom)
+        if isinstance(selection, dict): indices = self.region(chrom, selection.get('start', 0), selection.get('end', numpy.iinfo(numpy.int64).max))
+        else:                           indices = None
+        total = count if indices is None else len(indices)
+        # Convert in batches #
+        for low in xrange(0, total, BATCH_SIZE):
+            high = min(low + BATCH_SIZE, total)
+            batch = xrange(low, high) if indices is None else indices[low:high]
+            values = []
+            for field in fields:
+                if field not in self._chromosomes[chrom]['columns']:
+                    values.append([py_field_types.get(field, str)()] * (high - low))
+                    continue
+                column = self.column(chrom, field)
+                if isinstance(column, TextColumn):
+                    values.append(column.take(batch))
+                    continue
+                part = column[low:high] if indices is None else column[batch]
+                values.append([None if v != v else v for v in part.tolist()] if part.dtype.kind == 'f' else part.tolist())
+            for feature in zip(*values): yield feature
+
+    def score_vector(self, chrom, start, end):
+        """Returns a NumPy array with the score of every base pair between *start* and *end*.
+        Positions not covered by a feature are zero, where features overlap the last one wins."""
+        vector = numpy.zeros(end - start, dtype=numpy.float32)
+        indices = self.region(chrom, start, end)
+        starts = numpy.clip(self.column(chrom, 'start')[indices] - start, 0, end - start)
+        ends   = numpy.clip(self.column(chrom, 'end')[indices]   - start, 0, end - start)
+        scores = self.column(chrom, 'score')[indices] if 'score' in self.fields else numpy.ones(len(indices))
+        for s, e, v in zip(starts.tolist(), ends.tolist(), scores.tolist()): vector[s:e] = v
+        return vector
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
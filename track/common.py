@@ -148,7 +148,8 @@ def load_dump(path, kind=None):
         return open(path)
     if kind == 'sql':
         import sqlite3
-        return sqlite3.connect(path).iterdump()
+        # Statistics are derived from the data, they are not compared #
+        return (l for l in sqlite3.connect(path).iterdump() if not l.startswith(('CREATE TABLE "statistics"', 'INSERT INTO "statistics"')))
 
 def assert_file_equal(pathA, pathB, start_a=0, start_b=0, end=999999, difflen=40, showlen=10):
     """
@@ -301,6 +302,54 @@ def format_float(f, precision=None):
     if precision: return '%s' % float('%.'+str(precision)+'g' % f)
     else:         return '%s' % float('%.4g' % f)
 
+def format_floats(values, precision=None, cache=None):
+    """
+    Formats many floats at once with the same rules as ``format_float``.
+    Signal tracks often repeat the same values, so every distinct value
+    is only formatted once. *values* can be a list or a NumPy array.
+    A dictionary can be passed as *cache* to share the work between calls.
+
+    ::
+
+        >>> format_floats([0.1, 0.10000001, 999.99, 0.1, 3])
+        ['0.1', '0.1', '1000.0', '0.1', '3.0']
+    """
+    if cache is None: cache = {}
+    # NumPy arrays are reduced to their unique values #
+    if hasattr(values, 'dtype'):
+        import numpy
+        uniques, inverse = numpy.unique(values, return_inverse=True)
+        formatted = numpy.array(format_floats(uniques.tolist(), precision, cache), dtype=object)
+        return formatted[inverse].tolist()
+    # Other iterables #
+    result = []
+    for f in values:
+        text = cache.get(f)
+        if text is None: text = cache[f] = format_float(f, precision)
+        result.append(text)
+    return result
+
+def memoized_format_float(precision=None, max_size=65536):
+    """
+    Returns a replacement for ``format_float`` that remembers the values
+    it has already seen. The memory is emptied when it holds more than
+    *max_size* values.
+
+    ::
+
+        >>> fn = memoized_format_float()
+        >>> fn(1000.0/6.0), fn(1000.0/6.0)
+        ('166.7', '166.7')
+    """
+    cache = {}
+    def format_float_memoized(f):
+        text = cache.get(f)
+        if text is None:
+            if len(cache) >= max_size: cache.clear()
+            text = cache[f] = format_float(f, precision)
+        return text
+    return format_float_memoized
+
 #------------------------------------------------------------------------------#
 def natural_sort(item):
     """
@@ -2,10 +2,16 @@
 Extra functionality that can be used by other libraries.
 """
 
+# Built-in modules #
+import os, sqlite3
+
 # Internal modules #
 import track
 from track.util import add_chromsome_prefix
-from track.common import natural_sort, collapse
+from track.common import natural_sort, collapse, temporary_path
+
+# Number of features a virtual track keeps in memory before spilling to disk #
+default_memory_limit = 500000
 
 ################################################################################
 class TrackCollection(object):
@@ -73,12 +79,22 @@ class VirtualTrack(object):
     specific chromosomes. The thing is that the features don't exist until you try to read them.
     Only once you issue ``virtual_track.read('chr1')`` is the result computed just
     in time.
+
+    The features are computed only once: they are remembered as they are read,
+    so that a chromosome can be read again, or by two manipulations at the same
+    time. Beyond *memory_limit* features in memory, the least recently read
+    chromosomes are moved to temporary files on disk.
     """
-    def __init__(self):
+    def __init__(self, memory_limit=None):
         self.promises = {}
         self.chrmeta = {}
         self.info = {}
         self.tracks_to_close = []
+        self.paths_to_remove = []
+        self.memos = {}
+        self.recent = []
+        self.in_memory = 0
+        self.memory_limit = memory_limit is None and default_memory_limit or memory_limit
 
     def __iter__(self): return iter(self.chromosomes)
     def __contains__(self, key): return key in self.chromosomes
@@ -87,7 +103,7 @@ class VirtualTrack(object):
 
     @property
     def chromosomes(self):
-        chroms = self.promises.keys()
+        chroms = list(set(self.promises) | set(self.memos))
         chroms.sort(key=natural_sort)
         return chroms
 
@@ -116,14 +132,47 @@ class VirtualTrack(object):
         self.info['assembly'] = value
 
     def write(self, chromosome, stream):
+        if chromosome in self.memos:
+            self.memos.pop(chromosome).release()
+            if chromosome in self.recent: self.recent.remove(chromosome)
         self.promises[chromosome] = stream
 
     def read(self, chromosome=None):
         # If we have a specific chromosome #
-        if chromosome: return self.promises[chromosome]
+        if chromosome: return self.memo(chromosome).stream()
         # Else we want all the chromosomes at once #
         return self.read_all()
 
+    def memo(self, chromosome):
+        """The memo of a chromosome, made at its first read and
+        moved to the end of the eviction order at every read."""
+        if chromosome in self.promises: self.memos[chromosome] = Memo(self.promises.pop(chromosome), self)
+        memo = self.memos[chromosome]
+        if chromosome in self.recent: self.recent.remove(chromosome)
+        self.recent.append(chromosome)
+        if memo.released: raise Exception("The chromosome '%s' was released and can not be read again." % chromosome)
+        return memo
+
+    def evict(self):
+        """Spills the least recently read chromosomes to disk
+        until the features in memory are under the limit."""
+        for memo in [self.memos[chrom] for chrom in self.recent]:
+            if self.in_memory <= self.memory_limit: break
+            if memo.buffer: memo.spill()
+
+    def materialize(self, chromosome=None):
+        """Computes all the features of one or every chromosome now,
+        for instance before closing the tracks they come from."""
+        for chrom in chromosome and [chromosome] or self.chromosomes: self.memo(chrom).pull()
+
+    def release(self, chromosome=None):
+        """Forgets the features of one or every chromosome and removes
+        their temporary files. They can not be read again afterwards,
+        even if they were never read before."""
+        for chrom in chromosome and [chromosome] or self.chromosomes:
+            if chrom in self.promises: self.memos[chrom] = Memo(self.promises.pop(chrom), self)
+            if chrom in self.memos: self.memos[chrom].release()
+
     def read_all(self):
         for chrom in self:
             for f in add_chromsome_prefix(chrom, self.read(chrom)): yield f
@@ -136,4 +185,103 @@ class VirtualTrack(object):
         self.close()
 
     def close(self):
+        self.release()
         for t in self.tracks_to_close: t.close()
+        for path in self.paths_to_remove:
+            if os.path.exists(path): os.remove(path)
+        self.paths_to_remove = []
+
+################################################################################
+class Memo(object):
+    """
+    The features of one chromosome of a virtual track, pulled from the promised
+    stream only once and remembered in a list. When the virtual track holds too
+    many features in memory, the list is moved to a temporary SQLite file where
+    the following features go too. Every stream made by *stream* replays the
+    features from the start and pulls new ones, a chunk at a time, only once
+    past the others.
+    """
+    chunk_size = 4096
+
+    def __init__(self, stream, owner):
+        self.source = iter(stream)
+        self.fields = getattr(stream, 'fields', None)
+        self.kind = getattr(stream, 'kind', None)
+        self.owner = owner
+        self.buffer = []
+        self.count = 0
+        self.path = None
+        self.connection = None
+        self.insertion = None
+        self.released = False
+
+    def stream(self):
+        return track.FeatureStream(self.replay(), self.fields, self.kind)
+
+    def replay(self):
+        index = 0
+        while True:
+            # Features already pulled #
+            if index < self.count:
+                chunk = self.chunk(index)
+                index += len(chunk)
+                for feature in chunk: yield feature
+            # New features #
+            elif not self.pull(self.chunk_size): break
+
+    def pull(self, number=None):
+        """Pulls up to *number* features from the source, or all of them.
+        Returns the number of features pulled."""
+        if self.source is None: return 0
+        pulled, pending = 0, []
+        for feature in self.source:
+            if self.buffer is not None:
+                self.buffer.append(feature)
+                self.owner.in_memory += 1
+                if self.owner.in_memory > self.owner.memory_limit: self.owner.evict()
+            else:
+                pending.append(feature)
+            pulled += 1
+            if pulled == number: break
+        else:
+            # The source is exhausted #
+            self.source = None
+        # Features pulled after a spill go to disk together #
+        if pending: self.insert(pending)
+        if self.connection and self.source is None: self.connection.commit()
+        self.count += pulled
+        return pulled
+
+    def chunk(self, index):
+        """The features from *index* on, as many as fit in a chunk."""
+        if self.buffer is not None: return self.buffer[index:index+self.chunk_size]
+        rows = self.connection.execute("SELECT * FROM features WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                       (index, self.chunk_size)).fetchall()
+        # Byte strings were stored as blobs, text as unicode #
+        return [tuple(str(v) if isinstance(v, buffer) else v for v in row) for row in rows]
+
+    def insert(self, features):
+        if not features: return
+        if self.insertion is None:
+            width = len(features[0])
+            self.connection.execute("CREATE TABLE features (%s)" % ','.join('c%i' % i for i in range(width)))
+            self.insertion = "INSERT INTO features VALUES (%s)" % ','.join('?' * width)
+        self.connection.executemany(self.insertion, (tuple(buffer(v) if isinstance(v, str) else v for v in f) for f in features))
+
+    def spill(self):
+        """Moves the features in memory to a new temporary file."""
+        self.path = temporary_path('.sql')
+        self.connection = sqlite3.connect(self.path)
+        self.insert(self.buffer)
+        self.owner.in_memory -= len(self.buffer)
+        self.buffer = None
+
+    def release(self):
+        if self.buffer is not None: self.owner.in_memory -= len(self.buffer)
+        self.released = True
+        self.buffer = []
+        self.source = None
+        self.count = 0
+        if self.connection: self.connection.close()
+        if self.path and os.path.exists(self.path): os.remove(self.path)
+        self.connection = self.path = None
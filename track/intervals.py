@@ -0,0 +1,229 @@
+"""
+This module implements interval algebra on whole chromosomes at once.
+An ``IntervalArray`` holds the starts, ends and optionally the scores of
+the features of one chromosome as NumPy arrays, sorted by start and end.
+The operations (union, intersection, subtraction, complement, flanking,
+merging, thresholding and pieces of overlap) are computed with ``searchsorted``, ``cumsum``
+and masks instead of a Python loop over the features.
+
+Manipulations that define a ``vectorized`` function accept interval
+arrays in place of tracks or generators, see `track.manipulate`.
+
+This module requires NumPy.
+"""
+
+# Internal modules #
+from track.util import check_neighborhood
+
+# Extra modules #
+import numpy
+
+################################################################################
+class IntervalArray(object):
+    """The features of one chromosome as arrays.
+
+    ::
+
+        >>> x = IntervalArray([0, 10, 15], [5, 20, 30])
+        >>> x.features()
+        [(0, 5), (10, 20), (15, 30)]
+        >>> x.complement(40).features()
+        [(5, 10), (30, 40)]
+    """
+
+    def __init__(self, starts, ends, scores=None, merged=False):
+        self.starts = numpy.asarray(starts, dtype=numpy.int64)
+        self.ends   = numpy.asarray(ends,   dtype=numpy.int64)
+        self.scores = None if scores is None else numpy.asarray(scores, dtype=numpy.float64)
+        # Sort by start and end if needed #
+        if len(self.starts) > 1 and not merged:
+            order = numpy.lexsort((self.ends, self.starts))
+            self.starts, self.ends = self.starts[order], self.ends[order]
+            if self.scores is not None: self.scores = self.scores[order]
+        # Do the intervals neither overlap nor touch each other #
+        self.merged = merged
+
+    @classmethod
+    def from_features(cls, features, score=None):
+        """Makes an interval array from features as tuples. *score* is the index of the score in the tuples, if any."""
+        features = list(features)
+        starts = [f[0] for f in features]
+        ends   = [f[1] for f in features]
+        scores = None if score is None else [f[score] for f in features]
+        return cls(starts, ends, scores)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        return '<%s object with %i intervals>' % (self.__class__.__name__, len(self))
+
+    def features(self):
+        """The intervals as a list of tuples, with the score if there is one."""
+        if self.scores is None: return zip(self.starts.tolist(), self.ends.tolist())
+        return zip(self.starts.tolist(), self.ends.tolist(), self.scores.tolist())
+
+    #-------------------------------------------------------------------------#
+    def merge(self):
+        """Fuses intervals that overlap or touch each other, summing their scores.
+
+        ::
+
+            >>> IntervalArray([0, 5, 12], [5, 8, 14], [1.0, 2.0, 4.0]).merge().features()
+            [(0, 8, 3.0), (12, 14, 4.0)]
+        """
+        if self.merged or len(self) == 0: return self
+        # A new cluster starts after every gap in the running maximum of the ends #
+        reach = numpy.maximum.accumulate(self.ends)
+        first = numpy.concatenate(([True], self.starts[1:] > reach[:-1]))
+        heads = numpy.flatnonzero(first)
+        last  = numpy.concatenate((heads[1:], [len(self)])) - 1
+        scores = None if self.scores is None else numpy.add.reduceat(self.scores, heads)
+        return IntervalArray(self.starts[heads], reach[last], scores, merged=True)
+
+    def union(self, other):
+        """The positions covered by either array."""
+        scores = None
+        if self.scores is not None and other.scores is not None:
+            scores = numpy.concatenate((self.scores, other.scores))
+        return IntervalArray(numpy.concatenate((self.starts, other.starts)),
+                             numpy.concatenate((self.ends,   other.ends)), scores).merge()
+
+    def complement(self, length):
+        """The positions between 0 and *length* covered by no interval."""
+        x = self.merge()
+        starts = numpy.concatenate(([0], x.ends))
+        ends   = numpy.concatenate((x.starts, [length]))
+        keep = starts < ends
+        return IntervalArray(starts[keep], ends[keep], merged=True).trim(0, length)
+
+    def trim(self, low, high):
+        """Clips the intervals to the region between *low* and *high*, dropping those outside."""
+        keep = (self.ends > low) & (self.starts < high)
+        scores = None if self.scores is None else self.scores[keep]
+        return IntervalArray(numpy.maximum(self.starts[keep], low), numpy.minimum(self.ends[keep], high),
+                             scores, merged=self.merged)
+
+    def _covered(self, other, keep):
+        """The positions where the coverage of *self*, counting one, and of
+        *other*, counting two, is in *keep*."""
+        x, y = self.merge(), other.merge()
+        if len(x) + len(y) == 0: return IntervalArray([], [], merged=True)
+        positions = numpy.concatenate((x.starts, x.ends, y.starts, y.ends))
+        steps = numpy.concatenate((numpy.ones(len(x)), -numpy.ones(len(x)), 2*numpy.ones(len(y)), -2*numpy.ones(len(y))))
+        order = numpy.argsort(positions, kind='mergesort')
+        positions, steps = positions[order], steps[order]
+        # The coverage after every distinct position #
+        last = numpy.concatenate((positions[1:] != positions[:-1], [True]))
+        coverage = numpy.cumsum(steps)[last]
+        positions = positions[last]
+        inside = numpy.in1d(coverage[:-1], keep)
+        starts, ends = positions[:-1][inside], positions[1:][inside]
+        return IntervalArray(starts, ends, merged=False).merge()
+
+    def intersect(self, other):
+        """The positions covered by both arrays.
+
+        ::
+
+            >>> x = IntervalArray([0, 20], [10, 30])
+            >>> x.intersect(IntervalArray([5], [25])).features()
+            [(5, 10), (20, 25)]
+        """
+        return self._covered(other, [3])
+
+    def subtract(self, other):
+        """The positions covered by this array but not by *other*.
+
+        ::
+
+            >>> x = IntervalArray([0, 20], [10, 30])
+            >>> x.subtract(IntervalArray([5], [25])).features()
+            [(0, 5), (25, 30)]
+        """
+        return self._covered(other, [1])
+
+    def overlaps(self, other):
+        """A boolean mask of the intervals overlapping at least one interval of *other*."""
+        y = other.merge()
+        if len(y) == 0: return numpy.zeros(len(self), dtype=bool)
+        i = numpy.searchsorted(y.starts, self.ends, 'left') - 1
+        j = numpy.maximum(i, 0)
+        return (i >= 0) & (y.ends[j] > self.starts)
+
+    def pieces(self, other):
+        """The overlap of every interval with every interval of *other* it
+        overlaps, like the ``overlap`` manipulation. The scores are averaged
+        if both arrays have some.
+
+        ::
+
+            >>> x = IntervalArray([0, 20], [10, 30])
+            >>> x.pieces(IntervalArray([5, 8], [25, 9])).features()
+            [(5, 10), (8, 9), (20, 25)]
+        """
+        # Intervals of other starting inside those of self, then the reverse #
+        i, j = starting_inside(self.starts, self.ends, other.starts, 'left')
+        k, l = starting_inside(other.starts, other.ends, self.starts, 'right')
+        i, j = numpy.concatenate((i, l)), numpy.concatenate((j, k))
+        keep = (self.starts[i] < other.ends[j]) & (other.starts[j] < self.ends[i])
+        i, j = i[keep], j[keep]
+        scores = None
+        if self.scores is not None and other.scores is not None: scores = (self.scores[i] + other.scores[j]) / 2.0
+        return IntervalArray(numpy.maximum(self.starts[i], other.starts[j]),
+                             numpy.minimum(self.ends[i],   other.ends[j]), scores)
+
+    def select(self, mask):
+        """The intervals where *mask* is true."""
+        scores = None if self.scores is None else self.scores[mask]
+        return IntervalArray(self.starts[mask], self.ends[mask], scores, merged=self.merged)
+
+    def threshold(self, score):
+        """The intervals with a score of at least *score*."""
+        if self.scores is None: raise Exception("The interval array has no scores to threshold.")
+        return self.select(self.scores >= score)
+
+    def flank(self, before_start=0, after_end=0, after_start=0, before_end=0, length=None):
+        """The regions around every interval, like the ``neighborhood``
+        manipulation: with *before_start* and *after_start* relative to the
+        start, *before_end* and *after_end* relative to the end, or from
+        *before_start* to *after_end*. Zero means unused. The result is
+        clipped to the chromosome of *length* if given. Every region keeps
+        the score of its interval.
+
+        ::
+
+            >>> IntervalArray([10, 50], [20, 60], [1.0, 2.0]).flank(-5, 5).features()
+            [(5, 25, 1.0), (45, 65, 2.0)]
+        """
+        check_neighborhood(before_start, after_end, after_start, before_end)
+        s, e, v = self.starts, self.ends, self.scores
+        if before_start and after_end and after_start and before_end:
+            starts = numpy.column_stack((s+before_start, e+before_end)).ravel()
+            ends   = numpy.column_stack((s+after_start,  e+after_end)).ravel()
+            if v is not None: v = numpy.column_stack((v, v)).ravel()
+        elif before_start and after_start: starts, ends = s+before_start, s+after_start
+        elif before_end   and after_end:   starts, ends = e+before_end,   e+after_end
+        elif before_start and after_end:   starts, ends = s+before_start, e+after_end
+        else:                              starts, ends, v = s[:0], e[:0], v if v is None else v[:0]
+        keep = (ends >= 0) & (starts < ends)
+        if length is not None: keep &= starts <= length
+        starts, ends = numpy.maximum(starts[keep], 0), ends[keep]
+        if length is not None: ends = numpy.minimum(ends, length)
+        return IntervalArray(starts, ends, None if v is None else v[keep])
+
+################################################################################
+def starting_inside(starts, ends, others, side):
+    """The pairs of indices ``(i, j)`` where the sorted *others[j]* lies between
+    *starts[i]*, included if *side* is ``'left'``, and *ends[i]*, excluded."""
+    low, high = numpy.searchsorted(others, starts, side), numpy.searchsorted(others, ends, 'left')
+    counts = numpy.maximum(high - low, 0)
+    i = numpy.repeat(numpy.arange(len(starts)), counts)
+    j = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts - low, counts)
+    return i, j
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
@@ -1,7 +1,6 @@
 # coding: utf-8
 
 ################################### Modules ####################################
-from track.test import samples
 
 ################################# Description ##################################
 label           = 'closest_features'
@@ -16,7 +15,9 @@ input_args      = [{'key':'min_length',  'position':3, 'type': int, 'default': 1
                    {'key':'utr_cutoff',  'position':4, 'type': int, 'default': 2000,
                     'doc':'Distance below which the gene is attributed to both.'},
                    {'key':'prom_cutoff', 'position':5, 'type': int, 'default': 10,
-                    'doc':'Distance percentage below which attribution is to preceding gene.'}]
+                    'doc':'Distance percentage below which attribution is to preceding gene.'},
+                   {'key':'k',           'position':6, 'type': int, 'default': 0,
+                    'doc':'If positive, attribute the k closest genes instead, ties included.'}]
 input_meta      = []
 output_tracks   = [{'position':1, 'fields': ['start','end','name','id','type','location']}]
 tracks_collapse = None
@@ -34,6 +35,12 @@ the most relevant(s) gene(s) associated to each peak.
 * In cases where the peak is near two promoters (one on each strand), ``utr_cutoff`` indicates the threshold above which the peak isn't attributed to any gene. Below this threshold, the peak will be attributed to both genes. This defaults to ``2000``.
 
 * In cases where the peak is between two genes on the same strand, ``prom_cutoff`` indicates the percentage of the distance between the two genes below which the peak is attributed to the 3'UTR of the preceding gene rather than to the promoter of the following gene. This defaults to ``10``.
+
+* Peaks overlapping genes are attributed to all of them. Between two genes facing each other by their 3' ends, the closest one is chosen. Ties in distance are attributed to all the genes concerned.
+
+* If ``k`` is positive, the rules above are ignored and every peak is attributed to its ``k`` closest genes within ``min_length``, more in case of ties.
+
+The ``id`` field contains the names of the genes, the ``type`` field tells if the peak is ``upstream``, ``downstream`` or ``inside`` each gene, taking its strand into account, and the ``location`` field gives the distances, all separated by ``|``.
 """
 
 tickets = []
@@ -56,14 +63,96 @@ u"""
 """
 
 #################################### Tests #####################################
+genes = [(100,  200,  'G1',  1), (300,  400,  'G2', -1), (420,  500,  'G3',  1),
+         (700,  800,  'G4',  1), (900,  1000, 'G5',  1), (2000, 2100, 'G6', -1),
+         (2400, 2500, 'G7', -1), (3000, 3100, 'G8',  1), (3300, 3400, 'G9', -1)]
+
+peaks = [(150,  160,  'P1'), (405,  410,  'P2'), (540,  560,  'P3'),
+         (805,  810,  'P4'), (1500, 1510, 'P5'), (2200, 2210, 'P6'),
+         (2250, 2260, 'P7'), (3150, 3160, 'P8'), (3195, 3205, 'P9')]
+
 tests = [
-    {'tracks':   {'X': samples['small_signals'][4]['sql'],
-                  'Y': samples['small_features'][2]['sql']},
-     'chromosome': 'chrI',
-     'expected': [(10, 20, 'Name1',  15.0, -1),
-                  (30, 40, 'Name2',  50.0,  1)]}]
+    {'tracks':   {'X': iter(peaks), 'Y': iter(genes)},
+     'args':     {'min_length': 150, 'utr_cutoff': 30, 'prom_cutoff': 10},
+     'expected': [(150,  160,  'P1', 'G1',    'inside',                '0'),
+                  (405,  410,  'P2', 'G2|G3', 'upstream|upstream',     '5|10'),
+                  (540,  560,  'P3', 'G4',    'upstream',              '140'),
+                  (805,  810,  'P4', 'G4',    'downstream',            '5'),
+                  (2200, 2210, 'P6', 'G6',    'upstream',              '100'),
+                  (2250, 2260, 'P7', 'G6',    'upstream',              '150'),
+                  (3150, 3160, 'P8', 'G8',    'downstream',            '50'),
+                  (3195, 3205, 'P9', 'G8|G9', 'downstream|downstream', '95|95')]},
+
+    {'tracks':   {'X': iter(peaks[2:3]), 'Y': iter(genes)},
+     'args':     {'min_length': 150, 'k': 2},
+     'expected': [(540,  560,  'P3', 'G3|G2|G4', 'downstream|upstream|upstream', '40|140|140')]},
+
+    {'tracks':   {'X': iter([(405, 410, 'P2'), (410, 415, 'P10')]), 'Y': iter(genes)},
+     'args':     {'min_length': 150, 'utr_cutoff': 7, 'prom_cutoff': 10},
+     'expected': []}]
 
 ############################### Implementation #################################
-def generate(X, Y, min_length, utr_cutoff, prom_cutoff):
-    yield (10, 20, 'Name1',  15.0, -1)
-    yield (30, 40, 'Name2',  50.0,  1)
+def distance(x, y):
+    """Number of base pairs between the features *x* and *y*, zero if they overlap or touch."""
+    return max(0, y[0] - x[1], x[0] - y[1])
+
+def relation(x, y):
+    """Where the peak *x* lies relative to the gene *y*, taking its strand into account."""
+    if x[0] < y[1] and y[0] < x[1]: return 'inside'
+    upstream = x[1] <= y[0]
+    if y[3] < 0: upstream = not upstream
+    return upstream and 'upstream' or 'downstream'
+
+def closest(candidates):
+    """The genes of a list of (distance, gene) pairs at the smallest distance."""
+    if not candidates: return []
+    best = min(d for d,g in candidates)
+    return [(d,g) for d,g in candidates if d == best]
+
+def attribute(x, candidates, utr_cutoff, prom_cutoff):
+    """Choose among the genes close enough to the peak *x* according to
+    their position and strand, see the documentation above."""
+    inside = [(d,g) for d,g in candidates if relation(x,g) == 'inside']
+    if inside: return inside
+    left  = closest([(d,g) for d,g in candidates if g[1] <= x[0]])
+    right = closest([(d,g) for d,g in candidates if g[0] >= x[1]])
+    if not left or not right: return left + right
+    (dl, l), (dr, r) = left[0], right[0]
+    # Two promoters, one on each strand #
+    if l[3] < 0 and r[3] >= 0:
+        return left + right if dl <= utr_cutoff and dr <= utr_cutoff else []
+    # Two genes on the same strand, the preceding one gets its 3'UTR #
+    elif l[3] >= 0 and r[3] >= 0:
+        return left if dl*100 <= prom_cutoff*(r[0]-l[1]) else right
+    elif l[3] < 0 and r[3] < 0:
+        return right if dr*100 <= prom_cutoff*(r[0]-l[1]) else left
+    # Otherwise the closest #
+    return closest(left + right)
+
+def generate(X, Y, min_length, utr_cutoff, prom_cutoff, k=0):
+    """Both tracks are swept together. The genes are kept in a window
+    from the moment they start less than *min_length* after the current
+    peak until they end more than *min_length* before it."""
+    Y = iter(Y)
+    y = next(Y, None)
+    window = []
+    for x in X:
+        # Genes starting close enough after the peak #
+        while y is not None and y[0] - x[1] <= min_length:
+            window.append(y)
+            y = next(Y, None)
+        # Genes ending too far before the peak, and before all the next ones #
+        window = [g for g in window if x[0] - g[1] <= min_length]
+        candidates = [(distance(x,g), g) for g in window]
+        candidates = [(d,g) for d,g in candidates if d <= min_length]
+        # Choose the genes #
+        if k > 0:
+            candidates.sort(key=lambda c: (c[0], c[1][0], c[1][1]))
+            chosen = [c for c in candidates if c[0] <= candidates[k-1][0]] if len(candidates) > k else candidates
+        else:
+            chosen = attribute(x, candidates, utr_cutoff, prom_cutoff)
+        if not chosen: continue
+        yield (x[0], x[1], x[2],
+               '|'.join(g[2] for d,g in chosen),
+               '|'.join(relation(x,g) for d,g in chosen),
+               '|'.join(str(d) for d,g in chosen))
@@ -61,3 +61,6 @@ def generate(X, l):
             end = max(x[1], end)
     if end < l:
         yield (end, l)
+
+def vectorized(X, l):
+    return X.complement(l)
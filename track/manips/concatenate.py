@@ -1,8 +1,7 @@
 # coding: utf-8
 
 ################################### Modules ####################################
-import sys
-from track import common
+from track import sweep
 from track.test import samples
 from operator import itemgetter
 
@@ -70,23 +69,5 @@ tests = [
 
 ############################### Implementation #################################
 def generate(n_tracks):
-    # Get all iterators #
-    sentinel = (sys.maxint, sys.maxint, 0.0)
-    tracks   = [common.sentinelize(x, sentinel) for x in n_tracks]
-    features = range(len(tracks))
-    # Advance feature #
-    def advance(i):
-        features[i] = tracks[i].next()
-        if features[i] == sentinel:
-            tracks.pop(i)
-            features.pop(i)
-    # Find lowest feature #
-    def get_lowest_feature():
-        i = min(enumerate([(f[0],f[1]) for f in features]), key=itemgetter(1))[0]
-        return i, features[i]
-    # Core loop #
-    for i in xrange(len(tracks)-1, -1, -1): advance(i)
-    while tracks:
-        i,f = get_lowest_feature()
-        yield f
-        advance(i)
+    # Merge all tracks with a heap holding the next feature of every track #
+    return sweep.merge(n_tracks, key=itemgetter(0,1))
@@ -1,9 +1,8 @@
 # coding: utf-8
 
 ################################### Modules ####################################
-import sys
 import types
-from track import common
+from track import sweep
 
 ################################# Description ##################################
 label           = 'custom_boolean'
@@ -14,7 +13,7 @@ input_tracks    = [{'key':'n_tracks', 'position':1, 'kind':'many',
 input_args      = [{'key':'fn', 'position':2, 'type':types.FunctionType,
                     'doc':'A function that takes a vector and returns a boolean.'},
                    {'key':'win_size', 'position':3, 'type': int, 'default': 1000,
-                    'doc':'The number of basepairs loaded in memory at each iteration (default: 1000).'}]
+                    'doc':'Ignored, only kept for compatibility (default: 1000).'}]
 input_meta      = []
 output_tracks   = [{'position':1, 'fields': ['start','end']}]
 tracks_collapse = None
@@ -26,8 +25,11 @@ tooltip = \
 """
 The ``custom_boolean`` manipulation takes several tracks *t_1*,..,*t_n* and a
 boolean function *fn* as input, and returns one track that is *fn(t_1,..,t_n)*.
-The window size *win_size* determines how many basepairs of each track are
-loaded in memory at a time (default: 1000).
+The function receives a list of booleans telling which tracks cover the
+current position. It is called only once for every combination of covered
+tracks and its result is remembered, so it must depend on nothing else than
+that list. The window size *win_size* is ignored and only kept for
+compatibility.
 """
 
 tickets = []
@@ -84,64 +86,84 @@ tests = [
      'expected': fill([(1,3),(9,10),(12,14)])}]
 
 ############################### Implementation #################################
-def generate(**kwargs):
+def boolean_form(among=None, k=None, forbidden=()):
+    """Returns a boolean function that is true when at least *k* of the
+    tracks *among* are covered and none of the tracks *forbidden* is.
+    *among* defaults to all tracks, *k* to the number of tracks in *among*
+    and *forbidden* can be None for all tracks. Instead of calling such a
+    function at every boundary, the sweep keeps a bitmask of the covered
+    tracks and a count, updated only for the tracks that change."""
+    def fn(activity):
+        indices = range(len(activity)) if among is None else among
+        excluded = range(len(activity)) if forbidden is None else forbidden
+        needed = len(indices) if k is None else k
+        return sum(1 for i in indices if activity[i]) >= needed and not any(activity[i] for i in excluded)
+    fn.form = (among, k, forbidden)
+    return fn
+
+def all_of(*indices):
+    """Boolean AND of the given tracks, or of all tracks."""
+    return boolean_form(indices or None)
+
+def any_of(*indices):
+    """Boolean OR of the given tracks, or of all tracks."""
+    return boolean_form(indices or None, 1)
+
+def none_of(*indices):
+    """Boolean NOT of the given tracks, or of all tracks."""
+    return boolean_form((), 0, indices or None)
+
+def k_of_n(k, *indices):
+    """True when at least *k* of the given tracks, or of all tracks, are covered."""
+    return boolean_form(indices or None, k)
+
+def compile_form(fn, N):
+    """Returns which tracks are counted, the number of them needed and the
+    bitmask of the forbidden tracks, or None if *fn* is not a form."""
+    form = getattr(fn, 'form', None)
+    if form is None: return None
+    among, k, forbidden = form
+    if among     is None: among     = range(N)
+    if forbidden is None: forbidden = range(N)
+    among = set(among)
+    counted = [i in among for i in xrange(N)]
+    excluded = sum(1 << i for i in set(forbidden))
+    return counted, len(among) if k is None else k, excluded
+
+def generate(n_tracks, fn, win_size=1000):
+    """The boundaries of all tracks are swept with a heap. The coverage of
+    every track is kept from one boundary to the next, only the tracks
+    changing at a boundary are updated. A function that is not a form is
+    only called once for every combination of covered tracks, its results
+    being remembered by bitmask. *win_size* is not needed anymore and is
+    only kept for compatibility."""
     import fusion
-    for f in fusion.generate(meta_generate(**kwargs)): yield f
-
-def meta_generate(n_tracks, fn, win_size):
-    import fusion
-    tracks = n_tracks
-    sentinel = (sys.maxint, sys.maxint, 0.0)
-    tracks = [fusion.generate(t) for t in tracks]
-    tracks = [common.sentinelize(t, sentinel) for t in tracks]
-
+    tracks = [fusion.generate(t, names=False) for t in n_tracks]
     N = len(tracks)
-    init = [tracks[i].next() for i in range(N)]
-    for i in xrange(N-1,-1,-1):
-        if init[i] == sentinel: # empty track
-            N-=1
-            tracks.pop(i)
-            init.pop(i)
-    available_tracks = range(N-1,-1,-1)
+    compiled = compile_form(fn, N)
+    # Current state #
     activity = [False]*N
-    current = []
-    current.extend([(init[i][0],i) for i in range(N)])
-    current.extend([(init[i][1],i) for i in range(N)])
-    current.sort()
-
-    start = current[0][0]
-    while current[0][0] == start:
-        activity[current[0][1]] = True
-        z = current.pop(0)
-
-    k=1
-    while available_tracks:
-        # load *win_size* bp in memory
-        to_remove = []
-        for i in available_tracks:
-            a = [0,0]
-            limit = k*win_size
-            while a[1] < limit:
-                a = tracks[i].next()
-                if a == sentinel:
-                    to_remove.append(i)
-                    break
-                current.append((a[0],i))
-                current.append((a[1],i))
-        for i in to_remove:
-            available_tracks.remove(i)
-        current.sort()
-
-        # calculate boolean values for start-next interval
-        while current and current[0][0] < limit:
-            next = current[0][0]
-            res = fn(activity)
-            if res:
-                yield (start,next,'',0.0,0)
-            while current and current[0][0] == next:
-                i = current[0][1]
-                activity[i] = not(activity[i])
-                z = current.pop(0)
-            start = next
-        k+=1
-
+    active = 0
+    results = {}
+    count = 0
+    start = position = None
+    for position, changed in sweep.boundaries(tracks):
+        for i in changed:
+            activity[i] = not activity[i]
+            active ^= 1 << i
+        # Evaluate the function on the interval starting here #
+        if compiled is None:
+            result = results.get(active)
+            if result is None: result = results[active] = bool(fn(activity))
+        else:
+            counted, needed, excluded = compiled
+            for i in changed:
+                if counted[i]: count += 1 if activity[i] else -1
+            result = count >= needed and not active & excluded
+        # Yield the intervals where the result is true, merged #
+        if result and start is None: start = position
+        elif not result and start is not None:
+            yield (start, position, '', 0.0, 0)
+            start = None
+    # Nothing is yielded after the last boundary #
+    if start is not None and start < position: yield (start, position, '', 0.0, 0)
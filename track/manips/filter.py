@@ -86,3 +86,6 @@ def generate(X, Y):
             if x == sentinel:
                 continue_loop = False
                 break
+
+def vectorized(X, Y):
+    return X.select(X.overlaps(Y))
@@ -9,7 +9,10 @@ short_name      = 'Fusion'
 long_name       = 'Fuses features that are adjacent or overlapping in a track'
 input_tracks    = [{'key':'X', 'position':1, 'kind': 'single',
                     'fields':['start','end','name','score','strand']}]
-input_args      = []
+input_args      = [{'key':'names', 'position':2, 'type': bool, 'default': True,
+                    'doc':'Join the names of the fused features, otherwise only the first name is kept.'},
+                   {'key':'max_names', 'position':3, 'type': int, 'default': 0,
+                    'doc':'If positive, the maximum number of names joined, the others are only counted.'}]
 input_meta      = []
 output_tracks   = [{'position':1, 'fields': ['start','end','name','score','strand']}]
 tracks_collapse = None
@@ -23,7 +26,9 @@ The ``fusion`` manipulation will combine any features in a track that
 are adjacent to one another or overlapping each other into a single
 feature. The strand attribute will be conserved only if all features
 that are being merged have the same strand. The score attribute will
-be the sum of all the scores.
+be the sum of all the scores. The names are joined with ``+``, unless
+``names`` is false, in which case only the first name is kept. When fusing
+large clusters, ``max_names`` can limit the number of names joined.
 """
 
 tickets = []
@@ -57,29 +62,55 @@ tests = [
                   (188, 193, u'',   10.0, 0),
                   (198, 200, u'',   40.0, 0)]}
      ,
+    {'tracks':   {'X': iter([(0,5,'a',1.0,1), (3,8,'b',2.0,1), (6,9,'c',0.5,-1), (20,30,'d',1.0,1)])},
+     'args':     {'max_names': 2},
+     'expected': [(0,9,'a + b + 1 others',3.5,0), (20,30,'d',1.0,1)]}
+     ,
+    {'tracks':   {'X': iter([(0,5,'a',1.0,1), (3,8,'b',2.0,1), (20,30,'d',1.0,1)])},
+     'args':     {'names': False},
+     'expected': [(0,8,'a',3.0,1), (20,30,'d',1.0,1)]}
+     ,
     #{'tracks':   {'X': [(0,5),(5,7)]},
     #'expected': [(0,7,'',0.0,0)]},
     ]
 
 ############################### Implementation #################################
-def generate(X):
+def generate(X, names=True, max_names=0):
+    """The names of a cluster are collected in a list and joined only
+    once, when the fused feature is emitted."""
     # Setup #
     for x in X: break
     if 'x' not in locals(): return
+    # The cluster being built #
+    def restart(x):
+        return x, x[1], [x[2]] if x[2] else [], x[2], 0, x[3], x[4], False
+    first, end, labels, last, others, score, strand, fused = restart(x)
+    def emit():
+        if not fused: return tuple(first)
+        if not names:  name = first[2]
+        elif labels:   name = ' + '.join(labels) + (others and ' + %i others' % others or '')
+        else:          name = last
+        return (first[0], end, name, score, strand) + tuple(first[5:])
     # Core loop #
     for y in X:
-        if y[0] <= x[1]:
-            x = list(x)
-            x[1] = max(x[1], y[1])
+        if y[0] <= end:
+            fused = True
+            end = max(end, y[1])
             # Name #
-            if x[2] and y[2]: x[2] = x[2] + ' + ' + y[2]
-            else: x[2] = x[2] or y[2]
+            if names:
+                if not y[2]: last = y[2]
+                elif max_names <= 0 or len(labels) < max_names: labels.append(y[2])
+                else: others += 1
             # Score #
-            x[3] = x[3] + y[3]
+            score = score + y[3]
             # Strand #
-            x[4] = x[4] == y[4] and x[4] or 0
+            strand = strand == y[4] and strand or 0
         else:
-            yield tuple(x)
-            x = y
+            yield emit()
+            first, end, labels, last, others, score, strand, fused = restart(y)
     # Last feature #
-    yield tuple(x)
+    yield emit()
+
+def vectorized(X, names=True, max_names=0):
+    # Interval arrays have no names #
+    return X.merge()
@@ -1,8 +1,7 @@
 # coding: utf-8
 
 ################################### Modules ####################################
-import sys
-from track import common
+import bisect
 from track.test import samples
 
 ################################# Description ##################################
@@ -71,31 +70,59 @@ tests = [
 
 ############################### Implementation #################################
 def generate(X, Y):
-    # Sentinel #
-    sentinel = (sys.maxint, sys.maxint, 0.0)
-    X = common.sentinelize(X, sentinel)
-    # Growing and shrinking list of features in X #
-    F = [(-sys.maxint, -sys.maxint, 0.0)]
+    """The scores of X are accumulated in a prefix sum, so that the
+    score of every feature in Y is the difference of two values found by
+    binary search. Only the part of X that the next features of Y can
+    still overlap is kept, and the prefix sum restarts from zero when
+    this part moves on."""
+    X = iter(X)
+    x = next(X, None)
+    # The features of X kept and the total score before each of them #
+    starts, ends, scores, totals = [], [], [], [0.0]
+    first = 0
+    # Total score up to a position #
+    def total(p):
+        i = bisect.bisect_right(starts, p, first) - 1
+        if i < first: return totals[first]
+        return totals[i] + (min(p, ends[i]) - starts[i]) * scores[i]
     # --- Core loop --- #
     for y in Y:
         # Check that we have all the scores necessary #
-        xnext = F[-1]
-        while xnext[0] < y[1]:
-            xnext = X.next()
-            if xnext[1] > y[0]: F.append(xnext)
-        # Throw away the scores that are not needed anymore #
-        n = 0
-        while F[n][1] <= y[0]:
-            n+=1
-        F = F[n:]
-        # Compute the average #
-        score = 0.0
-        for f in F:
-            if y[1] <= f[0]: continue
-            if f[0] <  y[0]: start = y[0]
-            else:            start = f[0]
-            if y[1] <  f[1]: end   = y[1]
-            else:            end   = f[1]
-            score += (end-start) * f[2]
+        while x is not None and x[0] < y[1]:
+            starts.append(x[0])
+            ends.append(x[1])
+            scores.append(x[2])
+            totals.append(totals[-1] + (x[1]-x[0]) * x[2])
+            x = next(X, None)
+        # Forget the scores that are not needed anymore #
+        first = bisect.bisect_right(ends, y[0], first)
+        if first > 1024 and 2*first > len(starts):
+            del starts[:first], ends[:first], scores[:first]
+            totals = [0.0]
+            for i in xrange(len(starts)): totals.append(totals[-1] + (ends[i]-starts[i]) * scores[i])
+            first = 0
         # Emit a feature #
+        score = total(y[1]) - total(y[0])
         yield y[0:2]+(score/(y[1]-y[0]),)+y[3:]
+
+def mean_scores(x_starts, x_ends, x_scores, starts, ends):
+    """Vectorized version for NumPy arrays: given the starts, ends and
+    scores of a signal that doesn't overlap itself, sorted by start,
+    returns the mean score between every pair of *starts* and *ends*.
+
+    ::
+
+        import numpy
+        from track.manips.mean_score_by_feature import mean_scores
+        mean_scores(numpy.array([10,17]), numpy.array([12,22]), numpy.array([5.0,500.0]),
+                    numpy.array([10,30]), numpy.array([20,40]))
+    """
+    import numpy
+    totals = numpy.concatenate(([0.0], numpy.cumsum((x_ends - x_starts) * x_scores)))
+    def total(p):
+        i = numpy.searchsorted(x_starts, p, 'right') - 1
+        j = numpy.maximum(i, 0)
+        partial = (numpy.minimum(p, x_ends[j]) - x_starts[j]) * x_scores[j]
+        return numpy.where(i >= 0, totals[j] + partial, 0.0)
+    if not len(x_starts): return numpy.zeros(len(starts))
+    return (total(ends) - total(starts)) / (ends - starts)
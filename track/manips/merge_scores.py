@@ -1,8 +1,8 @@
 # coding: utf-8
 
 ################################### Modules ####################################
-import sys
-from track import common
+from operator import itemgetter
+from track import sweep
 from track.test import samples
 
 ################################# Description ##################################
@@ -66,36 +66,11 @@ tests = [
 
 ############################### Implementation #################################
 def generate(n_tracks, geometric=False):
-    # Get all iterators #
-    sentinel = (sys.maxint, sys.maxint, 0.0)
-    tracks = [common.sentinelize(x, sentinel) for x in n_tracks]
-    elements = [x.next() for x in tracks]
-    tracks_denom = 1.0/len(tracks)
+    # Every track counts, even the empty ones #
+    tracks_denom = 1.0/len(n_tracks)
     # Choose meaning function #
     if geometric: mean_fn = lambda x: sum(x)**tracks_denom
     else:         mean_fn = lambda x: sum(x)*tracks_denom
-    # Check empty #
-    for i in xrange(len(tracks)-1, -1, -1):
-        if elements[i] == sentinel:
-            tracks.pop(i)
-            elements.pop(i)
-    # Core loop #
-    while tracks:
-        # Find the next boundaries #
-        start = min([x[0] for x in elements])
-        end = min([x[0] for x in elements if x[0] > start] + [x[1] for x in elements])
-        # Scores between boundaries #
-        scores = [x[2] for x in elements if x[1] > start and x[0] < end]
-        if scores: yield (start, end, mean_fn(scores))
-        # Iterate over elements #
-        for i in xrange(len(tracks)-1, -1, -1):
-            # Change all starts #
-            if elements[i][0] < end:
-                elements[i] = (end, elements[i][1], elements[i][2])
-            # Advance the elements that need to be advanced #
-            if elements[i][1] <= end:
-                elements[i] = tracks[i].next()
-            # Pop sentinels #
-            if elements[i] == sentinel:
-                tracks.pop(i)
-                elements.pop(i)
+    # Core loop over the segments between boundaries #
+    for start, end, scores in sweep.segments(n_tracks, itemgetter(2)):
+        yield (start, end, mean_fn(scores))
@@ -2,6 +2,7 @@
 
 ################################### Modules ####################################
 import sys
+from track.util import check_neighborhood
 from track.test import samples
 
 ################################# Description ##################################
@@ -97,12 +98,7 @@ def bounded(X, min_bound=0, max_bound=sys.maxint):
             yield (max(x[0],min_bound), min(x[1],max_bound)) + x[2:]
 
 def neighborhood(X, l, before_start=0, after_end=0, after_start=0, before_end=0, on_strand=False):
-    if before_start and after_start:
-        if before_start > after_start:
-            raise Exception("'before_start' cannot be larger than 'after_start'")
-    if before_end and after_end:
-        if before_end > after_end:
-            raise Exception("before_end cannot be larger than 'after_end'")
+    check_neighborhood(before_start, after_end, after_start, before_end)
     if not on_strand:
         if before_start and after_end and after_start and before_end:
             for x in X:
@@ -128,3 +124,7 @@ def neighborhood(X, l, before_start=0, after_end=0, after_start=0, before_end=0,
 
 def generate(X, l, **kwargs):
     return bounded(neighborhood(X, l, **kwargs), 0, l)
+
+def vectorized(X, l, on_strand=False, **kwargs):
+    if on_strand: raise Exception("Interval arrays have no strand, 'on_strand' cannot be used.")
+    return X.flank(length=l, **kwargs)
@@ -90,26 +90,71 @@ def generate(X, Y, l):
     Y = common.sentinelize(Y, sentinel)
     x = X.next()
     y = Y.next()
-    Wx = []
-    Wy = []
+    Wx, Wy = [], []
+    # The smallest end in each window tells if some features are left behind, without scanning them
+    Wx_end, Wy_end = sys.maxint, sys.maxint
     # Core loop stops when both x and y are at the sentinel
-    while x[0] != sentinel or y[0] != sentinel:
+    while x is not sentinel or y is not sentinel:
         # Take the leftmost current feature and scan it against the other window
         if x[0] < y[0]:
             # Remove features from the y window that are left of x
-            Wy = [f for f in Wy if f[1] > x[0]]
-            # Yield new features with all overlaps of x in Wy
-            for f in [f for f in Wy if f[1] > x[0] and x[1] > f[0]]: yield make_feature(x, f)
+            if Wy_end <= x[0]:
+                Wy = [f for f in Wy if f[1] > x[0]]
+                Wy_end = min([f[1] for f in Wy] or [sys.maxint])
+            # Yield new features with all overlaps of x in Wy, they all start before x
+            if not Wy: pass
+            elif x[1] > x[0]:
+                for f in Wy: yield make_feature(x, f)
+            else:
+                for f in Wy:
+                    if x[1] > f[0]: yield make_feature(x, f)
             # Put x in the window only if it is not left of y
-            if x[1] >= y[0]: Wx.append(x)
+            if x[1] >= y[0]:
+                Wx.append(x)
+                if x[1] < Wx_end: Wx_end = x[1]
             # Advance current x feature
             x = X.next()
         else:
             # Remove features from the x window that are left of y
-            Wx = [f for f in Wx if f[1] > y[0]]
-            # Yield new features with all overlaps of y in Wx
-            for f in [f for f in Wx if f[1] > y[0] and y[1] > f[0]]: yield make_feature(y, f)
+            if Wx_end <= y[0]:
+                Wx = [f for f in Wx if f[1] > y[0]]
+                Wx_end = min([f[1] for f in Wx] or [sys.maxint])
+            # Yield new features with all overlaps of y in Wx, they all start before y
+            if not Wx: pass
+            elif y[1] > y[0]:
+                for f in Wx: yield make_feature(y, f)
+            else:
+                for f in Wx:
+                    if y[1] > f[0]: yield make_feature(y, f)
             # Put y in the window only if it is not left of x
-            if y[1] >= x[0]: Wy.append(y)
+            if y[1] >= x[0]:
+                Wy.append(y)
+                if y[1] < Wy_end: Wy_end = y[1]
             # Advance current y feature
             y = Y.next()
+
+def vectorized(X, Y, l):
+    # Interval arrays have no names or strands #
+    return X.pieces(Y)
+
+def disjoint_generate(X, Y, l):
+    """Used instead of *generate* when neither track has features
+    overlapping each other, see `Track.is_overlapping`. A feature can then
+    only overlap the current feature of the other track, so that no window
+    is needed and the two tracks are simply walked in step."""
+    # Preparation #
+    sentinel = (sys.maxint, sys.maxint)
+    X = common.sentinelize(X, sentinel)
+    Y = common.sentinelize(Y, sentinel)
+    x = X.next()
+    y = Y.next()
+    # Core loop stops when either track is exhausted
+    while x is not sentinel and y is not sentinel:
+        # Same conditions as generate, the feature starting last is scanned against the other
+        if y[0] <= x[0]:
+            if y[1] > x[0] and (x[1] > x[0] or y[0] < x[0]): yield make_feature(x, y)
+        elif x[1] > y[0]: yield make_feature(y, x)
+        # Advance the feature ending first, or both if they end together
+        advance_x = x[1] <= y[1]
+        if x[1] >= y[1]: y = Y.next()
+        if advance_x: x = X.next()
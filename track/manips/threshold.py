@@ -57,3 +57,6 @@ tests = [
 def generate(X, s):
     for x in X:
         if x[2] >= s: yield tuple(x)
+
+def vectorized(X, s):
+    return X.threshold(s)
@@ -2,7 +2,7 @@
 
 ################################### Modules ####################################
 import sys
-from track import common
+from itertools import tee
 
 ################################# Description ##################################
 label           = 'window_smoothing'
@@ -10,7 +10,9 @@ short_name      = 'Window smoothing'
 long_name       = 'Smooth scores with a moving window'
 input_tracks    = [{'key':'X', 'position':1, 'kind':'single', 'no-overlap':True,
                     'fields':['start','end','score']}]
-input_args      = [{'key':'L', 'position':2, 'type': int, 'default': 200, 'doc':'The window radius.'}]
+input_args      = [{'key':'L', 'position':2, 'type': int, 'default': 200, 'doc':'The window radius.'},
+                   {'key':'dense', 'position':4, 'type': bool, 'default': False,
+                    'doc':'Use a NumPy convolution, faster on dense signals but with possible rounding differences.'}]
 input_meta      = [{'key':'l', 'position':3, 'type': int, 'kind':'chrom_len'}]
 output_tracks   = [{'position':1, 'fields': ['start','end','score'], 'datatype':'signal'}]
 tracks_collapse = None
@@ -24,7 +26,10 @@ Given a signal track and a window size in base pairs,
 the ``windows_smoothing`` manipulation will output a new signal
 track with, at each position p, the mean of the scores
 in the window [p-L, p+L]. Border cases are handled by zero padding
-and the signal's support is invariant.
+and the signal's support is invariant. If the boolean value ``dense``
+is true, the means are computed with a NumPy convolution, which is
+faster when most of the chromosome is covered, but the last digits
+of the scores can differ.
 """
 
 tickets = ['https://github.com/bbcf/gMiner/issues/7']
@@ -59,12 +64,21 @@ tests = [
                   (9,  10,  2.0),]}]
 
 ############################### Implementation #################################
-def generate(X, L, l):
+def generate(X, L, l, dense=False):
+    if dense: return dense_generate(X, L, l)
+    return sparse_generate(X, L, l)
+
+def sparse_generate(X, L, l):
+    """The mean is updated for every base pair entering or leaving the window,
+    but positions between two feature edges where this doesn't change the mean,
+    such as long empty stretches, are jumped over."""
     # Sentinel #
     sentinel = (sys.maxint, sys.maxint, 0.0)
-    X = common.sentinelize(X, sentinel)
-    # Growing and shrinking list of features around our moving window #
-    F = []
+    # One iterator for the base entering the window and one for the base leaving it #
+    A, B = tee(X)
+    a = next(A, sentinel)
+    b = next(B, sentinel)
+    if a is sentinel: return
     # Current position counting on nucleotides (first nucleotide is zero) #
     p = -L-2
     # Position since which the mean hasn't changed #
@@ -74,22 +88,17 @@ def generate(X, L, l):
     next_mean = 0
     # Multiplication factor instead of division #
     f = 1.0 / (2*L+1)
-    # First feature if it exists #
-    F.append(X.next())
-    if F == [sentinel]: return
     # Core loop #
     while True:
         # Advance one #
         p += 1
-        # Window start and stop #
-        s = p-L
-        e = p+L+1
-        # Scores entering window #
-        if F[-1][1] < e: F.append(X.next())
-        if F[-1][0] < e: next_mean += F[-1][2] * f
-        # Scores exiting window #
-        if F[ 0][1] < s: F.pop(0)
-        if F[ 0][0] < s: next_mean -= F[ 0][2] * f
+        previous_mean = next_mean
+        # Score entering window #
+        while a[1] <= p+L: a = next(A, sentinel)
+        if a[0] <= p+L: next_mean += a[2] * f
+        # Score exiting window #
+        while b[1] <= p-L-1: b = next(B, sentinel)
+        if b[0] <= p-L-1: next_mean -= b[2] * f
         # Border condition on the left #
         if p < 0:
             curt_mean = 0
@@ -104,3 +113,43 @@ def generate(X, L, l):
             if curt_mean != 0: yield (same_since, p, curt_mean)
             curt_mean  = next_mean
             same_since = p
+        # Nothing changes until the next feature edge enters or leaves the window #
+        if next_mean == previous_mean:
+            next_in  = (a[0] if a[0] > p+L   else a[1]) - L
+            next_out = (b[0] if b[0] > p-L-1 else b[1]) + L + 1
+            p = min(next_in, next_out, l) - 1
+
+def dense_generate(X, L, l, chunk_size=1048576):
+    """The chromosome is processed in chunks: the scores of every chunk
+    and of its borders are put in an array, which is convolved with the
+    window, then every run of equal means becomes a feature."""
+    import numpy
+    window = numpy.ones(2*L+1)
+    f = 1.0 / (2*L+1)
+    X = iter(X)
+    x = next(X, None)
+    kept = []
+    # The current mean and since when #
+    curt_mean = 0
+    same_since = 0
+    for offset in xrange(0, l, chunk_size):
+        stop = min(offset + chunk_size, l)
+        # Scores of the base pairs in all windows of this chunk #
+        low, high = offset-L, stop+L
+        while x is not None and x[0] < high:
+            kept.append(x)
+            x = next(X, None)
+        scores = numpy.zeros(high-low)
+        for start, end, score in kept:
+            if end > low: scores[max(start,low)-low:min(end,high)-low] = score
+        kept = [k for k in kept if k[1] > stop-L]
+        means = numpy.convolve(scores, window, 'valid') * f
+        # Every run of equal means #
+        changes = numpy.flatnonzero(means[1:] != means[:-1]) + 1
+        for i in [0] + changes.tolist():
+            mean = float(means[i])
+            if mean == curt_mean: continue
+            if curt_mean != 0: yield (same_since, offset+i, curt_mean)
+            curt_mean  = mean
+            same_since = offset+i
+    if curt_mean != 0: yield (same_since, l, curt_mean)
@@ -4,13 +4,13 @@ All manipulations
 """
 
 # Built-in modules #
-import sys, types, pkgutil, sqlite3
+import sys, types, pkgutil, sqlite3, multiprocessing, itertools
 
 # Internal modules #
 import track
 from track import manips, Track, FeatureStream
 from track.extras import TrackCollection, VirtualTrack
-from track.common import import_module, collapse, andify_strings
+from track.common import import_module, collapse, andify_strings, temporary_path
 
 # Constants #
 base_attributes = ['label', 'short_name', 'long_name', 'input_tracks', 'input_args',
@@ -19,6 +19,9 @@ base_attributes = ['label', 'short_name', 'long_name', 'input_tracks', 'input_ar
                    'tests']
 base_functions = ['generate']
 
+# Number of processes computing the chromosomes, can be changed globally #
+default_parallel = 1
+
 # Conveniance functions #
 is_gen   = lambda x: isinstance(x, sqlite3.Cursor) or \
                      isinstance(x, FeatureStream) or \
@@ -30,6 +33,9 @@ is_list  = lambda x: isinstance(x, tuple) or \
 is_track = lambda x: isinstance(x, Track) or \
                      isinstance(x, TrackCollection) or \
                      isinstance(x, VirtualTrack)
+# Interval arrays can only exist if their module, which requires NumPy, was imported #
+is_array = lambda x: 'track.intervals' in sys.modules and \
+                     isinstance(x, sys.modules['track.intervals'].IntervalArray)
 
 ################################################################################
 class Manipulation(object):
@@ -41,6 +47,7 @@ class Manipulation(object):
                 1) overlap('tracks/pol2.sql', 'tracks/rap1.sql') # returns a virtual track
                 2) overlap(pol2,rap1) # returns a virtual track
                 3) overlap(pol2.read(chrom), rap1.read(chrom)) # returns a generator
+                4) complement(IntervalArray(starts, ends), l=1000) # returns an interval array
 
             Other special cases:
 
@@ -141,9 +148,16 @@ class Manipulation(object):
         """Check that all arguments are present
            and load all tracks that are given as paths
            instead of track objects. Also checks for
-           direct calls with generators."""
+           direct calls with generators.
+
+           With the special keyword argument *parallel*, the
+           chromosomes are computed by that many worker processes,
+           see *run_parallel*."""
+        # Number of processes #
+        parallel = kwargs.pop('parallel', default_parallel)
         # Initialization #
         generator_call   = False # Special switch for direct generator calls
+        array_call       = False # Special switch for direct interval array calls
         found_args       = {}    # Will contain a set of parameters extracted
         found_tracks     = {}    # Will contain a set of track parameters extracted
         found_generators = {}    # Will contain a set of FeatureStream
@@ -179,6 +193,12 @@ class Manipulation(object):
                     raise Exception(message % (t['key'], self.short_name, value))
             # Don't modify the input list #
             if t.get('kind') == 'many': value = value[:]
+            # Check for interval array case #
+            if is_array(value): array_call = True
+            if t.get('kind') == 'many' and is_array(value[0]): array_call = True
+            if array_call:
+                found_tracks[t['key']] = value
+                continue
             # Check for generator case #
             if is_gen(value): generator_call = True
             if t.get('kind') == 'many' and is_gen(value[0]): generator_call = True
@@ -211,6 +231,14 @@ class Manipulation(object):
             pass #TODO
             # Add it to the dict #
             found_tracks[t['key']] = value
+        # Check for interval array case, where every track must be one #
+        if array_call:
+            for key, value in found_tracks.items():
+                if not all(is_array(x) for x in (is_list(value) and value or [value])):
+                    for t in tracks_to_close: t.close()
+                    message = "The manipulation '%s' was given interval arrays, but the track '%s' is not one: %s"
+                    raise Exception(message % (self.short_name, key, value))
+            return self.from_arrays(found_tracks, found_args, args, kwargs)
         # Check for generator case #
         if generator_call: return self.from_generator(found_tracks, found_args, args, kwargs)
         # Collapse chromosomes #
@@ -227,6 +255,19 @@ class Manipulation(object):
         if t.get('datatype'): vtrack.datatype = t['datatype']
         # Output name #
         vtrack.name = self.long_name + ' on ' + andify_strings([i.name for i in all_tracks])
+        # Variable fields case #
+        if t['fields'][-1] == '...': fields = t['fields'][:-1] + rest_of_fields
+        else:                        fields = t['fields']
+        ### Compute chromosomes in worker processes ###
+        if parallel > 1 and self.can_fork(all_tracks):
+            paths = self.run_parallel(parallel, chromosomes, found_tracks, found_args, vtrack.chrmeta, fields)
+            for chrom, path in zip(chromosomes, paths):
+                shard = track.load(path, 'sql', readonly=True)
+                tracks_to_close.append(shard)
+                vtrack.paths_to_remove.append(path)
+                vtrack.write(chrom, FeatureStream(shard.read(chrom), fields))
+            # Nothing left to compute #
+            chromosomes = []
         ### Iterate on chromosomes ###
         for chrom in chromosomes:
             # Get special input arguments #
@@ -243,10 +284,7 @@ class Manipulation(object):
             final_args = {}
             for d in (found_args, found_generators, extra_args): final_args.update(d)
             # Call generate #
-            data = self.generate(**final_args)
-            # Variable fields case #
-            if t['fields'][-1] == '...': fields = t['fields'][:-1] + rest_of_fields
-            else:                        fields = t['fields']
+            data = self.generator_for(chrom, all_tracks)(**final_args)
             # Make a FeatureStream #
             stream = FeatureStream(data, fields)
             # Add it to the virtual track #
@@ -258,9 +296,70 @@ class Manipulation(object):
         # Return one virutal track or list of virtual tracks #
         return len(virtual_tracks) == 1 and virtual_tracks[0] or virtual_tracks
 
+    def generator_for(self, chrom, tracks):
+        """A manipulation can provide a faster *disjoint_generate*
+        function, used on the chromosomes where none of the *tracks*
+        has features overlapping each other, see `Track.is_overlapping`."""
+        disjoint = getattr(self.module, 'disjoint_generate', None)
+        if disjoint and all(isinstance(i, Track) and not i.is_overlapping(chrom) for i in tracks): return disjoint
+        return self.generate
+
+    def can_fork(self, tracks):
+        """Workers open the input tracks again and only see what was
+        saved. Unsaved changes are saved first when they would be anyway
+        on closing the track, otherwise the chromosomes are computed here."""
+        if not all(isinstance(i, Track) for i in tracks): return False
+        if not all(i.autosave and not i.readonly for i in tracks if i.modified): return False
+        for i in tracks:
+            if i.modified: i.save()
+        return True
+
+    def run_parallel(self, processes, chromosomes, found_tracks, found_args, chrmeta, fields):
+        """Computes every chromosome in a pool of *processes* workers.
+        The workers are forked after the job is described in the global
+        *parallel_job*, so that functions given as arguments need not
+        be pickled. Every worker opens the input tracks read-only and
+        writes its chromosome to a temporary SQL track, called a shard.
+        Values beyond the declared *fields* are kept in untyped columns
+        of the shard. Returns the paths of the shards."""
+        global parallel_job
+        # The paths and fields of the input tracks #
+        inputs = {}
+        for key, value in found_tracks.items():
+            if isinstance(value, TrackCollection): inputs[key] = (True,  [(i.path, i.fields) for i in value.tracks])
+            else:                                  inputs[key] = (False, [(value.path, value.fields)])
+        lengths = dict((chrom, chrmeta[chrom]['length']) for chrom in chromosomes)
+        parallel_job = (self, inputs, found_args, lengths, fields)
+        pool = multiprocessing.Pool(min(processes, max(len(chromosomes), 1)))
+        try:
+            return pool.map(run_chromosome, chromosomes, 1)
+        finally:
+            pool.terminate()
+            parallel_job = None
+
     def from_generator(self, found_generators, found_args, args, kwargs):
         """To be used when the manipulation is accessed
         directly with generators"""
+        # Final argument list #
+        final_args = {}
+        for d in (found_args, found_generators, self.special_args(args, kwargs)): final_args.update(d)
+        return self.generate(**final_args)
+
+    def from_arrays(self, found_arrays, found_args, args, kwargs):
+        """To be used when the manipulation is accessed
+        directly with interval arrays, see `track.intervals`.
+        The whole chromosome is computed at once by the *vectorized*
+        function of the manipulation"""
+        if not hasattr(self.module, 'vectorized'):
+            raise Exception("The manipulation '%s' cannot be computed on interval arrays." % self.short_name)
+        # Final argument list #
+        final_args = {}
+        for d in (found_args, found_arrays, self.special_args(args, kwargs)): final_args.update(d)
+        return self.module.vectorized(**final_args)
+
+    def special_args(self, args, kwargs):
+        """The special arguments given when the manipulation is
+        accessed directly with generators or interval arrays"""
         # Initialization #
         extra_args = {}
         # Parse special input arguments #
@@ -275,10 +374,50 @@ class Manipulation(object):
             if not isinstance(value, p['type']): value = p['type'](value)
             # Add it to the dict #
             extra_args[p['key']] = value
-        # Final argument list #
-        final_args = {}
-        for d in (found_args, found_generators, extra_args): final_args.update(d)
-        return self.generate(**final_args)
+        return extra_args
+
+################################################################################
+# The manipulation being computed by worker processes #
+parallel_job = None
+
+def run_chromosome(chrom):
+    """Computes one chromosome of the manipulation described in
+    *parallel_job* inside a worker process. The result is written
+    to a new shard, whose path is returned."""
+    manip, inputs, found_args, lengths, fields = parallel_job
+    opened = []
+    try:
+        # Read the chromosome from every input track #
+        final_args = dict(found_args)
+        for key, (many, specs) in inputs.items():
+            tracks = []
+            for path, read_fields in specs:
+                tracks.append(track.load(path, 'sql', readonly=True))
+                tracks[-1].fields = read_fields
+            opened += tracks
+            generators = [i.read(chrom) for i in tracks]
+            final_args[key] = many and generators or generators[0]
+        # Get special input arguments #
+        for p in manip.input_meta:
+            if p['kind'] == 'chrom_len': final_args[p['key']] = lengths[chrom]
+        # Write the shard #
+        data = iter(manip.generator_for(chrom, opened)(**final_args))
+        first = next(data, None)
+        if first is not None: data = itertools.chain([first], data)
+        path = temporary_path('.sql')
+        with track.new(path, 'sql') as shard:
+            shard_fields = list(fields)
+            # Values beyond the declared fields are stored as they are, in columns without a type #
+            if first is not None and len(first) > len(fields):
+                extra = ['_extra%i' % i for i in xrange(len(first) - len(fields))]
+                columns = shard._table_schema(fields)[0] + ''.join([',"%s"' % e for e in extra])
+                shard._write_cursor.execute('CREATE table "' + chrom + '" (' + columns + ')')
+                shard_fields += extra
+            shard.fields = shard_fields
+            shard.write(chrom, FeatureStream(data, shard_fields))
+        return path
+    finally:
+        for i in opened: i.close()
 
 ################################################################################
 # This module #
@@ -16,14 +16,18 @@ parsers = {
     'bedgraph': {'module': 'track.parse.bedgraph', 'class': 'ParserBedgraph'},
     'bigwig':   {'module': 'track.parse.bigwig',   'class': 'ParserBigwig'},
     'sga':      {'module': 'track.parse.sga',      'class': 'ParserSGA'},
+    'columns':  {'module': 'track.parse.columns',  'class': 'ParserColumns'},
+    'arrow':    {'module': 'track.parse.arrow',    'class': 'ParserArrow'},
+    'parquet':  {'module': 'track.parse.arrow',    'class': 'ParserParquet'},
 }
 
 ################################################################################
-def get_parser(path, format):
+def get_parser(path, format, **kwargs):
     """Given a path and a format will return the appropriate parser.
 
             * *path* is a string specifying the path of the track to parse.
             * *format* is a string specifying the format of the track to parse.
+            * Any extra keyword arguments are passed on to the parser's constructor.
 
         Examples::
 
@@ -42,7 +46,7 @@ def get_parser(path, format):
     base_module    = __import__(info['module'])
     sub_module     = sys.modules[info['module']]
     class_object   = getattr(sub_module, info['class'])
-    class_instance = class_object(path)
+    class_instance = class_object(path, **kwargs)
     # Return an instance #
     return class_instance
 
@@ -0,0 +1,40 @@
+"""
+This module implements the parsing of Arrow IPC and Parquet files, see `track.arrow`.
+
+It requires the pyarrow package.
+"""
+
+# Internal modules #
+from track.parse import Parser
+from track.arrow import ArrowReader
+
+# Constants #
+BATCH_SIZE = 8192
+
+################################################################################
+class ParserArrow(Parser):
+    format = 'arrow'
+    def parse(self):
+        with ArrowReader(self.path, self.format) as t:
+            self.handler.defineFields(t.fields)
+            self.handler.newTrack(t.info)
+            if t.info.get('assembly'): self.handler.defineAssembly(t.info.get('assembly'))
+            else: self.handler.defineChrmeta(t.chrmeta)
+            for chrom in t:
+                batch = []
+                for feature in t.read(chrom):
+                    batch.append(feature)
+                    if len(batch) == BATCH_SIZE:
+                        self.handler.newFeatures(chrom, batch)
+                        batch = []
+                if batch: self.handler.newFeatures(chrom, batch)
+
+################################################################################
+class ParserParquet(ParserArrow):
+    format = 'parquet'
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
@@ -0,0 +1,33 @@
+"""
+This module implements the parsing of columnar tracks, see `track.columns`.
+
+It requires NumPy.
+"""
+
+# Internal modules #
+from track.parse import Parser
+from track.columns import ColumnarTrack, BATCH_SIZE
+
+################################################################################
+class ParserColumns(Parser):
+    format = 'columns'
+    def parse(self):
+        with ColumnarTrack(self.path) as t:
+            self.handler.defineFields(t.fields)
+            self.handler.newTrack(t.info)
+            if t.info.get('assembly'): self.handler.defineAssembly(t.info.get('assembly'))
+            else: self.handler.defineChrmeta(t.chrmeta)
+            for chrom in t:
+                batch = []
+                for feature in t.read(chrom):
+                    batch.append(feature)
+                    if len(batch) == BATCH_SIZE:
+                        self.handler.newFeatures(chrom, batch)
+                        batch = []
+                if batch: self.handler.newFeatures(chrom, batch)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
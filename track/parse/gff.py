@@ -7,6 +7,12 @@ A bug in the python sqlite3 module prevents us form using 'group' for the ninth
 http://bugs.python.org/issue9750
 
 It is hence replaced with 'attributes'
+
+The ``attributes_to_columns`` option takes a list of attribute keys such
+as ``['ID', 'Name']``. Those keys are extracted from the 'attributes'
+column into their own (indexed) columns. The raw text is kept untouched
+and the other attributes can be decoded on demand with the ``attrs``
+property of the rows read from the track, see ``track.util.AttributeRow``.
 """
 
 # Built-in modules #
@@ -15,7 +21,7 @@ import shlex
 # Internal modules #
 from track.parse import Parser
 from track.common import iterate_lines
-from track.util import strand_to_int
+from track.util import strand_to_int, parse_attributes, attributes_dict
 
 # Constants #
 all_fields = ['source', 'name', 'start', 'end', 'score', 'strand', 'frame', 'attributes']
@@ -23,6 +29,11 @@ all_fields = ['source', 'name', 'start', 'end', 'score', 'strand', 'frame', 'att
 ################################################################################
 class ParserGFF(Parser):
     format = 'gff'
+
+    def __init__(self, path, attributes_to_columns=None):
+        super(ParserGFF, self).__init__(path)
+        self.columns = attributes_to_columns and list(attributes_to_columns) or []
+
     def parse(self):
         # Initial variables #
         fields = []
@@ -50,8 +61,9 @@ class ParserGFF(Parser):
             # Have we started a track already ? #
             if not fields:
                 self.handler.newTrack(info, self.name)
-                fields = all_fields[0:len(items)]
+                fields = all_fields[0:len(items)] + self.columns
                 self.handler.defineFields(fields)
+                if self.columns: self.handler.defineIndexes(self.columns)
             # Source field #
             if items[0] == '.': items[0] = ''
             # Name field #
@@ -81,6 +93,10 @@ class ParserGFF(Parser):
                     self.handler.error("The track%s has non integers as frame value", self.path, number)
             # Group or attribute field #
             if items[7] == '.': items[7] = ''
+            # Selected attributes #
+            if self.columns:
+                attr = attributes_dict(parse_attributes(items[7]))
+                items += [attr.get(k) for k in self.columns]
             # Yield it #
             self.handler.newFeature(chrom, items)
 
@@ -2,6 +2,22 @@
 This module implements the parsing of GTF files.
 
 http://genome.ucsc.edu/FAQ/FAQformat.html#format4
+
+By default, the file is read twice: a first quick pass collects the
+union of all attribute keys found in every track so that the handler
+receives a single and stable list of fields. Lines missing some of the
+attributes simply get ``None`` in the corresponding columns. Keys
+repeated on the same line, such as ``tag``, have their values joined
+with commas in a single column. The old
+behaviour, redefining the fields at every line, can be obtained by
+passing ``schema='line'``.
+
+Alternatively, the ``attributes_to_columns`` option takes a list of
+attribute keys such as ``['gene_id', 'gene_name']``. Only those keys are
+extracted into their own (indexed) columns while the raw attribute text
+is kept as is in an ``attributes`` column. The other attributes can
+then be decoded on demand with the ``attrs`` property of the rows read
+from the track, see ``track.util.AttributeRow``.
 """
 
 # Built-in modules #
@@ -10,18 +26,52 @@ import shlex
 # Internal modules #
 from track.parse import Parser
 from track.common import iterate_lines
-from track.util import strand_to_int
+from track.util import strand_to_int, parse_attributes, attributes_dict
 
 # Constants #
 all_fields = ['source', 'feature', 'start', 'end', 'score', 'strand', 'frame']
+schemas    = ('union', 'line')
 
 ################################################################################
 class ParserGTF(Parser):
     format = 'gtf'
+
+    def __init__(self, path, schema='union', attributes_to_columns=None):
+        super(ParserGTF, self).__init__(path)
+        if schema not in schemas:
+            raise Exception("The GTF schema '%s' is not supported. Possible values are: %s" % (schema, schemas))
+        self.schema = schema
+        self.columns = attributes_to_columns and list(attributes_to_columns)
+        if self.columns: self.schema = 'columns'
+
+    def prescan(self):
+        """Returns a list containing, for every track found in the file,
+        the union of all attribute keys in the order they are first seen."""
+        result = []
+        declare_track = True
+        for number, line in iterate_lines(self.path):
+            if line.startswith("browser "): continue
+            if line.startswith("track "):
+                declare_track = True
+                continue
+            if declare_track:
+                declare_track = False
+                keys, seen = [], set()
+                result.append(keys)
+            items = line.split('\t')
+            if len(items) == 1: items = line.split()
+            for key, value in parse_attributes(' '.join(items[8:])):
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+        return result
+
     def parse(self):
         # Initial variables #
         info   = {}
         declare_track = True
+        # Stable schema #
+        if self.schema == 'union': all_keys = iter(self.prescan())
         # Main loop #
         for number, line in iterate_lines(self.path):
             # Ignored lines #
@@ -47,6 +97,12 @@ class ParserGTF(Parser):
             if declare_track:
                 declare_track = False
                 self.handler.newTrack(info, self.name)
+                if self.schema == 'union':
+                    track_keys = all_keys.next()
+                    self.handler.defineFields(all_fields + track_keys)
+                if self.schema == 'columns':
+                    self.handler.defineFields(all_fields + self.columns + ['attributes'])
+                    self.handler.defineIndexes(self.columns)
             # Source field #
             if items[0] == '.': items[0] = ''
             # Name field #
@@ -66,17 +122,28 @@ class ParserGTF(Parser):
                     items[6] = int(items[6])
                 except ValueError:
                     self.handler.error("The track%s has non integers as frame value", self.path, number)
+            # Selected columns and the raw text #
+            if self.schema == 'columns':
+                text = items.pop()
+                attr = attributes_dict(parse_attributes(text))
+                items += [attr.get(k) for k in self.columns] + [text]
+                self.handler.newFeature(chrom, items)
+                continue
             # The last special column #
-            attr = shlex.split(items.pop())
-            attr = [(attr[i],attr[i+1].strip(';')) for i in xrange(0,len(attr),2)]
+            attr = parse_attributes(items.pop())
             # Not using dict to preserve annotation order #
-            keys, values = [x[0] for x in attr], [x[1] for x in attr]
+            keys = [x[0] for x in attr]
             # GTF attribute column must have annotations starting with "gene_id" and "transcript_id" #
             assert ["gene_id", "transcript_id"] == keys[:2], "Invalid " \
                     "attribute column: %r. Valid attributes begin with " \
                     "\"gene_id\" and \"transcript_id\""
-            self.handler.defineFields(all_fields + keys)
-            items += values
+            # Place the values in the right columns #
+            if self.schema == 'union':
+                attr = attributes_dict(attr)
+                items += [attr.get(k) for k in track_keys]
+            else:
+                self.handler.defineFields(all_fields + keys)
+                items += [x[1] for x in attr]
             # Yield it #
             self.handler.newFeature(chrom, items)
 
@@ -7,10 +7,16 @@ In this case the self.path attribute can be either
 a Track object or the path to an SQL file.
 """
 
+# Built-in modules #
+from itertools import islice
+
 # Internal modules #
 from track import Track, load
 from track.parse import Parser
 
+# Constants #
+BATCH_SIZE = 8192
+
 ################################################################################
 class ParserSQL(Parser):
     format = 'sql'
@@ -22,8 +28,11 @@ class ParserSQL(Parser):
             if t.info.get('assembly'): self.handler.defineAssembly(t.info.get('assembly'))
             else: self.handler.defineChrmeta(t.chrmeta)
             for chrom in t:
-                for feature in t.read(chrom):
-                    self.handler.newFeature(chrom, feature)
+                data = t.read(chrom)
+                while True:
+                    batch = list(islice(data, BATCH_SIZE))
+                    if not batch: break
+                    self.handler.newFeatures(chrom, batch)
         # Check param type #
         if isinstance(self.path, Track):
             read_whole_track(self.path)
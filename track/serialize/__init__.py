@@ -3,11 +3,21 @@ This subpackage contains one python source file per format implemented for seria
 """
 
 # Built-in modules #
-import sys
+import sys, threading, Queue
+from operator import itemgetter
+
+# Internal modules #
+from track.common import make_file_names
 
 # Other modules #
 from genomes import Assembly
 
+# Constants #
+BUFFER_SIZE = 32767
+BUFFER_BYTES = 2**22
+BATCH_SIZE  = 4096
+QUEUE_SIZE  = 16
+
 # Variables #
 serializers = {
     'memory':   {'module': 'track.serialize.memory',   'class': 'SerializerMemory'},
@@ -19,14 +29,18 @@ serializers = {
     'bedgraph': {'module': 'track.serialize.bedgraph', 'class': 'SerializerBedgraph'},
     'bigwig':   {'module': 'track.serialize.bigwig',   'class': 'SerializerBigwig'},
     'sga':      {'module': 'track.serialize.sga',      'class': 'SerializerSGA'},
+    'columns':  {'module': 'track.serialize.columns',  'class': 'SerializerColumns'},
+    'arrow':    {'module': 'track.serialize.arrow',    'class': 'SerializerArrow'},
+    'parquet':  {'module': 'track.serialize.arrow',    'class': 'SerializerParquet'},
 }
 
 ################################################################################
-def get_serializer(path, format):
+def get_serializer(path, format, **kwargs):
     """Given a path and a format will return the appropriate serializer.
 
             * *path* is a string specifying the path of the track to parse.
             * *format* is a string specifying the format of the track to parse.
+            * Any other keyword arguments are passed on to the serializer, for instance the SQL serializer accepts a ``layout``.
 
         Examples::
 
@@ -45,10 +59,43 @@ def get_serializer(path, format):
     base_module    = __import__(info['module'])
     sub_module     = sys.modules[info['module']]
     class_object   = getattr(sub_module, info['class'])
-    class_instance = class_object(path)
+    class_instance = class_object(path, **kwargs)
     # Return an instance #
     return class_instance
 
+################################################################################
+def make_formatter(columns, separator='\t'):
+    """Makes a function that takes a chromosome name and a feature and
+    returns one line of text, the chromosome name being the first column.
+    The constant columns are placed in the line template only once, when
+    the fields are defined, and the other ones are fetched from the feature
+    with one getter each.
+
+            * *columns* is a list with one item per column after the chromosome name. An integer is the index of a value in the feature, a tuple ``(function, index)`` converts that value, any other callable receives the whole feature and a string is a constant.
+            * *separator* is the string placed between the columns.
+
+        Examples::
+
+            >>> fn = make_formatter([0, (str.upper, 1), '100%'])
+            >>> fn('chr1', (10, 'abc'))
+            'chr1\\t10\\tABC\\t100%\\n'
+    """
+    template, getters = ['%s'], []
+    for column in columns:
+        if isinstance(column, basestring):
+            template.append(column.replace('%', '%%'))
+            continue
+        template.append('%s')
+        if isinstance(column, (int, long)): getters.append(itemgetter(column))
+        elif isinstance(column, tuple):     getters.append(converted_getter(*column))
+        else:                               getters.append(column)
+    template = separator.join(template) + '\n'
+    def formatter(chrom, f): return template % ((chrom,) + tuple([g(f) for g in getters]))
+    return formatter
+
+def converted_getter(function, index):
+    return lambda f: function(f[index])
+
 ################################################################################
 class Serializer(object):
     def __init__(self, path):
@@ -72,6 +119,9 @@ class Serializer(object):
     def defineFields(self, fields):
         pass
 
+    def defineIndexes(self, fields):
+        pass
+
     def defineChrmeta(self, chrmeta):
         self.chrmeta = chrmeta
 
@@ -85,6 +135,323 @@ class Serializer(object):
     def newFeature(self, chrom, feature):
         raise NotImplementedError
 
+    def newFeatures(self, chrom, features):
+        for feature in features: self.newFeature(chrom, feature)
+
+################################################################################
+class SerializerText(Serializer):
+    """Base class for the serializers producing text files. Lines are
+    accumulated in a buffer and written to the file in large chunks, as
+    soon as the buffer holds *BUFFER_SIZE* pieces or *BUFFER_BYTES* bytes.
+    Subclasses set *self.formatter* in ``defineFields`` with ``make_formatter``."""
+
+    def __enter__(self):
+        self.file = open(self.path, 'w')
+        self.buffer, self.buffered = [], 0
+        return self
+
+    def __exit__(self, errtype, value, traceback):
+        self.flush()
+        self.file.close()
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if len(self.buffer) >= BUFFER_SIZE or self.buffered >= BUFFER_BYTES: self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(''.join(self.buffer))
+            self.buffer, self.buffered = [], 0
+
+    def writeHeader(self, info):
+        self.write("track " + ' '.join([k + '="' + v + '"' for k, v in info.items()]) + '\n')
+
+    def newFeature(self, chrom, feature):
+        self.write(self.formatter(chrom, feature))
+
+    def newFeatures(self, chrom, features):
+        formatter = self.formatter
+        lines = [formatter(chrom, f) for f in features]
+        self.buffer.extend(lines)
+        self.buffered += sum(map(len, lines))
+        if len(self.buffer) >= BUFFER_SIZE or self.buffered >= BUFFER_BYTES: self.flush()
+
+################################################################################
+class SerializerChromosomes(Serializer):
+    """Base class for the serializers storing every chromosome as a set of
+    columns, such as the columnar and Arrow formats. The features of the
+    current chromosome are gathered in one list per field and handed to
+    ``writeChromosome`` as soon as another chromosome starts, so that only
+    one chromosome is held in memory. A chromosome coming back later is
+    handed over again and the subclass has to merge both parts. Subclasses
+    implement ``openTrack``, ``writeChromosome`` and ``closeTrack`` and
+    define the value given to the fields missing from some features."""
+
+    def __enter__(self):
+        self.fields = None
+        self.all_fields = None
+        self.file_paths = make_file_names(self.path)
+        return self
+
+    def __exit__(self, errtype, value, traceback):
+        if self.all_fields is None: return
+        if not errtype: self.closeCurrentTrack()
+        else:           self.discardTrack()
+
+    def defineFields(self, fields):
+        self.fields = list(fields)
+        if self.all_fields is not None: self.all_fields += [f for f in self.fields if f not in self.all_fields]
+
+    def defineAssembly(self, assembly):
+        Serializer.defineAssembly(self, assembly)
+        self.assembly_name = assembly
+
+    def newTrack(self, info=None, name=None):
+        # Close previous track #
+        if self.all_fields is not None: self.closeCurrentTrack()
+        self.info = dict(info or {})
+        # Every field ever defined, in order #
+        self.all_fields = list(self.fields or [])
+        self.chrom, self.columns, self.count = None, None, 0
+        self.written = set()
+        self.openTrack(self.file_paths.next())
+
+    def newFeature(self, chrom, feature):
+        self.newFeatures(chrom, [feature])
+
+    def newFeatures(self, chrom, features):
+        if chrom != self.chrom:
+            self.flushChromosome()
+            self.chrom, self.columns, self.count = chrom, {}, 0
+        features = features if isinstance(features, list) else list(features)
+        if not features: return
+        columns = self.columns
+        for field, values in zip(self.fields, zip(*features)):
+            if field not in columns: columns[field] = [self.missingValue(field)] * self.count
+            columns[field].extend(values)
+        self.count += len(features)
+        # Fields missing from these features #
+        for field, values in columns.items():
+            if len(values) < self.count: values.extend([self.missingValue(field)] * (self.count - len(values)))
+
+    def flushChromosome(self):
+        if self.chrom is None: return
+        for field in self.all_fields:
+            if field not in self.columns: self.columns[field] = [self.missingValue(field)] * self.count
+        self.writeChromosome(self.chrom, self.columns)
+        self.written.add(self.chrom)
+        self.chrom, self.columns, self.count = None, None, 0
+
+    #-----------------------------------------------------------------------------#
+    def closeCurrentTrack(self):
+        self.flushChromosome()
+        if hasattr(self, 'assembly_name'): self.info['assembly'] = self.assembly_name
+        self.tracks.append(self.closeTrack())
+        self.all_fields = None
+
+    def discardTrack(self):
+        pass
+
+    def missingValue(self, field):
+        return None
+
+################################################################################
+class SerializerTee(object):
+    """Forwards every event to several serializers, so that one parse
+    of the source can produce several destinations at once. The
+    serializers can be wrapped in a `PipelinedSerializer` to each
+    write from their own thread.
+
+    ::
+
+        from track.parse import get_parser
+        from track.serialize import get_serializer, SerializerTee
+        parser = get_parser('tmp/test.bed', 'bed')
+        serializer = SerializerTee([get_serializer('tmp/test.sql', 'sql'),
+                                    get_serializer('tmp/test.gff', 'gff')])
+        serializer(parser)
+        parser(serializer)
+    """
+
+    def __init__(self, serializers):
+        self.serializers = serializers
+
+    @property
+    def tracks(self):
+        return [t for s in self.serializers for t in s.tracks]
+
+    def __enter__(self):
+        entered = []
+        try:
+            for s in self.serializers:
+                s.__enter__()
+                entered.append(s)
+        except Exception:
+            failure = sys.exc_info()
+            for s in reversed(entered): s.__exit__(*failure)
+            raise failure[0], failure[1], failure[2]
+        return self
+
+    def __exit__(self, errtype, value, traceback):
+        # Every serializer is closed, the first error is kept #
+        failure = None
+        for s in reversed(self.serializers):
+            try:
+                s.__exit__(errtype, value, traceback)
+            except Exception:
+                if not failure: failure = sys.exc_info()
+        if failure and not errtype: raise failure[0], failure[1], failure[2]
+
+    def __call__(self, parser):
+        for s in self.serializers: s(parser)
+
+    def error(self, message, path=None, line_number=None):
+        self.serializers[0].error(message, path, line_number)
+
+    def defineFields(self, fields):
+        for s in self.serializers: s.defineFields(fields)
+
+    def defineIndexes(self, fields):
+        for s in self.serializers: s.defineIndexes(fields)
+
+    def defineChrmeta(self, chrmeta):
+        for s in self.serializers: s.defineChrmeta(chrmeta)
+
+    def defineAssembly(self, assembly):
+        for s in self.serializers: s.defineAssembly(assembly)
+
+    def newTrack(self, info=None, name=None):
+        # Some serializers modify the info they get #
+        for s in self.serializers: s.newTrack(dict(info) if info else info, name)
+
+    def newFeature(self, chrom, feature):
+        for s in self.serializers: s.newFeature(chrom, feature)
+
+    def newFeatures(self, chrom, features):
+        for s in self.serializers: s.newFeatures(chrom, features)
+
+################################################################################
+class PipelinedSerializer(object):
+    """Wraps a serializer so that it runs in its own thread. The parser
+    keeps on reading the source while the serializer writes: features are
+    grouped in batches and handed over through a bounded queue. When the
+    queue is full the parser waits. Any exception raised by the serializer
+    is re-raised in the parser thread.
+
+    ::
+
+        from track.parse import get_parser
+        from track.serialize import get_serializer, PipelinedSerializer
+        parser = get_parser('tmp/test.bed', 'bed')
+        serializer = PipelinedSerializer(get_serializer('tmp/test.sql', 'sql'))
+        serializer(parser)
+        parser(serializer)
+    """
+
+    def __init__(self, serializer, batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE):
+        self.serializer = serializer
+        self.batch_size = batch_size
+        self.queue = Queue.Queue(queue_size)
+        self.depth = 0
+
+    def __getattr__(self, name):
+        return getattr(self.serializer, name)
+
+    def __enter__(self):
+        # Parsers can re-enter their handler #
+        self.depth += 1
+        if self.depth > 1: return self
+        # Start the writer #
+        self.batch, self.batch_chrom, self.failure = [], None, None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, errtype, value, traceback):
+        self.depth -= 1
+        if self.depth > 0: return
+        # Stop the writer, the half-parsed batch is dropped if the parser failed #
+        try:
+            if errtype is not None and not self.failure: self.send(('abort', (errtype, value, traceback)))
+            elif not self.failure: self.flushBatch()
+        finally:
+            self.send(None)
+            self.thread.join()
+        # Report the writer's errors, unless we already have one #
+        if self.failure and not errtype: raise self.failure[0], self.failure[1], self.failure[2]
+
+    def __call__(self, parser):
+        self.serializer(parser)
+
+    def run(self):
+        finished = False
+        try:
+            with self.serializer:
+                while True:
+                    event = self.queue.get()
+                    if event is None:
+                        finished = True
+                        break
+                    # The serializer exits with the parser's error #
+                    if event[0] == 'abort': raise event[1][0], event[1][1], event[1][2]
+                    getattr(self.serializer, event[0])(*event[1])
+        except Exception:
+            self.failure = sys.exc_info()
+            # Unblock the parser, unless it has already stopped sending #
+            if not finished:
+                while self.queue.get() is not None: pass
+
+    def send(self, event):
+        while True:
+            if self.failure and event is not None: raise self.failure[0], self.failure[1], self.failure[2]
+            try:
+                self.queue.put(event, timeout=0.1)
+                return
+            except Queue.Full:
+                continue
+
+    def flushBatch(self):
+        if self.batch:
+            self.send(('newFeatures', (self.batch_chrom, self.batch)))
+            self.batch = []
+
+    def error(self, message, path=None, line_number=None):
+        self.serializer.error(message, path, line_number)
+
+    def defineFields(self, fields):
+        self.flushBatch()
+        self.send(('defineFields', (fields,)))
+
+    def defineIndexes(self, fields):
+        self.flushBatch()
+        self.send(('defineIndexes', (fields,)))
+
+    def defineChrmeta(self, chrmeta):
+        self.flushBatch()
+        self.send(('defineChrmeta', (chrmeta,)))
+
+    def defineAssembly(self, assembly):
+        self.flushBatch()
+        self.send(('defineAssembly', (assembly,)))
+
+    def newTrack(self, info=None, name=None):
+        self.flushBatch()
+        self.send(('newTrack', (info, name)))
+
+    def newFeature(self, chrom, feature):
+        if chrom != self.batch_chrom:
+            self.flushBatch()
+            self.batch_chrom = chrom
+        self.batch.append(feature)
+        if len(self.batch) >= self.batch_size: self.flushBatch()
+
+    def newFeatures(self, chrom, features):
+        self.flushBatch()
+        self.batch_chrom = chrom
+        self.send(('newFeatures', (chrom, features)))
+
 #-----------------------------------#
 # This code was written by the BBCF #
 # http://bbcf.epfl.ch/              #
@@ -0,0 +1,91 @@
+"""
+This module implements the Arrow IPC and Parquet serializations, see `track.arrow`.
+
+It requires the pyarrow package.
+"""
+
+# Built-in modules #
+import os
+
+# Internal modules #
+from track.serialize import SerializerChromosomes
+from track.common import temporary_path, natural_sort
+from track.arrow import make_schema, make_batch, batch_columns, conform_batch, text_suffix
+from track.arrow import check_pyarrow, pyarrow
+
+################################################################################
+class SerializerArrow(SerializerChromosomes):
+    """The schema, with the info and the chrmeta, is only known at the end of
+    the track and the chromosomes are stored in order. Every chromosome is
+    thus first written to its own temporary Arrow file, called a piece, and
+    the pieces are copied to the destination one at a time."""
+    format = 'arrow'
+
+    def openTrack(self, path):
+        check_pyarrow()
+        self.destination = path
+        self.pieces = []
+
+    def writeChromosome(self, chrom, columns):
+        batch = make_batch(chrom, list(self.all_fields), columns)
+        path = temporary_path('.arrow')
+        writer = pyarrow.RecordBatchFileWriter(path, batch.schema)
+        try:     writer.write_batch(batch)
+        finally: writer.close()
+        self.pieces.append((chrom, path))
+
+    def readPiece(self, path):
+        """Returns the schema of a piece and a function loading its batch in memory."""
+        with open(path, 'rb') as handle: schema = pyarrow.ipc.open_file(handle).schema
+        def load():
+            with open(path, 'rb') as handle: return pyarrow.ipc.open_file(handle).get_batch(0)
+        return schema, load
+
+    def closeTrack(self):
+        fields = list(self.all_fields)
+        try:
+            pieces = [(chrom,) + self.readPiece(path) for chrom, path in self.pieces]
+            texts = [f for f in fields if any(f + text_suffix in s.names for c, s, l in pieces)]
+            schema = make_schema(fields, self.info, getattr(self, 'chrmeta', {}), texts)
+            writer = self.makeWriter(self.destination, schema)
+            try:
+                # Only one chromosome is loaded at a time #
+                for chrom in sorted(set(c for c, s, l in pieces), key=natural_sort):
+                    parts = [load() for c, s, load in pieces if c == chrom]
+                    # A chromosome that came back is merged and sorted again #
+                    if len(parts) > 1:
+                        columns = [batch_columns(b, fields) for b in parts]
+                        parts = [make_batch(chrom, fields, dict((f, sum([c[f] for c in columns], [])) for f in fields))]
+                    self.writeBatch(writer, conform_batch(parts[0], schema))
+            finally:
+                writer.close()
+        finally:
+            self.discardTrack()
+        return self.destination
+
+    def discardTrack(self):
+        for chrom, path in self.pieces: os.remove(path)
+        self.pieces = []
+
+    def makeWriter(self, path, schema):
+        return pyarrow.RecordBatchFileWriter(path, schema)
+
+    def writeBatch(self, writer, batch):
+        writer.write_batch(batch)
+
+################################################################################
+class SerializerParquet(SerializerArrow):
+    format = 'parquet'
+
+    def makeWriter(self, path, schema):
+        return pyarrow.parquet.ParquetWriter(path, schema)
+
+    def writeBatch(self, writer, batch):
+        # One row group per chromosome #
+        writer.write_table(pyarrow.Table.from_batches([batch]), row_group_size=max(batch.num_rows, 1))
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
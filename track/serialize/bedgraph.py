@@ -3,57 +3,48 @@ This module implements the bedgraph serialization.
 """
 
 # Internal modules #
-from track.serialize import Serializer
-from track.common import format_float
+from track.serialize import SerializerText, make_formatter
+from track.common import memoized_format_float
 from track.parse.bigwig import bigwig_to_bedgraph
 
 # Constants #
 all_fields = ['start', 'end', 'score']
 
 ################################################################################
-class SerializerBedgraph(Serializer):
+class SerializerBedgraph(SerializerText):
     format = 'bedgraph'
 
     def __enter__(self):
         # Special case #
         if self.parser.format == 'bigWig': return self
         # Open file #
-        else: self.file = open(self.path, 'w')
-        # Must return self #
-        return self
+        return SerializerText.__enter__(self)
 
     def __exit__(self, errtype, value, traceback):
         # Special case #
         if self.parser.format == 'bigWig': bigwig_to_bedgraph(self.parser.path, self.path)
         # Close file #
-        else: self.file.close()
+        else: SerializerText.__exit__(self, errtype, value, traceback)
 
     def defineFields(self, fields):
         self.indices = []
         for f in all_fields:
             try:
-                self.indices.append(fields.index(f))
+                self.indices.append(list(fields).index(f))
             except ValueError:
                 message = "You tried to write a bedgraph file without a '%s' field. Required fields are: %s"
                 self.error(message % (f, all_fields))
+        # Compile the line formatter #
+        columns = [self.indices[0], self.indices[1], (memoized_format_float(), self.indices[2])]
+        self.formatter = make_formatter(columns, ' ')
 
     def newTrack(self, info=None, name=None):
         if not info: info = {}
         info['type'] = 'bedGraph'
         info['converted_by'] = __package__
-        self.file.write("track " + ' '.join([k + '="' + v + '"' for k, v in info.items()]) + '\n')
+        self.writeHeader(info)
         self.tracks.append(self.path)
 
-    def newFeature(self, chrom, feature):
-        # Put the fields in the right order #
-        line = [feature[i] for i in self.indices]
-        # Convert the score #
-        line[2] = format_float(line[2])
-        # Make sure eveything is a string #
-        line = [str(f) for f in line]
-        # Write one line #
-        self.file.write(' '.join([chrom] + line) + '\n')
-
 #-----------------------------------#
 # This code was written by the BBCF #
 # http://bbcf.epfl.ch/              #
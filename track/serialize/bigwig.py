@@ -24,9 +24,11 @@ class SerializerBigwig(SerializerBedgraph):
         # Just serialize it as a bedgraph first #
         self.tmp_path = temporary_path('.bedgraph')
         self.file = open(self.tmp_path, 'w')
+        self.buffer = []
         return self
 
     def __exit__(self, errtype, value, traceback):
+        self.flush()
         self.file.close()
         bedgraph_to_bigwig(self.tmp_path, self.chrmeta, self.path)
         self.tracks = [self.path]
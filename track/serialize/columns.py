@@ -0,0 +1,46 @@
+"""
+This module implements the columnar serialization, see `track.columns`.
+
+It requires NumPy.
+"""
+
+# Internal modules #
+from track.serialize import SerializerChromosomes
+from track.util import py_field_types
+from track.columns import ColumnarWriter
+
+################################################################################
+class SerializerColumns(SerializerChromosomes):
+    format = 'columns'
+
+    def openTrack(self, path):
+        self.writer = ColumnarWriter(path, [])
+        self.writer.__enter__()
+
+    def writeChromosome(self, chrom, columns):
+        # Chromosomes written before a field appeared will give its default value #
+        self.writer.fields = list(self.all_fields)
+        self.writer.write(chrom, columns=columns)
+
+    def closeTrack(self):
+        writer = self.writer
+        writer.fields = list(self.all_fields)
+        writer.info = self.info
+        if hasattr(self, 'chrmeta'): writer.chrmeta = self.chrmeta
+        # Like in SQL tracks, every chromosome of the chrmeta exists #
+        for chrom in writer.chrmeta:
+            if chrom not in self.written: writer.write(chrom, [])
+        writer.close()
+        return writer.path
+
+    def discardTrack(self):
+        self.writer.file.close()
+
+    def missingValue(self, field):
+        return py_field_types.get(field, str)()
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
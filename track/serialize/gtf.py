@@ -3,88 +3,68 @@ This module implements the GTF serialization.
 """
 
 # Internal modules #
-from track.serialize import Serializer
-from track.util import int_to_strand
+from track.serialize import SerializerText, make_formatter
+from track.util import int_to_strand, gtf_attributes
 
 # Constants #
 all_fields = ['source', 'feature', 'start', 'end', 'score', 'strand', 'frame', 'gene_id', 'transcript_id']
 defaults   = ['.', '.', -1, -1, 0.0, '.', '.', '.', '""', '""']
 
+# Functions #
+def format_frame(frame):
+    if frame == '' or frame == None: return '.'
+    return frame
 
-################################################################################
-class SerializerGTF(Serializer):
-    format = 'gtf'
+def make_attributes(mandatory, extra):
+    """Returns a function building the text of the attribute column.
+    *mandatory* is a list of keys and indices, or of keys and default
+    values when the index is None. *extra* is a list of keys and indices
+    of the optional attributes, skipped when they are not defined."""
+    def attributes(f):
+        text = ' '.join(['%s "%s";' % (k, f[i] if i is not None else d) for k, i, d in mandatory])
+        return text + ''.join([' %s "%s";' % (k, f[i]) for k, i in extra if f[i] is not None])
+    return attributes
 
-    def __enter__(self):
-        self.file = open(self.path, 'w')
-        self.indices = None
-        return self
+def raw_attributes(index):
+    """Copies the raw attribute text, re-encoded if it comes from a GFF file."""
+    return lambda f: gtf_attributes(f[index])
 
-    def __exit__(self, errtype, value, traceback):
-        self.file.close()
+################################################################################
+class SerializerGTF(SerializerText):
+    format = 'gtf'
 
     def defineFields(self, fields):
-        self.indices = []
         # Store all column names (including custom attributes) #
-        self.fields = fields
-        for f in all_fields:
-            try: self.indices.append(fields.index(f))
-            except ValueError: self.indices.append(-1)
-        # Store non-mandatory fields (everything after "transcript_id") #
-        for idx_extra in range(9, len(fields)):
-            self.indices.append(idx_extra)
+        self.fields = fields = list(fields)
+        # Everything before the attribute column #
+        columns = []
+        for n, f in enumerate(all_fields[:7]):
+            if f not in fields: columns.append(str(defaults[n]))
+            elif f == 'strand': columns.append((int_to_strand, fields.index(f)))
+            elif f == 'frame':  columns.append((format_frame,  fields.index(f)))
+            else:               columns.append(fields.index(f))
+        # The raw attribute text takes precedence over the extracted columns #
+        if 'attributes' in fields:
+            columns.append(raw_attributes(fields.index('attributes')))
+            self.formatter = make_formatter(columns, '\t')
+            return
+        # The "gene_id" and "transcript_id" annotations are mandatory #
+        mandatory = []
+        for n, f in enumerate(all_fields[7:], 7):
+            if f in fields: mandatory.append((f, fields.index(f), None))
+            else:           mandatory.append((f, None, defaults[n]))
+        # Annotations of the attribute columns after "transcript_id" #
+        extra = zip(fields[9:], range(9, len(fields)))
+        columns.append(make_attributes(mandatory, extra))
+        self.formatter = make_formatter(columns, '\t')
 
     def newTrack(self, info=None, name=None):
         if not info: info = {}
         info['type'] = 'gtf'
         info['converted_by'] = __package__
-        self.file.write("track " + ' '.join([k + '="' + v + '"' for k, v in info.items()]) + '\n')
+        self.writeHeader(info)
         self.tracks.append(self.path)
 
-    def newFeature(self, chrom, feature):
-        # function to obtain attribute column key-value string
-        def attribute_str(key, value):
-            return '%s "%s";' % (key, value)
-        # Put the fields in the right order #
-        # GTF entries always have 8 columns (excluding the seqname column)
-        line = range(8)
-        for n, i in enumerate(self.indices):
-            # i == -1 indicates we should use the default value #
-            if i == -1:
-                if n < 7:
-                    # Everything before the attribute column #
-                    line[n] = defaults[n]
-                elif n == 7:
-                    # "gene_id" annotation #
-                    line[n] = attribute_str(self.fields[n], defaults[n])
-                elif n == 8:
-                    # "transcript_id annotation #
-                    attr = attribute_str(self.fields[n], defaults[n])
-                    line[7] = '%s %s' % (line[7], attr)
-                else:
-                    # Annotations of the attribute columns without defaults #
-                    raise ValueError("Default value for the %r attribute "
-                            "column is not defined." % self.fields[n])
-            else:
-                if n < 7:
-                    line[n] = feature[i]
-                elif n == 7:
-                    # "gene_id" annotation #
-                    line[n] = attribute_str(self.fields[n], feature[i])
-                else:
-                    # Everything after the "gene_id" annotation #
-                    attr = attribute_str(self.fields[n], feature[i])
-                    line[7] = '%s %s' % (line[7], attr)
-
-        # Convert the strand #
-        line[5] = int_to_strand(line[5])
-        # Convert the frame #
-        if line[6] == '' or line[6] == None: line[6] = '.'
-        # Make sure eveything is a string #
-        line = [str(f) for f in line]
-        # Write one line #
-        self.file.write('\t'.join([chrom] + line) + '\n')
-
 #-----------------------------------#
 # This code was written by the BBCF #
 # http://bbcf.epfl.ch/              #
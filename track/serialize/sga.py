@@ -5,7 +5,7 @@ http://ccg.vital-it.ch/chipseq/doc/chipseq_tech.php
 """
 
 # Internal modules #
-from track.serialize import Serializer
+from track.serialize import Serializer, SerializerText
 
 # Functions #
 def int_to_strand(num):
@@ -15,21 +15,18 @@ def int_to_strand(num):
     return '0'
 
 # Constants #
+BLOCK_SIZE = 65536
 all_fields = ['start', 'end', 'name', 'strand', 'score']
 defaults   = [None, None, 'signal', '0', '0']
 
 ################################################################################
-class SerializerSGA(Serializer):
+class SerializerSGA(SerializerText):
     format = 'sga'
 
     def __enter__(self):
-        self.file = open(self.path, 'w')
         self.indices = []
-        self.current_chrom = None
-        return self
-
-    def __exit__(self, errtype, value, traceback):
-        self.file.close()
+        self.refseq_names = {}
+        return SerializerText.__enter__(self)
 
     def defineFields(self, fields):
         # Check for required fields #
@@ -51,11 +48,15 @@ class SerializerSGA(Serializer):
         info['converted_by'] = __package__
         self.tracks.append(self.path)
 
-    def newFeature(self, chrom, feature):
-        # The chromsoome name must be NC type #
-        if chrom != self.current_chrom:
+    def refseqName(self, chrom):
+        """The chromosome name must be NC type. The correspondence
+        is looked up only once per chromosome for the whole export."""
+        if chrom not in self.refseq_names:
             name = self.assembly.guess_chromosome_name(chrom)
-            self.current_chrom = self.chrmeta[name]['refseq']
+            self.refseq_names[chrom] = self.chrmeta[name]['refseq']
+        return self.refseq_names[chrom]
+
+    def newFeature(self, chrom, feature):
         # Put the fields in the right order #
         feature = [feature[i] if isinstance(i,int) else i for i in self.indices]
         start, end, name, strand, score = feature
@@ -65,9 +66,17 @@ class SerializerSGA(Serializer):
         # Convert the strand #
         try: strand = int_to_strand(strand)
         except ValueError: pass
-        # Write one line #
-        for i in range(end-start):
-            self.file.write('\t'.join((self.current_chrom, name, str(start+1+i), strand, score)) + '\n')
+        # Every line of the feature only differs by its position #
+        prefix = self.refseqName(chrom) + '\t' + name + '\t'
+        suffix = '\t' + strand + '\t' + score + '\n'
+        # Write the lines in large blocks #
+        for block_start in xrange(start+1, end+1, BLOCK_SIZE):
+            positions = map(str, xrange(block_start, min(block_start+BLOCK_SIZE, end+1)))
+            self.write(prefix + (suffix + prefix).join(positions) + suffix)
+
+    def newFeatures(self, chrom, features):
+        # Features are expanded in many lines, not made by a formatter #
+        Serializer.newFeatures(self, chrom, features)
 
 #-----------------------------------#
 # This code was written by the BBCF #
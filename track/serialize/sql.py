@@ -17,6 +17,11 @@ BUFFER_SIZE = 32767
 class SerializerSQL(Serializer):
     format = 'sql'
 
+    def __init__(self, path, layout=None, encode=None):
+        Serializer.__init__(self, path)
+        self.layout = layout
+        self.encode = encode
+
     def __enter__(self):
         self.buffer = []
         self.fields = None
@@ -38,6 +43,9 @@ class SerializerSQL(Serializer):
     def defineAssembly(self, assembly):
         self.current_assembly = assembly
 
+    def defineIndexes(self, fields):
+        self.current_indexes = fields
+
     def newTrack(self, info=None, name=None):
         # Close previous track #
         if self.current_track: self.closeCurrentTrack()
@@ -49,6 +57,8 @@ class SerializerSQL(Serializer):
         self.current_track = track.new(path)
         # Add the metadata #
         if info: self.current_track.info.update(info)
+        if self.layout: self.current_track.layout = self.layout
+        if self.encode: self.current_track.encoded_fields = self.encode
         # Add the tags #
         #if name: self.current_track.info['converted_from'] = name
         #self.current_track.info['converted_by'] = 'track package'
@@ -64,6 +74,13 @@ class SerializerSQL(Serializer):
             self.current_chrom = chrom
             self.buffer.append(feature)
 
+    def newFeatures(self, chrom, features):
+        if chrom != self.current_chrom:
+            self.flushBuffer()
+            self.current_chrom = chrom
+        self.buffer.extend(features)
+        if len(self.buffer) >= BUFFER_SIZE: self.flushBuffer()
+
     #-----------------------------------------------------------------------------#
     def closeCurrentTrack(self):
         # Empty buffer #
@@ -72,6 +89,8 @@ class SerializerSQL(Serializer):
         if hasattr(self, 'current_chrmeta'): self.current_track.chrmeta = self.current_chrmeta
         # Add assembly #
         if hasattr(self, 'current_assembly'): self.current_track.assembly = self.current_assembly
+        # Add indexes #
+        if hasattr(self, 'current_indexes'): self.current_track.indexed_fields = self.current_indexes
         # Add the benchmark #
         #self.current_track.info['converted_in'] = time.time() - self.start_time
         # Commit changes #
@@ -3,25 +3,22 @@ This module implements the WIG serialization.
 """
 
 # Internal modules #
-from track.serialize import Serializer
-from track.common import format_float
+from track.serialize import SerializerText
+from track.common import format_floats
 
 # Constants #
 all_fields = ['start', 'end', 'score']
 
 ################################################################################
-class SerializerWIG(Serializer):
+class SerializerWIG(SerializerText):
     format = 'wig'
 
     def __enter__(self):
-        self.file = open(self.path, 'w')
         self.indices = None
         self.previous_end = None
         self.previous_span = None
-        return self
-
-    def __exit__(self, errtype, value, traceback):
-        self.file.close()
+        self.scores = {}
+        return SerializerText.__enter__(self)
 
     def defineFields(self, fields):
         # Check that we have what we need #
@@ -37,27 +34,36 @@ class SerializerWIG(Serializer):
         if not info: info = {}
         info['type'] = 'wig'
         info['converted_by'] = __package__
-        self.file.write("track " + ' '.join([k + '="' + v + '"' for k, v in info.items()]) + '\n')
+        self.writeHeader(info)
         self.tracks.append(self.path)
 
     def newFeature(self, chrom, feature):
+        self.newFeatures(chrom, [feature])
+
+    def newFeatures(self, chrom, features):
         # Put the fields in the right order #
-        if self.indices: f = [feature[i] for i in self.indices]
-        else:            f = list(feature)
-        start, end, span, score = f[0], f[1], f[1]-f[0], format_float(f[2])
+        if self.indices: features = [[f[i] for i in self.indices] for f in features]
+        # Convert all the scores at once #
+        if len(self.scores) > 65536: self.scores = {}
+        scores = format_floats([f[2] for f in features], cache=self.scores)
+        # Write them one by one #
+        for f, score in zip(features, scores): self.addScore(chrom, f[0], f[1], score)
+
+    def addScore(self, chrom, start, end, score):
+        span = end - start
         # Look ahead #
         if not self.previous_end:
             self.writeFixedStep(chrom, start, end, span, score)
             return
         # If we have the same span just add the score #
         if start == self.previous_end and span == self.previous_span:
-            self.file.write(score + '\n')
+            self.write(score + '\n')
             self.previous_end += span
         else:
             self.writeFixedStep(chrom, start, end, span, score)
 
     def writeFixedStep(self, chrom, start, end, span, score):
-        self.file.write("fixedStep chrom=%s start=%s span=%s\n%s\n" % (chrom, start, span, score))
+        self.write("fixedStep chrom=%s start=%s span=%s\n%s\n" % (chrom, start, span, score))
         self.previous_end = end
         self.previous_span = span
 
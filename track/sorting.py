@@ -0,0 +1,256 @@
+"""
+This module implements an external merge sort for features. Features are
+collected in runs of bounded size. Each run is sorted in memory and, when
+it is full, spilled to a temporary file. The runs are then merged with a
+heap, one chromosome at a time, so that sorting a track never needs more
+than one run in memory. As soon as too many runs of the same size exist,
+they are merged into a larger one, so that the number of temporary files
+open at once stays small whatever the size of the input.
+"""
+
+# Built-in modules #
+import heapq, tempfile, cPickle
+from itertools import islice
+from operator import itemgetter
+
+# Internal modules #
+from track.serialize import BATCH_SIZE
+
+# Constants #
+RUN_SIZE   = 500000
+CHUNK_SIZE = 4096
+FAN_IN     = 64
+
+################################################################################
+class Run(object):
+    """A sorted run spilled to a temporary file. Every chromosome of the
+    run is stored as a segment of pickled chunks. The *level* of a run is
+    the number of merges it comes from."""
+
+    def __init__(self, chromosomes=None, level=0):
+        self.file = tempfile.TemporaryFile()
+        self.segments = {}
+        self.level = level
+        for chrom, features in (chromosomes or {}).items(): self.write(chrom, features)
+
+    def write(self, chrom, features):
+        """Appends the sorted features of a chromosome, from any iterable."""
+        offset, count = self.file.tell(), 0
+        features = iter(features)
+        while True:
+            chunk = list(islice(features, CHUNK_SIZE))
+            if not chunk: break
+            cPickle.dump(chunk, self.file, cPickle.HIGHEST_PROTOCOL)
+            count += len(chunk)
+        self.segments[chrom] = (offset, count)
+
+    def read(self, chrom):
+        if chrom not in self.segments: return
+        offset, count = self.segments[chrom]
+        while count > 0:
+            # Other runs share nothing, but our position may have moved #
+            self.file.seek(offset)
+            chunk = cPickle.load(self.file)
+            offset = self.file.tell()
+            count -= len(chunk)
+            for feature in chunk: yield feature
+
+    def close(self):
+        self.file.close()
+
+################################################################################
+class ExternalSorter(object):
+    """Sorts features from any number of chromosomes using a bounded
+    amount of memory.
+
+    ::
+
+        from track.sorting import ExternalSorter
+        sorter = ExternalSorter(key=lambda f: (f[0], f[1]))
+        for chrom, feature in unsorted_features: sorter.add(chrom, feature)
+        for chrom in sorter.chromosomes:
+            for feature in sorter.read(chrom): print feature
+        sorter.close()
+    """
+
+    def __init__(self, key=None, run_size=RUN_SIZE, fan_in=FAN_IN):
+        self.key = key
+        self.run_size = run_size
+        self.fan_in = max(fan_in, 2)
+        self.runs = []
+        self.chromosomes = []
+        self.current = {}
+        self.size = 0
+
+    def add(self, chrom, feature):
+        if chrom not in self.current:
+            self.current[chrom] = []
+            if chrom not in self.chromosomes: self.chromosomes.append(chrom)
+        self.current[chrom].append(feature)
+        self.size += 1
+        if self.size >= self.run_size: self.spill()
+
+    def extend(self, chrom, features):
+        for feature in features: self.add(chrom, feature)
+
+    def spill(self):
+        """Sort the features in memory and write them to a new run."""
+        if not self.size: return
+        for features in self.current.values(): features.sort(key=self.key)
+        self.runs.append(Run(self.current))
+        self.current = {}
+        self.size = 0
+        # The last runs are merged as soon as enough of them have the same level #
+        tail = self.runs[-self.fan_in:]
+        while len(tail) == self.fan_in and tail[0].level == tail[-1].level:
+            self.merge_runs(len(self.runs) - self.fan_in)
+            tail = self.runs[-self.fan_in:]
+
+    def merge_runs(self, start):
+        """Replaces up to *fan_in* consecutive runs, from *start* on, by a single run."""
+        group = self.runs[start:start+self.fan_in]
+        merged = Run(level=max(run.level for run in group) + 1)
+        for chrom in self.chromosomes:
+            sources = [run.read(chrom) for run in group if chrom in run.segments]
+            if sources: merged.write(chrom, self.merge(sources))
+        for run in group: run.close()
+        self.runs[start:start+self.fan_in] = [merged]
+
+    def merge(self, sources):
+        """Merges sorted iterables, the earlier ones first when keys are equal."""
+        if len(sources) == 1: return iter(sources[0])
+        if self.key is None: return heapq.merge(*sources)
+        # Decorate for the heap, the run number keeps it stable #
+        decorated = [((self.key(f), i, f) for f in source) for i, source in enumerate(sources)]
+        return (item[2] for item in heapq.merge(*decorated))
+
+    def read(self, chrom):
+        """Yields the features of one chromosome in sorted order."""
+        # Never merge more than *fan_in* sources at once #
+        while len(self.runs) >= self.fan_in: self.merge_runs(0)
+        tail = self.current.get(chrom, [])
+        tail.sort(key=self.key)
+        return self.merge([run.read(chrom) for run in self.runs if chrom in run.segments] + [tail])
+
+    def close(self):
+        for run in self.runs: run.close()
+        self.runs, self.current, self.chromosomes, self.size = [], {}, [], 0
+
+################################################################################
+def sort_features(chromosomes, key=None, run_size=RUN_SIZE, fan_in=FAN_IN):
+    """Sorts an iterable of ``(chrom, feature)`` pairs with bounded memory.
+
+       :param chromosomes: an iterable yielding ``(chrom, feature)`` tuples in any order.
+       :param key: an optional function extracting the sort key from a feature.
+       :param run_size: the number of features kept in memory before spilling to disk.
+       :param fan_in: the largest number of runs merged at once.
+       :returns: a generator yielding ``(chrom, feature)`` tuples grouped by chromosome (in the order they first appeared) and sorted by *key* within every chromosome.
+
+       ::
+
+           >>> list(sort_features([('chr2', (5, 9)), ('chr1', (7, 8)), ('chr2', (1, 4))], run_size=2))
+           [('chr2', (1, 4)), ('chr2', (5, 9)), ('chr1', (7, 8))]
+    """
+    sorter = ExternalSorter(key, run_size, fan_in)
+    try:
+        for chrom, feature in chromosomes: sorter.add(chrom, feature)
+        for chrom in sorter.chromosomes:
+            for feature in sorter.read(chrom): yield chrom, feature
+    finally:
+        sorter.close()
+
+################################################################################
+class SortingSerializer(object):
+    """Wraps a serializer so that the features of every track reach it
+    sorted by start and end, whatever order the parser emits them in.
+    Chromosomes are written in the order they first appear. If the fields
+    change in the middle of a track, the features received so far are
+    written out before the new fields are forwarded, and sorting starts
+    again from there.
+
+    ::
+
+        from track.parse import get_parser
+        from track.serialize import get_serializer
+        from track.sorting import SortingSerializer
+        parser = get_parser('tmp/unsorted.bed', 'bed')
+        serializer = SortingSerializer(get_serializer('tmp/sorted.sql', 'sql'))
+        serializer(parser)
+        parser(serializer)
+    """
+
+    def __init__(self, serializer, run_size=RUN_SIZE):
+        self.serializer = serializer
+        self.run_size = run_size
+        self.sorter = None
+        self.fields = None
+
+    def __getattr__(self, name):
+        return getattr(self.serializer, name)
+
+    def __enter__(self):
+        self.serializer.__enter__()
+        return self
+
+    def __exit__(self, errtype, value, traceback):
+        try:
+            if not errtype: self.flush()
+        finally:
+            if self.sorter: self.sorter.close()
+            self.sorter = None
+            self.serializer.__exit__(errtype, value, traceback)
+
+    def __call__(self, parser):
+        self.serializer(parser)
+
+    def flush(self):
+        if not self.sorter: return
+        for chrom in self.sorter.chromosomes:
+            features = self.sorter.read(chrom)
+            while True:
+                batch = list(islice(features, BATCH_SIZE))
+                if not batch: break
+                self.serializer.newFeatures(chrom, batch)
+        self.sorter.close()
+
+    def error(self, message, path=None, line_number=None):
+        self.serializer.error(message, path, line_number)
+
+    def defineFields(self, fields):
+        if fields == self.fields: return
+        self.flush()
+        self.fields = fields
+        self.serializer.defineFields(fields)
+        # Without coordinates there is nothing to sort on #
+        if 'start' in fields and 'end' in fields:
+            self.sorter = ExternalSorter(itemgetter(list(fields).index('start'), list(fields).index('end')), self.run_size)
+        else:
+            self.sorter = None
+
+    def defineIndexes(self, fields):
+        self.serializer.defineIndexes(fields)
+
+    def defineChrmeta(self, chrmeta):
+        self.serializer.defineChrmeta(chrmeta)
+
+    def defineAssembly(self, assembly):
+        self.serializer.defineAssembly(assembly)
+
+    def newTrack(self, info=None, name=None):
+        # Some parsers define the fields before the track #
+        self.flush()
+        self.serializer.newTrack(info, name)
+
+    def newFeature(self, chrom, feature):
+        if self.sorter: self.sorter.add(chrom, tuple(feature))
+        else:           self.serializer.newFeature(chrom, feature)
+
+    def newFeatures(self, chrom, features):
+        if self.sorter: self.sorter.extend(chrom, map(tuple, features))
+        else:           self.serializer.newFeatures(chrom, features)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
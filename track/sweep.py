@@ -0,0 +1,160 @@
+"""
+This module implements the k-way merge and the event sweep shared by the
+manipulations that combine many tracks at once, such as ``concatenate``
+and ``merge_scores``. Every stream only ever has its next feature in a
+heap, so finding the next event is logarithmic in the number of tracks
+instead of linear. Consumers that need every covering feature, such as
+``merge_scores`` summing their scores, still spend a time linear in the
+number of features covering each segment.
+"""
+
+# Built-in modules #
+import heapq, bisect
+from operator import itemgetter
+
+################################################################################
+def merge(streams, key=itemgetter(0, 1)):
+    """Merges any number of sorted feature streams into one sorted stream.
+    Features with the same *key* come out in the order of their streams.
+
+    ::
+
+        >>> list(merge([iter([(0,10),(5,10)]), iter([(0,5),(5,8)])]))
+        [(0, 5), (0, 10), (5, 8), (5, 10)]
+        >>> list(merge([iter([]), iter([(0,5)])]))
+        [(0, 5)]
+    """
+    heap = []
+    for index, stream in enumerate(streams):
+        stream = iter(stream)
+        for feature in stream:
+            heap.append((key(feature), index, feature, stream))
+            break
+    heapq.heapify(heap)
+    while heap:
+        index, feature, stream = heap[0][1:]
+        yield feature
+        for feature in stream:
+            heapq.heapreplace(heap, (key(feature), index, feature, stream))
+            break
+        else:
+            heapq.heappop(heap)
+
+################################################################################
+def segments(streams, value=None):
+    """Sweeps over any number of sorted streams of features that do not
+    overlap each other within a stream. Yields every interval between two
+    consecutive boundaries covered by at least one feature, as a tuple of
+    the start, the end and the list of covering features in the order of
+    their streams. That list is updated in place as the sweep goes on,
+    features being inserted and removed at their position instead of the
+    list being sorted again, so it must be copied to be kept. If a *value*
+    function is given, the list holds its result for every feature instead,
+    for instance ``itemgetter(2)`` gives the scores, ready to be summed.
+
+    ::
+
+        >>> X1 = iter([(10,20,50.0), (30,40,100.0)])
+        >>> X2 = iter([(10,12,20.0)])
+        >>> for s in segments([X1, X2]): print s
+        (10, 12, [(10, 20, 50.0), (10, 12, 20.0)])
+        (12, 20, [(10, 20, 50.0)])
+        (30, 40, [(30, 40, 100.0)])
+        >>> for s in segments([iter([(10,20,50.0)]), iter([(15,30,20.0)])], itemgetter(2)): print s
+        (10, 15, [50.0])
+        (15, 20, [50.0, 20.0])
+        (20, 30, [20.0])
+    """
+    streams = [iter(s) for s in streams]
+    # The next feature of every stream, by start #
+    starts = []
+    for index, stream in enumerate(streams):
+        for feature in stream:
+            starts.append((feature[0], index, feature))
+            break
+    heapq.heapify(starts)
+    # The features covering the current position by end, and in the order of their streams #
+    ends     = []
+    order    = []
+    covering = []
+    position = None
+    while starts or ends:
+        # The next boundary #
+        if not ends:                      boundary = starts[0][0]
+        elif not starts:                  boundary = ends[0][0]
+        else:                             boundary = min(starts[0][0], ends[0][0])
+        if covering and boundary > position: yield (position, boundary, covering)
+        # Close the features ending here #
+        while ends and ends[0][0] == boundary:
+            index = heapq.heappop(ends)[1]
+            i = bisect.bisect_left(order, index)
+            del order[i]
+            del covering[i]
+        # Open the features starting here and read the next ones #
+        while starts and starts[0][0] == boundary:
+            index, feature = heapq.heappop(starts)[1:]
+            if feature[1] > feature[0]:
+                i = bisect.bisect_left(order, index)
+                order.insert(i, index)
+                covering.insert(i, feature if value is None else value(feature))
+                heapq.heappush(ends, (feature[1], index))
+            for feature in streams[index]:
+                heapq.heappush(starts, (feature[0], index, feature))
+                break
+        position = boundary
+
+################################################################################
+def boundaries(streams):
+    """Sweeps over any number of sorted streams of features that do not
+    overlap each other within a stream. Yields every position where a
+    feature starts or ends, in order, with the indices of the streams
+    whose coverage changes there. A stream whose feature ends where the
+    next one starts does not change.
+
+    ::
+
+        >>> X1 = iter([(4,5), (7,9)])
+        >>> X2 = iter([(1,3), (5,7)])
+        >>> for b in boundaries([X1, X2]): print b
+        (1, [1])
+        (3, [1])
+        (4, [0])
+        (5, [0, 1])
+        (7, [0, 1])
+        (9, [0])
+    """
+    streams = [iter(s) for s in streams]
+    # Every stream has exactly one pending start or end in the heap #
+    events = []
+    for index, stream in enumerate(streams):
+        for feature in stream:
+            events.append((feature[0], index, feature[1]))
+            break
+    heapq.heapify(events)
+    while events:
+        position = events[0][0]
+        changed = []
+        while events and events[0][0] == position:
+            index, end = events[0][1:]
+            changed.append(index)
+            # A start is followed by its end, an end by the next start #
+            if end is not None:
+                heapq.heapreplace(events, (end, index, None))
+                continue
+            for feature in streams[index]:
+                heapq.heapreplace(events, (feature[0], index, feature[1]))
+                break
+            else:
+                heapq.heappop(events)
+        # Streams changing twice at the same position did not change #
+        if len(changed) > 1:
+            counts = {}
+            for i in changed: counts[i] = counts.get(i, 0) + 1
+            changed = [i for i in changed if counts.pop(i, 0) % 2]
+        yield (position, changed)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
@@ -0,0 +1,73 @@
+"""
+Contains tests for converting many tracks at once.
+"""
+
+# Built-in modules #
+import os, shutil, tempfile
+
+# Internal modules #
+from track.test import samples
+from track.batch import expand_sources, convert_many, hash_registry
+
+# Unittesting module #
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+# Nosetest flag #
+__test__ = True
+
+###################################################################################
+class TestConvertMany(unittest.TestCase):
+    """Convert several BED files in parallel and skip them the second time"""
+    def runTest(self):
+        output = tempfile.mkdtemp()
+        sources = [info['bed'] for num, info in sorted(samples['small_features'].items())]
+        jobs = expand_sources(sources, 'gff', output)
+        for check in ('mtime', 'hash'):
+            reports = convert_many(jobs, processes=2, check=check, force=True)
+            self.assertEqual([r['error'] for r in reports], [None] * len(jobs))
+            for source, destination, assembly in jobs: self.assertTrue(os.path.exists(destination))
+            reports = convert_many(jobs, processes=2, check=check)
+            self.assertTrue(all(r.get('skipped') for r in reports))
+        self.assertFalse([f for f in os.listdir(output) if f.endswith('.md5')])
+        self.assertTrue(os.path.exists(os.path.join(output, hash_registry)))
+        shutil.rmtree(output)
+
+class TestCollision(unittest.TestCase):
+    """Sources with the same name in different directories cannot go to one output directory"""
+    def runTest(self):
+        inputs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        sources = []
+        for directory in inputs:
+            sources.append(os.path.join(directory, 'same.bed'))
+            shutil.copy(samples['small_features'][1]['bed'], sources[-1])
+        output = tempfile.mkdtemp()
+        jobs = expand_sources(sources, 'gff', output)
+        self.assertRaises(Exception, convert_many, jobs)
+        self.assertEqual(os.listdir(output), [])
+        for directory in inputs + [output]: shutil.rmtree(directory)
+
+class TestFailures(unittest.TestCase):
+    """Compressed sources are converted and failed conversions leave nothing behind"""
+    def runTest(self):
+        directory = tempfile.mkdtemp()
+        compressed = os.path.join(directory, 'compressed.bed.gz')
+        shutil.copy(samples['gzip_tracks'][1]['gzip'], compressed)
+        broken = os.path.join(directory, 'broken.bed')
+        with open(broken, 'w') as handle: handle.write('chr1\t0\t10\nchr1\tx\t20\n')
+        jobs = [(compressed, os.path.join(directory, 'compressed.sql'), None), (broken, os.path.join(directory, 'broken.sql'), None)]
+        for i in range(2):
+            reports = convert_many(jobs)
+            self.assertEqual(reports[0]['error'], None)
+            self.assertTrue(reports[1]['error'])
+            self.assertFalse(reports[1].get('skipped'))
+            self.assertFalse(os.path.exists(jobs[1][1]))
+        shutil.rmtree(directory)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
@@ -3,12 +3,14 @@ Contains format conversion tests.
 """
 
 # Built-in modules #
-import os
+import os, threading
 
 # Internal modules #
 import track
 from track.test import samples
 from track.common import temporary_path, assert_file_equal
+from track.parse import get_parser
+from track.serialize import Serializer, PipelinedSerializer, serializers
 
 # Unittesting module #
 try:
@@ -29,6 +31,100 @@ class TestSQLtoBED(unittest.TestCase):
         #assert_file_equal(out_path, samples['small_features'][1]['bed'])
         os.remove(out_path)
 
+#-----------------------------------------------------------------------------#
+class TestPipelined(unittest.TestCase):
+    """Convert a file with the serializer in its own thread"""
+    def runTest(self):
+        for num, info in sorted(samples['yeast_features'].items()):
+            path_a, path_b = temporary_path('.sql'), temporary_path('.sql')
+            track.convert(info['bed'], path_a)
+            track.convert(info['bed'], path_b, pipelined=True)
+            with track.load(path_a) as a:
+                with track.load(path_b) as b:
+                    self.assertEqual(a.chromosomes, b.chromosomes)
+                    for chrom in a: self.assertEqual(list(a.read(chrom)), list(b.read(chrom)))
+            os.remove(path_a)
+            os.remove(path_b)
+
+#-----------------------------------------------------------------------------#
+class FailingSerializer(Serializer):
+    def newFeature(self, chrom, feature):
+        raise ValueError("Cannot write '%s'" % chrom)
+
+class TestPipelinedError(unittest.TestCase):
+    """Errors in the writer thread reach the parser thread"""
+    def runTest(self):
+        parser = get_parser(samples['small_features'][1]['bed'], 'bed')
+        serializer = PipelinedSerializer(FailingSerializer(None), batch_size=1, queue_size=1)
+        serializer(parser)
+        self.assertRaises(ValueError, parser, serializer)
+
+class ExitFailingSerializer(Serializer):
+    def __exit__(self, errtype, value, traceback):
+        raise ValueError("Cannot close '%s'" % self.path)
+
+class TestPipelinedExitError(unittest.TestCase):
+    """Errors when closing the serializer do not hang the conversion"""
+    def runTest(self):
+        serializers['failing'] = {'module': 'track.test.convert', 'class': 'ExitFailingSerializer'}
+        in_path, out_path = samples['small_features'][1]['bed'], temporary_path('.failing')
+        outcome = []
+        def target():
+            try: track.convert(in_path, (out_path, 'failing'), pipelined=True)
+            except ValueError: outcome.append('raised')
+        try:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            thread.join(30)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(outcome, ['raised'])
+        finally:
+            serializers.pop('failing')
+
+class RecordingSerializer(Serializer):
+    def __init__(self, path):
+        Serializer.__init__(self, path)
+        self.features, self.errtype = [], None
+    def __exit__(self, errtype, value, traceback):
+        self.errtype = errtype
+    def newFeature(self, chrom, feature):
+        self.features.append(feature)
+
+class TestPipelinedParserError(unittest.TestCase):
+    """Errors in the parser thread are not followed by a last batch"""
+    def runTest(self):
+        path = temporary_path('.bed')
+        with open(path, 'w') as f: f.write('chr1\t10\t20\nchr1\t30\t40\nchr1\tabc\t50\n')
+        parser = get_parser(path, 'bed')
+        recorder = RecordingSerializer(None)
+        serializer = PipelinedSerializer(recorder)
+        serializer(parser)
+        self.assertRaises(Exception, parser, serializer)
+        self.assertEqual(recorder.features, [])
+        self.assertTrue(recorder.errtype is not None)
+        os.remove(path)
+
+#-----------------------------------------------------------------------------#
+class TestManyDestinations(unittest.TestCase):
+    """Convert a file to several formats in one pass"""
+    def runTest(self):
+        for pipelined in (False, True):
+            in_path = samples['small_features'][1]['bed']
+            sql_path, gff_path = temporary_path('.sql'), temporary_path('.gff')
+            result = track.convert(in_path, [sql_path, gff_path], pipelined=pipelined)
+            self.assertEqual(result, [sql_path, gff_path])
+            # Compare with one conversion at a time #
+            sql_ref, gff_ref = temporary_path('.sql'), temporary_path('.gff')
+            track.convert(in_path, sql_ref)
+            track.convert(in_path, gff_ref)
+            assert_file_equal(gff_path, gff_ref)
+            with track.load(sql_path) as a:
+                with track.load(sql_ref) as b:
+                    self.assertEqual(a.fields, b.fields)
+                    for chrom in b: self.assertEqual(list(a.read(chrom)), list(b.read(chrom)))
+            for path in (sql_path, gff_path, sql_ref, gff_ref): os.remove(path)
+
 #-----------------------------------#
 # This code was written by the BBCF #
 # http://bbcf.epfl.ch/              #
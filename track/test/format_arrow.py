@@ -0,0 +1,124 @@
+"""
+Contains tests for the Arrow IPC and Parquet formats.
+These tests are only run when the pyarrow package is installed.
+"""
+
+# Built-in modules #
+import os
+
+# Internal modules #
+import track
+from track.common import temporary_path
+from track.test import samples
+
+# Unittesting module #
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+# Nosetest flag #
+try:
+    import pyarrow
+    __test__ = True
+except ImportError:
+    __test__ = False
+
+###################################################################################
+class TestRoundtrip(unittest.TestCase):
+    def runTest(self):
+        for format in ('arrow', 'parquet'):
+            for info in samples['small_features'].values() + samples['rand_signals'].values():
+                # Prepare paths #
+                orig_sql_path = info['sql']
+                test_path = temporary_path('.' + format)
+                test_sql_path = temporary_path('.sql')
+                # From SQL to the columnar format and back #
+                track.convert(orig_sql_path, test_path)
+                track.convert(test_path, test_sql_path)
+                with track.load(orig_sql_path, readonly=True) as orig:
+                    with track.load(test_sql_path) as test:
+                        self.assertEqual(orig.chromosomes, test.chromosomes)
+                        self.assertEqual(orig.fields, test.fields)
+                        self.assertEqual(dict(orig.info), dict(test.info))
+                        for chrom in orig:
+                            self.assertEqual([tuple(f) for f in orig.read(chrom, order='start,end')], [tuple(f) for f in test.read(chrom)])
+                # Clean up #
+                os.remove(test_path)
+                os.remove(test_sql_path)
+
+###################################################################################
+class TestRegions(unittest.TestCase):
+    def runTest(self):
+        from track.arrow import ArrowReader
+        orig_sql_path = samples['rand_signals']['Pol2']['sql']
+        for format in ('arrow', 'parquet'):
+            test_path = temporary_path('.' + format)
+            with track.load(orig_sql_path, readonly=True) as orig:
+                orig.export(test_path)
+                with ArrowReader(test_path, format) as test:
+                    self.assertEqual(test.fields, ['start', 'end', 'score'])
+                    self.assertEqual(str(test.schema.field('start').type), 'int64')
+                    for selection in ['chrII', {'chr':'chrI', 'start':40000, 'end':50000}, {'chr':'chrXII', 'start':0, 'end':10}]:
+                        self.assertEqual(list(test.read(selection)), [tuple(f) for f in orig.read(selection, order='start,end')])
+                    self.assertEqual(list(test.read({'chr':'chrI', 'start':40000, 'end':50000}, ['end'])),
+                                     [tuple(f) for f in orig.read({'chr':'chrI', 'start':40000, 'end':50000}, ['end'], order='start,end')])
+            os.remove(test_path)
+
+###################################################################################
+class TestSchema(unittest.TestCase):
+    """Column types and placeholder columns"""
+    def runTest(self):
+        from track.arrow import make_schema, make_array
+        self.assertEqual(make_schema(['start', 'end', 'name']).types,
+                         [pyarrow.string(), pyarrow.int64(), pyarrow.int64(), pyarrow.string()])
+        self.assertEqual(make_schema(['start', 'score'], texts=['score']).names, ['chr', 'start', 'score', 'score:text'])
+        self.assertEqual([a.to_pylist() for a in make_array([1.5, '.'], pyarrow.float64())], [[1.5, None], [None, u'.']])
+
+###################################################################################
+class TestPlaceholders(unittest.TestCase):
+    """The '.' placeholders of numerical fields survive a round trip"""
+    def runTest(self):
+        orig_sql_path = samples['gtf_tracks'][2]['sql']
+        ref_gtf_path = temporary_path('.gtf')
+        track.convert(orig_sql_path, ref_gtf_path)
+        for format in ('arrow', 'parquet'):
+            test_path, test_gtf_path = temporary_path('.' + format), temporary_path('.gtf')
+            track.convert(orig_sql_path, test_path)
+            track.convert(test_path, test_gtf_path)
+            self.assertEqual(sorted(open(test_gtf_path)), sorted(open(ref_gtf_path)))
+            os.remove(test_path)
+            os.remove(test_gtf_path)
+        os.remove(ref_gtf_path)
+
+###################################################################################
+class TestChromosomes(unittest.TestCase):
+    """Chromosomes coming back are merged, fields appearing later are null before"""
+    def runTest(self):
+        from track.arrow import ArrowReader
+        from track.serialize import get_serializer
+        for format in ('arrow', 'parquet'):
+            path = temporary_path('.' + format)
+            with get_serializer(path, format) as serializer:
+                serializer.defineFields(['start', 'end'])
+                serializer.newTrack({'datatype': 'features'})
+                serializer.newFeatures('chr2', [(10, 20), (30, 40)])
+                serializer.newFeatures('chr1', [(5, 6)])
+                self.assertEqual(len(serializer.pieces), 1)
+                serializer.defineFields(['start', 'end', 'name'])
+                serializer.newFeatures('chr2', [(0, 5, 'A')])
+                pieces = [p for c, p in serializer.pieces]
+            self.assertFalse(any(os.path.exists(p) for p in pieces))
+            with ArrowReader(path, format) as test:
+                self.assertEqual(test.fields, ['start', 'end', 'name'])
+                self.assertEqual(test.info, {'datatype': 'features'})
+                self.assertEqual(test.chroms, ['chr1', 'chr2'])
+                self.assertEqual(list(test.read('chr1')), [(5, 6, None)])
+                self.assertEqual(list(test.read('chr2')), [(0, 5, 'A'), (10, 20, None), (30, 40, None)])
+            os.remove(path)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
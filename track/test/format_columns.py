@@ -0,0 +1,131 @@
+"""
+Contains tests for the columnar format.
+These tests are only run when the NumPy package is installed.
+"""
+
+# Built-in modules #
+import os
+
+# Internal modules #
+import track
+from track.common import temporary_path
+from track.test import samples
+
+# Unittesting module #
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+# Nosetest flag #
+try:
+    import numpy
+    from track.columns import ColumnarTrack
+    __test__ = True
+except ImportError:
+    __test__ = False
+
+###################################################################################
+class TestRoundtrip(unittest.TestCase):
+    def runTest(self):
+        for info in samples['small_features'].values() + samples['yeast_features'].values():
+            # Prepare paths #
+            orig_sql_path = info['sql']
+            test_columns_path = temporary_path('.columns')
+            test_sql_path = temporary_path('.sql')
+            # From SQL to columns and back #
+            track.convert(orig_sql_path, test_columns_path)
+            track.convert(test_columns_path, test_sql_path)
+            with track.load(orig_sql_path) as orig:
+                with track.load(test_sql_path) as test:
+                    self.assertEqual(orig.chromosomes, test.chromosomes)
+                    self.assertEqual(orig.fields, test.fields)
+                    self.assertEqual(dict(orig.chrmeta), dict(test.chrmeta))
+                    # Scores are stored in single precision #
+                    score = orig.fields.index('score') if 'score' in orig.fields else None
+                    for chrom in orig:
+                        expected, got = list(orig.read(chrom, order='start,end')), list(test.read(chrom))
+                        self.assertEqual(len(expected), len(got))
+                        for a, b in zip(expected, got):
+                            self.assertEqual([x for i, x in enumerate(a) if i != score], [x for i, x in enumerate(b) if i != score])
+                            if score is not None: self.assertAlmostEqual(a[score], b[score], delta=abs(a[score])*1e-6)
+            # Clean up #
+            os.remove(test_columns_path)
+            os.remove(test_sql_path)
+
+###################################################################################
+class TestChrmeta(unittest.TestCase):
+    def runTest(self):
+        path, test_columns_path = temporary_path('.sql'), temporary_path('.columns')
+        with track.new(path) as t:
+            t.write('chr1', [(10, 20, 'A')], ['start', 'end', 'name'])
+            t.chrmeta = {'chr1': {'length': 100}, 'chr2': {'length': 50}}
+        track.convert(path, test_columns_path)
+        with ColumnarTrack(test_columns_path) as test:
+            self.assertEqual(test.chrmeta, {'chr1': {'length': 100}, 'chr2': {'length': 50}})
+            self.assertEqual(test.chromosomes, ['chr1', 'chr2'])
+            self.assertEqual(test.count('chr2'), 0)
+        os.remove(path)
+        os.remove(test_columns_path)
+
+###################################################################################
+class TestRegions(unittest.TestCase):
+    def runTest(self):
+        orig_sql_path = samples['rand_signals']['Pol2']['sql']
+        test_columns_path = temporary_path('.columns')
+        track.convert(orig_sql_path, test_columns_path)
+        with track.load(orig_sql_path) as orig:
+            with ColumnarTrack(test_columns_path) as test:
+                self.assertEqual(orig.chromosomes, test.chromosomes)
+                self.assertEqual(test.column('chrI', 'score').dtype.name, 'float32')
+                for start, end in [(0, 100), (1000, 50000), (37000, 37500)]:
+                    selection = {'chr':'chrI', 'start':start, 'end':end}
+                    got, expected = list(test.read(selection, ['start', 'end'])), [tuple(f) for f in orig.read(selection, ['start', 'end'], order='start,end')]
+                    self.assertEqual(got, expected)
+                    got, expected = test.score_vector('chrI', start, end), list(orig.get_partial_score_vector('chrI', start, end))
+                    self.assertEqual(len(got), len(expected))
+                    for a, b in zip(got.tolist(), expected): self.assertAlmostEqual(a, b, delta=abs(b)*1e-6)
+        os.remove(test_columns_path)
+
+###################################################################################
+class TestNulls(unittest.TestCase):
+    """Integer fields keep their nulls, such as the frames of a GTF file"""
+    def runTest(self):
+        orig_sql_path = samples['gtf_tracks'][2]['sql']
+        test_columns_path, test_gtf_path, ref_gtf_path = temporary_path('.columns'), temporary_path('.gtf'), temporary_path('.gtf')
+        track.convert(orig_sql_path, test_columns_path)
+        with ColumnarTrack(test_columns_path) as test:
+            frames = test.column('chr1', 'frame')
+            self.assertTrue(frames.mask.any())
+            self.assertTrue(None in [f[0] for f in test.read('chr1', ['frame'])])
+        track.convert(test_columns_path, test_gtf_path)
+        track.convert(orig_sql_path, ref_gtf_path)
+        self.assertEqual(sorted(open(test_gtf_path)), sorted(open(ref_gtf_path)))
+        for path in (test_columns_path, test_gtf_path, ref_gtf_path): os.remove(path)
+
+###################################################################################
+class TestChromosomes(unittest.TestCase):
+    """Chromosomes are written one after the other, also when they come back"""
+    def runTest(self):
+        from track.serialize import get_serializer
+        path = temporary_path('.columns')
+        with get_serializer(path, 'columns') as serializer:
+            serializer.defineFields(['start', 'end'])
+            serializer.newTrack()
+            serializer.newFeatures('chr1', [(10, 20), (30, 40)])
+            serializer.newFeatures('chr2', [(5, 6)])
+            self.assertEqual(serializer.writer.chromosomes.keys(), ['chr1'])
+            serializer.defineFields(['start', 'end', 'name'])
+            serializer.newFeatures('chr1', [(0, 5, 'A')])
+            self.assertEqual(sorted(serializer.writer.chromosomes), ['chr1', 'chr2'])
+        with ColumnarTrack(path) as test:
+            self.assertEqual(test.fields, ['start', 'end', 'name'])
+            self.assertEqual(list(test.read('chr1')), [(0, 5, 'A'), (10, 20, ''), (30, 40, '')])
+            self.assertEqual(list(test.read('chr2')), [(5, 6, '')])
+        os.remove(path)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
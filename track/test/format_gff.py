@@ -40,6 +40,23 @@ class TestRoundtrip(unittest.TestCase):
             os.remove(test_sql_path)
             os.remove(test_gff_path)
 
+class TestRepeatedAttributes(unittest.TestCase):
+    def runTest(self):
+        # The Note key appears twice on a line #
+        lines = ['chr1\tsrc\texon\t10\t20\t.\t+\t.\tID=A;Note=first;Note=second',
+                 'chr1\tsrc\texon\t30\t40\t.\t-\t.\tID=B;Note=only']
+        orig_gff_path = temporary_path('.gff')
+        test_sql_path = temporary_path('.sql')
+        with open(orig_gff_path, 'w') as f: f.write('\n'.join(lines) + '\n')
+        track.convert(orig_gff_path, test_sql_path, attributes_to_columns=['ID', 'Note'])
+        with track.load(test_sql_path) as t:
+            rows = list(t.read('chr1'))
+            self.assertEqual([x['Note'] for x in rows], [u'first,second', u'only'])
+            self.assertEqual([x.attrs['Note'] for x in rows], [u'first,second', u'only'])
+        # Clean up #
+        os.remove(orig_gff_path)
+        os.remove(test_sql_path)
+
 #-----------------------------------#
 # This code was written by the BBCF #
 # http://bbcf.epfl.ch/              #
@@ -9,6 +9,7 @@ import os
 # Internal modules #
 import track
 from track.common import temporary_path, assert_file_equal
+from track.util import LazyAttributes
 from track.test import samples
 
 # Unittesting module #
@@ -55,6 +56,80 @@ class TestRoundTrip(unittest.TestCase):
             os.remove(test_sql_path)
             os.remove(test_gtf_path)
 
+class TestVariableAttributes(unittest.TestCase):
+    def runTest(self):
+        # Attribute sets differ from line to line #
+        lines = ['chr1\tsrc\texon\t10\t20\t.\t+\t.\tgene_id "A"; transcript_id "A.1"; exon_number 1;',
+                 'chr1\tsrc\texon\t30\t40\t.\t-\t.\tgene_id "B"; transcript_id "B.1"; gene_name "Bb; 2";',
+                 'chr1\tsrc\texon\t50\t60\t.\t+\t0\tgene_id "C"; transcript_id "C.1";']
+        orig_gtf_path = temporary_path('.gtf')
+        test_sql_path = temporary_path('.sql')
+        with open(orig_gtf_path, 'w') as f: f.write('\n'.join(lines) + '\n')
+        # From GTF to SQL #
+        track.convert(orig_gtf_path, test_sql_path)
+        with track.load(test_sql_path) as t:
+            self.assertEqual(t.fields[7:], ['gene_id', 'transcript_id', 'exon_number', 'gene_name'])
+            got = [tuple(x)[7:] for x in t.read('chr1')]
+        expected = [(u'A', u'A.1', u'1',  None),
+                    (u'B', u'B.1', None,  u'Bb; 2'),
+                    (u'C', u'C.1', None,  None)]
+        self.assertEqual(got, expected)
+        # Clean up #
+        os.remove(orig_gtf_path)
+        os.remove(test_sql_path)
+
+class TestRepeatedAttributes(unittest.TestCase):
+    def runTest(self):
+        # The tag key appears several times on a line #
+        lines = ['chr1\tsrc\texon\t10\t20\t.\t+\t.\tgene_id "A"; transcript_id "A.1"; tag "basic"; tag "CCDS";',
+                 'chr1\tsrc\texon\t30\t40\t.\t-\t.\tgene_id "B"; transcript_id "B.1"; tag "basic";']
+        orig_gtf_path = temporary_path('.gtf')
+        with open(orig_gtf_path, 'w') as f: f.write('\n'.join(lines) + '\n')
+        for kwargs in ({}, {'attributes_to_columns': ['gene_id', 'tag']}):
+            test_sql_path = temporary_path('.sql')
+            track.convert(orig_gtf_path, test_sql_path, **kwargs)
+            with track.load(test_sql_path) as t:
+                self.assertEqual([x['tag'] for x in t.read('chr1')], [u'basic,CCDS', u'basic'])
+            os.remove(test_sql_path)
+        # Clean up #
+        os.remove(orig_gtf_path)
+
+class TestAttributeColumns(unittest.TestCase):
+    def runTest(self):
+        info = samples['gtf_tracks'][2]
+        orig_gtf_path = info['gtf']
+        test_sql_path = temporary_path('.sql')
+        test_gtf_path = temporary_path('.gtf')
+        # From GTF to SQL with only two extracted attributes #
+        track.convert(orig_gtf_path, test_sql_path, attributes_to_columns=['gene_id', 'gene_name'])
+        with track.load(test_sql_path) as t:
+            self.assertEqual(t.fields[7:], ['gene_id', 'gene_name', 'attributes'])
+            self.assertEqual(t.indexed_fields, ['gene_id', 'gene_name'])
+            self.assertTrue('chr1_gene_id_idx' in [x[0] for x in t.cursor().execute("select name from sqlite_master where type='index'")])
+            row = t.read('chr1').next()
+            self.assertEqual(row['gene_name'], u'ENSG00000162571')
+            self.assertEqual(row.attrs['exon_number'], u'16')
+            self.assertEqual(LazyAttributes(row['attributes'])['exon_number'], u'16')
+            self.assertRaises(AttributeError, getattr, t.read('chr1', ['start', 'end']).next(), 'attrs')
+        # From SQL to GTF, the raw attributes are written back #
+        track.convert(test_sql_path, test_gtf_path)
+        self.assertTrue(assert_file_equal(orig_gtf_path, test_gtf_path, start_b=1))
+        # Clean up #
+        os.remove(test_sql_path)
+        os.remove(test_gtf_path)
+
+class TestFromGFF(unittest.TestCase):
+    def runTest(self):
+        gff_path = temporary_path('.gff')
+        gtf_path = temporary_path('.gtf')
+        with open(gff_path, 'w') as f:
+            f.write('chr1\tsrc\tgene\t10\t20\t.\t+\t.\tID=gene1;Name=A%3BB\n')
+        track.convert(gff_path, gtf_path)
+        with open(gtf_path) as f: line = f.readlines()[-1]
+        self.assertEqual(line.rstrip('\n').split('\t')[-1], 'ID "gene1"; Name "A;B";')
+        os.remove(gff_path)
+        os.remove(gtf_path)
+
 #-----------------------------------#
 # This code was written by the BBCF #
 # http://bbcf.epfl.ch/              #
@@ -46,6 +46,27 @@ class TestExport(unittest.TestCase):
         # Clean up #
         os.remove(test_sga_path)
 
+class TestLongFeatures(unittest.TestCase):
+    def runTest(self):
+        from track.serialize.sga import BLOCK_SIZE
+        features = [(0, BLOCK_SIZE*2 + 10, 5.0), (BLOCK_SIZE*3, BLOCK_SIZE*3 + 10, 2.0)]
+        # Prepare paths #
+        orig_sql_path = temporary_path('.sql')
+        test_sga_path = temporary_path('.sga')
+        test_sql_path = temporary_path('.sql')
+        with track.new(orig_sql_path) as t:
+            t.fields = ['start', 'end', 'score']
+            t.write('chr1', features)
+        # A feature longer than a block gives one line per base #
+        track.convert(orig_sql_path, test_sga_path, assembly='hg19')
+        with open(test_sga_path) as f: self.assertEqual(sum(1 for line in f), BLOCK_SIZE*2 + 20)
+        # And comes back whole #
+        track.convert(test_sga_path, test_sql_path, assembly='hg19')
+        with track.load(test_sql_path) as t:
+            self.assertEqual([tuple(f) for f in t.read(t.chromosomes[0], ['start', 'end', 'score'])], features)
+        # Clean up #
+        for path in (orig_sql_path, test_sga_path, test_sql_path): os.remove(path)
+
 #-----------------------------------#
 # This code was written by the BBCF #
 # http://bbcf.epfl.ch/              #
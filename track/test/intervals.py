@@ -0,0 +1,95 @@
+"""
+Contains tests for the interval arrays and the vectorized manipulations.
+These tests are only run when the NumPy package is installed.
+"""
+
+# Built-in modules #
+import random
+
+# Internal modules #
+from track import manipulate
+
+# Unittesting module #
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+# Nosetest flag #
+try:
+    import numpy
+    from track.intervals import IntervalArray
+    __test__ = True
+except ImportError:
+    __test__ = False
+
+###################################################################################
+def random_features(seed, count=200, length=40, span=2000):
+    generator = random.Random(seed)
+    starts = [generator.randint(0, span) for i in xrange(count)]
+    return sorted((s, s + generator.randint(1, length), float(generator.randint(0, 9))) for s in starts)
+
+def covered(features):
+    positions = set()
+    for f in features: positions.update(xrange(f[0], f[1]))
+    return positions
+
+###################################################################################
+class TestAlgebra(unittest.TestCase):
+    """Compare the set operations with sets of positions."""
+    def runTest(self):
+        for seed in xrange(10):
+            X, Y = random_features(seed), random_features(seed + 100)
+            x, y = IntervalArray.from_features(X), IntervalArray.from_features(Y)
+            self.assertEqual(covered(x.union(y).features()),     covered(X) | covered(Y))
+            self.assertEqual(covered(x.intersect(y).features()), covered(X) & covered(Y))
+            self.assertEqual(covered(x.subtract(y).features()),  covered(X) - covered(Y))
+            self.assertEqual(covered(x.complement(2100).features()), set(xrange(2100)) - covered(X))
+
+class TestVectorized(unittest.TestCase):
+    """Compare the vectorized manipulations with their generators."""
+    def runTest(self):
+        for seed in xrange(10):
+            X, Y = random_features(seed), random_features(seed + 100, 50)
+            x, y = IntervalArray.from_features(X, 2), IntervalArray.from_features(Y)
+            positions = lambda F: [f[:2] for f in F]
+            self.assertEqual(manipulate.complement(x, l=2100).features(),
+                             list(manipulate.complement(iter(X), l=2100)))
+            self.assertEqual(manipulate.threshold(x, 5).features(),
+                             list(manipulate.threshold(iter(X), 5)))
+            self.assertEqual(manipulate.filter(x, y).features(),
+                             list(manipulate.filter(iter(X), iter(Y))))
+            pieces = manipulate.overlap(iter([f[:2] + ('', f[2], 0) for f in X]), iter([f[:2] + ('', f[2], 0) for f in Y]), l=2100)
+            self.assertEqual(sorted(manipulate.overlap(x, IntervalArray.from_features(Y, 2), l=2100).features()),
+                             sorted((f[0], f[1], f[3]) for f in pieces))
+            for kwargs in ({'before_start':-50, 'after_end':20}, {'before_start':-50, 'after_start':10},
+                           {'before_end':-5, 'after_end':30}, {'before_start':-50, 'after_start':10, 'before_end':-5, 'after_end':30}):
+                self.assertEqual(sorted(manipulate.neighborhood(x, l=2000, **kwargs).features()),
+                                 sorted(manipulate.neighborhood(iter(X), l=2000, **kwargs)))
+            self.assertEqual(positions(manipulate.fusion(x).features()),
+                             positions(manipulate.fusion(iter([f[:2] + ('', f[2], 0) for f in X]))))
+        # The same errors as the generators #
+        x = IntervalArray.from_features(random_features(0))
+        self.assertRaises(Exception, manipulate.neighborhood, x, l=2000, before_start=10, after_start=5)
+        self.assertRaises(Exception, list, manipulate.neighborhood(iter([(0, 10)]), l=2000, before_start=10, after_start=5))
+        self.assertRaises(Exception, manipulate.neighborhood, x, l=2000, before_end=10, after_end=5)
+        self.assertRaises(Exception, manipulate.threshold, x, 5)
+        # Interval arrays cannot be mixed with other inputs #
+        self.assertRaises(Exception, manipulate.filter, x, iter(random_features(1)))
+        self.assertRaises(Exception, manipulate.filter, iter(random_features(1)), x)
+
+class TestMeanScores(unittest.TestCase):
+    """Compare the vectorized mean scores with hand computed ones."""
+    def runTest(self):
+        from track.manips.mean_score_by_feature import mean_scores
+        got = mean_scores(numpy.array([10, 17]), numpy.array([12, 22]), numpy.array([5.0, 500.0]),
+                          numpy.array([10, 30, 11]), numpy.array([20, 40, 18]))
+        self.assertEqual(list(got), [151.0, 0.0, (5.0 + 500.0) / 7])
+        self.assertEqual(list(mean_scores(numpy.array([]), numpy.array([]), numpy.array([]),
+                                          numpy.array([0]), numpy.array([5]))), [0.0])
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
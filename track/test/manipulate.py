@@ -16,8 +16,10 @@ import track
 from track import manipulate
 from track.manipulate import window_smoothing, mean_score_by_feature
 from track.manipulate import complement, merge_scores, threshold
+from track.manips import custom_boolean
 from track.common import temporary_path
 from track.test import samples
+from track.extras import VirtualTrack
 
 # Unittesting module #
 try:
@@ -88,6 +90,40 @@ class TestWindowSmooth(unittest.TestCase):
         os.remove(in_path)
         os.remove(out_path)
 
+class TestBooleanForms(unittest.TestCase):
+    """Test the precompiled forms of custom_boolean against plain functions."""
+    def runTest(self):
+        tracks = [[(4,5),(7,9),(10,12)], [(1,3),(4,5),(11,14)], [(9,13),(20,5000)], []]
+        tracks = [[(x[0],x[1],'',0.0,0) for x in t] for t in tracks]
+        cases = [(custom_boolean.all_of(0,1),           lambda x: x[0] and x[1]),
+                 (custom_boolean.any_of(),              lambda x: any(x)),
+                 (custom_boolean.none_of(0),            lambda x: not x[0]),
+                 (custom_boolean.k_of_n(2, 0, 1, 2),    lambda x: x[0]+x[1]+x[2] >= 2),
+                 (custom_boolean.boolean_form((1,2), 1, (0,)), lambda x: (x[1] or x[2]) and not x[0])]
+        for form, fn in cases:
+            expected = list(custom_boolean.generate([iter(t) for t in tracks], fn))
+            self.assertEqual(list(custom_boolean.generate([iter(t) for t in tracks], form)), expected)
+        got = list(custom_boolean.generate([iter(t) for t in tracks], custom_boolean.any_of()))
+        self.assertEqual([f[:2] for f in got], [(1,3),(4,5),(7,14),(20,5000)])
+        # Plain functions are called once for every combination of covered tracks #
+        calls = []
+        fn = lambda x: calls.append(tuple(x)) or any(x)
+        self.assertEqual(list(custom_boolean.generate([iter(t) for t in tracks], fn)), got)
+        self.assertEqual(len(calls), len(set(calls)))
+
+class TestWindowSmoothDense(unittest.TestCase):
+    """Test the NumPy convolution of window_smoothing against the default one."""
+    def runTest(self):
+        features = [(0,2,10),(2,4,20),(6,8,10),(20,300,5),(1000,1010,1)]
+        def means(result):
+            values = [0.0] * 1500
+            for start, end, score in result: values[start:end] = [score] * (end-start)
+            return values
+        for L in (0, 2, 50):
+            expected = means(window_smoothing.generate(iter(features), L, 1500))
+            got = means(window_smoothing.generate(iter(features), L, 1500, True))
+            for e, g in zip(expected, got): self.assertAlmostEqual(e, g)
+
 ###################################################################################
 class TestMergeScores(unittest.TestCase):
     """Test a merge scores call via files."""
@@ -115,6 +151,17 @@ class TestMergeScores(unittest.TestCase):
         self.assertEqual(got, expected)
         os.remove(out_path)
 
+class TestMergeManyScores(unittest.TestCase):
+    """Test merging scores of many generated signals."""
+    def runTest(self):
+        n = 300
+        tracks = [iter([(i, i+10, 1.0), (1000+i, 1010+i, 2.0)]) for i in xrange(n)]
+        got = list(merge_scores.generate(tracks))
+        self.assertEqual(len(got), 2*(n+9))
+        self.assertEqual(got[0], (0, 1, 1.0/n))
+        self.assertEqual(got[9], (9, 10, 10.0/n))
+        self.assertEqual(got[-1], (1008+n, 1009+n, 2.0/n))
+
 class TestMeanScores(unittest.TestCase):
     """Test a mean score by feature call via files."""
     def runTest(self):
@@ -144,3 +191,96 @@ class TestThreshold(unittest.TestCase):
         expected = [(120, 122, 9000.0)]
         self.assertEqual(got, expected)
         os.remove(out_path)
+
+class TestParallel(unittest.TestCase):
+    """Test computing the chromosomes in worker processes."""
+    def runTest(self):
+        X = samples['yeast_features']['All']['sql']
+        Y = samples['yeast_features']['RP']['sql']
+        calls = [lambda p: complement(X, parallel=p),
+                 lambda p: window_smoothing(samples['rand_signals']['Pol2']['sql'], L=20, parallel=p),
+                 lambda p: manipulate.custom_boolean([X, Y], lambda x: x[0] and not x[1], parallel=p)]
+        for call in calls:
+            serial, parallel = call(1), call(2)
+            shards = list(parallel.paths_to_remove)
+            self.assertTrue(shards)
+            for chrom in serial:
+                self.assertEqual(map(tuple, parallel.read(chrom)), map(tuple, serial.read(chrom)))
+            serial.close()
+            parallel.close()
+            self.assertFalse(any(os.path.exists(p) for p in shards))
+        # Changes not saved yet are seen by the workers #
+        path = temporary_path('.sql')
+        with track.new(path) as t:
+            t.fields = ['start', 'end']
+            t.chrmeta = {'chr1': {'length': 100}, 'chr2': {'length': 100}}
+            t.write('chr1', [(10, 20)])
+            t.write('chr2', [(30, 40)])
+            serial, parallel = complement(t, parallel=1), complement(t, parallel=2)
+            self.assertTrue(parallel.paths_to_remove)
+            for chrom in ('chr1', 'chr2'): self.assertEqual(map(tuple, parallel.read(chrom)), map(tuple, serial.read(chrom)))
+            self.assertEqual(map(tuple, parallel.read('chr2')), [(0, 30), (40, 100)])
+            serial.close()
+            parallel.close()
+        os.remove(path)
+
+class TestDisjoint(unittest.TestCase):
+    """Test the overlap of tracks known not to have overlapping features."""
+    def runTest(self):
+        from track.manips import overlap
+        X = [(0, 10, 'A', 1.0, 1), (10, 10, 'B', 2.0, 1), (15, 30, 'C', 3.0, -1), (40, 50, 'D', 4.0, 0)]
+        Y = [(5, 10, 'a', 1.0, 1), (10, 20, 'b', 2.0, 1), (20, 20, 'c', 3.0, 1), (25, 45, 'd', 4.0, 0), (60, 70, 'e', 5.0, 0)]
+        paths = [temporary_path('.sql'), temporary_path('.sql')]
+        for path, features in zip(paths, (X, Y)):
+            with track.new(path) as t:
+                t.chrmeta['chr1'] = {'length': 100}
+                t.write('chr1', features)
+        with track.load(paths[0]) as x:
+            with track.load(paths[1]) as y:
+                self.assertFalse(x.is_overlapping('chr1'))
+                self.assertFalse(y.is_overlapping('chr1'))
+                self.assertEqual(manipulate.overlap.generator_for('chr1', [x, y]), overlap.disjoint_generate)
+                result = manipulate.overlap(x, y)
+                got = map(tuple, result.read('chr1'))
+                result.close()
+        expected = list(overlap.generate(iter(X), iter(Y), 100))
+        self.assertEqual(got, expected)
+        self.assertEqual(list(overlap.disjoint_generate(iter(X), iter(Y), 100)), expected)
+        for path in paths: os.remove(path)
+
+class TestVirtualTrack(unittest.TestCase):
+    """Test reading a virtual track many times, also from disk."""
+    def runTest(self):
+        X = samples['yeast_features']['All']['sql']
+        reference = complement(complement(X))
+        expected = dict((chrom, map(tuple, reference.read(chrom))) for chrom in reference)
+        reference.close()
+        for limit in (None, 100):
+            v = complement(X)
+            if limit: v.memory_limit = limit
+            # Two manipulations reading the same chromosomes in turns #
+            A, B = complement(v), complement(v)
+            for chrom in A:
+                both = zip(A.read(chrom), B.read(chrom))
+                self.assertEqual(both, zip(expected[chrom], expected[chrom]))
+                self.assertEqual(list(v.read(chrom)), list(v.read(chrom)))
+            paths = [m.path for m in v.memos.values() if m.path]
+            self.assertEqual(bool(paths), bool(limit))
+            v.close()
+            self.assertFalse(any(os.path.exists(p) for p in paths))
+            self.assertRaises(Exception, v.read, 'chrI')
+        # Features read back from disk keep their types and unread chromosomes can be released #
+        v = VirtualTrack(memory_limit=1)
+        v.write('chr1', iter([(0, 10, 'A'), (20, 30, u'B\xe9')]))
+        v.write('chr2', iter([(5, 15, 'C')]))
+        first = list(v.read('chr1'))
+        self.assertTrue(v.memos['chr1'].path)
+        self.assertEqual(list(v.read('chr1')), first)
+        self.assertEqual([map(type, f) for f in v.read('chr1')], [[int, int, str], [int, int, unicode]])
+        v.release('chr2')
+        self.assertEqual(v.chromosomes, ['chr1', 'chr2'])
+        self.assertRaises(Exception, v.read, 'chr2')
+        # A released chromosome can be written again #
+        v.write('chr2', iter([(6, 16, 'D')]))
+        self.assertEqual(list(v.read('chr2')), [(6, 16, 'D')])
+        v.close()
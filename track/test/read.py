@@ -3,11 +3,11 @@ Contains simple reading tests.
 """
 
 # Built-in modules #
-import os
+import os, sqlite3
 
 # Internal modules #
 import track
-from track.common import temporary_path
+from track.common import temporary_path, load_dump
 from track.test import samples
 
 # Unittesting module #
@@ -51,6 +51,38 @@ class TestWithoutName(unittest.TestCase):
         expected = (14, 19, u'', 0.0)
         self.assertEqual(got, expected)
 
+class TestStats(unittest.TestCase):
+    """Read the statistics stored with a track and use them"""
+    def runTest(self):
+        in_path = samples['small_features'][1]['bed']
+        out_path = temporary_path('.sql')
+        track.convert(in_path, out_path)
+        rows = [l for l in sqlite3.connect(out_path).iterdump() if 'statistics' in l]
+        self.assertEqual(rows, ['CREATE TABLE "statistics" ("chromosome" text, "value" text);',
+                                'INSERT INTO "statistics" VALUES(\'chr1\',\'{"count": 12, "max_end": 135, "max_score": 10.0,'
+                                ' "min_score": 0.0, "min_start": 0, "overlapping": true, "sorted": true}\');'])
+        self.assertFalse(any('statistics' in l for l in load_dump(out_path)))
+        with track.load(out_path, readonly=True) as t:
+            self.assertFalse(any(k.startswith('stats') for k in t.info))
+            self.assertEqual(t.chromosomes, ['chr1'])
+            self.assertEqual(t.stats('chr1'), {'count': 12, 'sorted': True, 'overlapping': True, 'min_start': 0,
+                                               'max_end': 135, 'min_score': 0.0, 'max_score': 10.0})
+            # Selections outside of the range give nothing without a query #
+            self.assertEqual(t.read({'chr':'chr1', 'score':(20, 30)}), ())
+            self.assertEqual(t.read({'chr':'chr1', 'start':135}), ())
+            self.assertEqual(t.read({'chr':'chr1', 'end':0}), ())
+            self.assertEqual(t.count({'chr':'chr1', 'score':(-5, -1)}), 0)
+            # Other selections are still queried #
+            got = sorted(f[3] for f in t.read({'chr':'chr1', 'score':(5, 20)}))
+            self.assertEqual(got, [5.0] + [10.0] * 8)
+            self.assertEqual(t.count({'chr':'chr1', 'start':130}), 1)
+        os.remove(out_path)
+        # Text placeholders are left out of the score range #
+        track.convert(samples['gtf_tracks'][2]['gtf'], out_path)
+        with track.load(out_path, readonly=True) as t:
+            self.assertEqual((t.stats('chr1')['min_score'], t.stats('chr1')['max_score']), (0.0, 0.0))
+        os.remove(out_path)
+
 #-----------------------------------#
 # This code was written by the BBCF #
 # http://bbcf.epfl.ch/              #
@@ -0,0 +1,89 @@
+"""
+Contains tests for sorting tracks externally.
+"""
+
+# Built-in modules #
+import os, random
+
+# Internal modules #
+import track
+from track.parse import get_parser
+from track.serialize import get_serializer
+from track.sorting import SortingSerializer, ExternalSorter
+from track.common import temporary_path
+
+# Unittesting module #
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+# Nosetest flag #
+__test__ = True
+
+###################################################################################
+def write_unsorted_bed(path):
+    features = [(chrom, start, start + random.randint(1, 50), 'f%i' % i)
+                for i, chrom in enumerate(['chr2', 'chr1', 'chrM'] * 100)
+                for start in [random.randint(0, 1000)]]
+    random.shuffle(features)
+    with open(path, 'w') as handle:
+        for f in features: handle.write('%s\t%i\t%i\t%s\n' % f)
+    return features
+
+class TestSortingSerializer(unittest.TestCase):
+    """Sort with runs spilled to disk"""
+    def runTest(self):
+        in_path, out_path = temporary_path('.bed'), temporary_path('.sql')
+        features = write_unsorted_bed(in_path)
+        parser = get_parser(in_path, 'bed')
+        serializer = SortingSerializer(get_serializer(out_path, 'sql'), run_size=7)
+        serializer(parser)
+        parser(serializer)
+        with track.load(out_path) as t:
+            for chrom in t:
+                data = map(tuple, t.read(chrom, fields=['start', 'end', 'name']))
+                self.assertEqual(data, sorted(data, key=lambda f: (f[0], f[1])))
+                self.assertEqual(sorted(data), sorted(f[1:] for f in features if f[0] == chrom))
+        os.remove(in_path)
+        os.remove(out_path)
+
+class TestSortInPlace(unittest.TestCase):
+    """Sort a text file in place"""
+    def runTest(self):
+        path = temporary_path('.bed')
+        features = write_unsorted_bed(path)
+        track.sort(path)
+        lines = [line.split('\t') for line in open(path) if not line.startswith('track')]
+        self.assertEqual(len(lines), len(features))
+        for chrom in ('chr1', 'chr2', 'chrM'):
+            starts = [(int(l[1]), int(l[2])) for l in lines if l[0] == chrom]
+            self.assertEqual(starts, sorted(starts))
+        os.remove(path)
+
+class TestFanIn(unittest.TestCase):
+    """Merge the runs a few at a time"""
+    def runTest(self):
+        features = [(random.randint(0, 1000), i) for i in xrange(500)]
+        sorter = ExternalSorter(key=lambda f: f[0], run_size=2, fan_in=3)
+        most_runs = 0
+        for f in features:
+            sorter.add('chr1', f)
+            most_runs = max(most_runs, len(sorter.runs))
+        self.assertTrue(most_runs <= 2 * 6)
+        self.assertEqual(list(sorter.read('chr1')), sorted(features, key=lambda f: f[0]))
+        sorter.close()
+
+class TestLoadSorted(unittest.TestCase):
+    """Sorting is refused when loading an SQL track"""
+    def runTest(self):
+        path = temporary_path('.sql')
+        with track.new(path) as t: t.write('chr1', [(10, 20, 'A', 0.0, 1)])
+        self.assertRaises(Exception, track.load, path, sort=True)
+        os.remove(path)
+
+#-----------------------------------#
+# This code was written by the BBCF #
+# http://bbcf.epfl.ch/              #
+# webmaster.bbcf@epfl.ch            #
+#-----------------------------------#
@@ -47,6 +47,169 @@ class TestMissingFields(unittest.TestCase):
         self.assertEqual(got, expected)
         os.remove(out_path)
 
+#---------------------------------------------------------------------------------#
+class TestStats(unittest.TestCase):
+    """Statistics are stored on save and forgotten on change"""
+    def runTest(self):
+        path = temporary_path('.sql')
+        with track.new(path) as t:
+            t.fields = ['start', 'end', 'score']
+            t.write('chr1', [(0, 10, 1.0), (10, 20, 3.0), (30, 40, -2.0)])
+            t.write('chr2', [(5, 10, 1.0), (0, 30, 2.0), (8, 9, 2.0)])
+        with track.load(path) as t:
+            self.assertEqual(t.stats('chr1'), {'count': 3, 'sorted': True, 'overlapping': False, 'min_start': 0,
+                                               'max_end': 40, 'min_score': -2.0, 'max_score': 3.0})
+            self.assertFalse(t.is_sorted('chr2'))
+            self.assertTrue(t.is_overlapping('chr2'))
+            self.assertEqual(t.count('chr1'), 3)
+            self.assertEqual([tuple(f) for f in t.read('chr1', order='start')], [(0, 10, 1.0), (10, 20, 3.0), (30, 40, -2.0)])
+            self.assertEqual([tuple(f) for f in t.read('chr2', order='start')], [(0, 30, 2.0), (5, 10, 1.0), (8, 9, 2.0)])
+            # Whatever index is used, the rows come in the order of the table #
+            self.assertEqual([tuple(f) for f in t.read('chr1', ['score'], order='start')], [(1.0,), (3.0,), (-2.0,)])
+            self.assertFalse('stats:chr1' in t.info)
+            self.assertTrue('statistics' in t.tables)
+            self.assertFalse('statistics' in t.chromosomes)
+            t.insert('chr1', (5, 6, 0.0))
+            self.assertEqual(t.stats('chr1'), {})
+            self.assertEqual(t.count('chr1'), 4)
+            t.rename('chr2', 'chr3')
+        with track.load(path) as t:
+            self.assertFalse(t.is_sorted('chr1'))
+            self.assertTrue(t.is_overlapping('chr1'))
+            self.assertEqual(t.stats('chr3')['count'], 3)
+            # Shifting the starts forgets the statistics #
+            t.ensembl_to_ucsc()
+            self.assertEqual(t.stats('chr1'), {})
+            self.assertEqual(t.count({'chr':'chr1', 'start':-5, 'end':0}), 1)
+        with track.load(path) as t:
+            self.assertEqual(t.stats('chr1')['min_start'], -1)
+            self.assertTrue(t.is_overlapping('chr1'))
+        os.remove(path)
+
+#---------------------------------------------------------------------------------#
+class TestClustered(unittest.TestCase):
+    """Tables of the clustered layout are kept ordered"""
+    def runTest(self):
+        path = temporary_path('.sql')
+        with track.new(path) as t:
+            t.layout = 'clustered'
+            t.fields = ['start', 'end', 'name']
+            t.write('chr1', [(30, 40, 'C'), (0, 10, 'A'), (30, 40, 'D'), (5, 50, 'B')])
+            t.insert('chr1', (0, 10, 'E'))
+        with track.load(path) as t:
+            self.assertEqual(t.layout, 'clustered')
+            self.assertEqual(t.fields, ['start', 'end', 'name'])
+            self.assertEqual([tuple(f) for f in t.read('chr1')], [(0, 10, 'A'), (0, 10, 'E'), (5, 50, 'B'), (30, 40, 'C'), (30, 40, 'D')])
+            self.assertEqual([tuple(f) for f in t.read({'chr':'chr1', 'start':20, 'end':35})], [(5, 50, 'B'), (30, 40, 'C'), (30, 40, 'D')])
+            self.assertEqual([tuple(f) for f in t.read('chr1', order=None)][:2], [(0, 10, 'A'), (0, 10, 'E')])
+            self.assertTrue(t.is_sorted('chr1'))
+            self.assertTrue(t.is_overlapping('chr1'))
+            self.assertFalse('chr1_range_idx' in [x[0] for x in t.cursor().execute("select name from sqlite_master where type='index'")])
+            t.delete_fields(['name'])
+            t.write('chr1', [(1, 2)])
+            self.assertEqual([tuple(f) for f in t.read('chr1')], [(0, 10), (0, 10), (1, 2), (5, 50), (30, 40), (30, 40)])
+        os.remove(path)
+        # Through a conversion #
+        in_path = samples['small_features'][1]['bed']
+        path, ref_path = temporary_path('.sql'), temporary_path('.sql')
+        track.convert(in_path, path, layout='clustered')
+        track.convert(in_path, ref_path)
+        with track.load(path) as t:
+            with track.load(ref_path) as ref:
+                self.assertEqual(t.layout, 'clustered')
+                self.assertEqual(t.chromosomes, ref.chromosomes)
+                for chrom in ref:
+                    self.assertEqual([tuple(f) for f in t.read(chrom)], [tuple(f) for f in ref.read(chrom, order='start,end')])
+        os.remove(path)
+        os.remove(ref_path)
+
+###################################################################################
+class TestBlocks(unittest.TestCase):
+    """Signal stored with the blocks layout reads back the same"""
+    def runTest(self):
+        path = temporary_path('.sql')
+        with track.new(path) as t:
+            t.layout = 'blocks'
+            t.fields = ['start', 'end', 'score']
+            t.write('chr1', [(0, 10, 1.5), (10, 20, 2.0), (30, 45, 0.25)])
+            t.insert('chr1', (50, 60, 4.0))
+        with track.load(path) as t:
+            self.assertEqual(t.layout, 'blocks')
+            self.assertEqual(t.fields, ['start', 'end', 'score'])
+            self.assertEqual(t.count('chr1'), 4)
+            self.assertEqual([tuple(f) for f in t.read('chr1')], [(0, 10, 1.5), (10, 20, 2.0), (30, 45, 0.25), (50, 60, 4.0)])
+            self.assertEqual([tuple(f) for f in t.read({'chr':'chr1', 'start':15, 'end':35}, ['start', 'name'])], [(10, ''), (30, '')])
+            self.assertEqual(list(t.get_partial_score_vector('chr1', 5, 15)), [1.5]*5 + [2.0]*5)
+            self.assertRaises(Exception, t.delete_fields, ['score'])
+            self.assertRaises(Exception, t.ucsc_to_ensembl)
+            self.assertRaises(Exception, t.write, 'chr2', [(0, 10, 1.0), (10, 20, None)])
+        with track.load(path) as t:
+            self.assertTrue(t.is_sorted('chr1'))
+            # The order recorded at the last save is used without scanning the blocks #
+            t._blocks_in_order = None
+            self.assertEqual([f[0] for f in t.read('chr1', order='start')], [0, 10, 30, 50])
+        os.remove(path)
+        # Blocks written out of order #
+        path = temporary_path('.sql')
+        with track.new(path) as t:
+            t.layout = 'blocks'
+            t.fields = ['start', 'end', 'score']
+            t.write('chr1', [(20, 30, 1.0), (40, 50, 2.0)])
+            t.write('chr1', [(0, 10, 3.0), (35, 38, 4.0)])
+            self.assertEqual([f[0] for f in t.read('chr1', order='start')], [0, 20, 35, 40])
+        with track.load(path) as t:
+            self.assertFalse(t.is_sorted('chr1'))
+            self.assertEqual([f[0] for f in t.read('chr1', order='start,end')], [0, 20, 35, 40])
+            self.assertEqual([f[0] for f in t.read({'chr':'chr1', 'start':25}, order='start')], [20, 35, 40])
+        os.remove(path)
+        # Through a conversion #
+        in_path = samples['rand_signals']['Pol2']['sql']
+        path = temporary_path('.sql')
+        track.convert(in_path, path, layout='blocks')
+        with track.load(path) as t:
+            with track.load(in_path) as ref:
+                self.assertEqual(t.chromosomes, ref.chromosomes)
+                for chrom in ref:
+                    got, expected = list(t.read(chrom)), list(ref.read(chrom, order='start,end'))
+                    self.assertEqual([f[:2] for f in got], [tuple(f[:2]) for f in expected])
+                    for a, b in zip(got, expected): self.assertAlmostEqual(a[2], b[2], delta=abs(b[2])*1e-6)
+        self.assertTrue(os.path.getsize(path) < os.path.getsize(in_path))
+        os.remove(path)
+
+###################################################################################
+class TestEncoded(unittest.TestCase):
+    """Dictionary encoded fields read back the same"""
+    def runTest(self):
+        path = temporary_path('.sql')
+        with track.new(path) as t:
+            t.encoded_fields = ['name']
+            t.fields = ['start', 'end', 'name', 'score']
+            t.write('chr1', [(0, 10, 'A', 1.0), (5, 20, 'B', 2.0), (30, 40, 'A', 3.0)])
+            t.insert('chr1', (50, 60, 'C', 0.5))
+            self.assertRaises(Exception, setattr, t, 'encoded_fields', ['source'])
+        with track.load(path) as t:
+            self.assertEqual(t.encoded_fields, ['name'])
+            self.assertEqual([tuple(f) for f in t.read('chr1')], [(0, 10, 'A', 1.0), (5, 20, 'B', 2.0), (30, 40, 'A', 3.0), (50, 60, 'C', 0.5)])
+            self.assertEqual([tuple(f) for f in t.read({'chr':'chr1', 'start':8, 'end':35}, ['name', 'start'], order='name,start')], [('A', 0), ('A', 30), ('B', 5)])
+            self.assertEqual([tuple(f) for f in t.read('chr1', ['name'], order='start')], [('A',), ('B',), ('A',), ('C',)])
+            self.assertEqual([x[0] for x in t.cursor().execute("select name from chr1 order by rowid")], [0, 1, 0, 2])
+            self.assertEqual([tuple(f) for f in t.search({'name':'A'}, exact_match=True)], [('chr1', 0, 10, 'A', 1.0), ('chr1', 30, 40, 'A', 3.0)])
+            self.assertEqual([tuple(f) for f in t.search({'name':'B'})], [('chr1', 5, 20, 'B', 2.0)])
+            self.assertEqual(list(t.search({'name':'D'}, exact_match=True)), [])
+        os.remove(path)
+        # Through a conversion #
+        in_path = samples['gtf_tracks'][1]['gtf']
+        path, ref_path = temporary_path('.sql'), temporary_path('.sql')
+        track.convert(in_path, path, encode=True)
+        track.convert(in_path, ref_path)
+        with track.load(path) as t:
+            with track.load(ref_path) as ref:
+                self.assertEqual(t.fields, ref.fields)
+                for chrom in ref:
+                    self.assertEqual([tuple(f) for f in t.read(chrom)], [tuple(f) for f in ref.read(chrom)])
+        os.remove(path)
+        os.remove(ref_path)
+
 #-----------------------------------#
 # This code was written by the BBCF #
 # http://bbcf.epfl.ch/              #
@@ -3,10 +3,11 @@ Useful stuff for the track package.
 """
 
 # Built-in modules #
-import os, shlex
+import os, re, shlex, urllib
 
 # Internal modules #
 from track.common import temporary_path, iterate_lines
+from track.pyrow import SuperRow
 
 ###############################################################################
 # Constants #
@@ -44,10 +45,15 @@ py_field_types  = {'start':        int,
                    'length':       int,
                    'attributes':   str,}
 
+gff_notation_regex = re.compile(r'\s*[^\s;="]+\s*=')
+attribute_regex = re.compile(r'([^\s;="]+)(?:\s*=\s*|\s+)(?:"([^"]*)"|([^;]*?))\s*(?:;|$)')
+
 format_synonyms = {'db': 'sql',
                    'bw': 'bigwig',
                    'bwg': 'bigwig',
-                   'wiggle_0': 'wig',}
+                   'wiggle_0': 'wig',
+                   'ipc': 'arrow',
+                   'pq': 'parquet',}
 
 ###############################################################################
 def determine_format(path):
@@ -75,7 +81,13 @@ def guess_file_format(handle):
     """Try to guess the format of a track given its content.
        Returns a three letter extension."""
     # Check SQLite #
-    if handle.read(15) == "SQLite format 3": return 'sql'
+    header = handle.read(15)
+    if header == "SQLite format 3": return 'sql'
+    # Check columnar #
+    if header.startswith("TRKCOL"): return 'columns'
+    # Check Arrow and Parquet #
+    if header.startswith("ARROW1"): return 'arrow'
+    if header.startswith("PAR1"):   return 'parquet'
     handle.seek(0)
     # Try to read the track line #
     for number, line in enumerate(handle):
@@ -195,6 +207,14 @@ def make_cond_from_sel(selection):
         query += 'score >= ' + str(selection['score'][0]) + ' and score <= ' + str(selection['score'][1])
     return query
 
+################################################################################
+def check_neighborhood(before_start=0, after_end=0, after_start=0, before_end=0):
+    """Raises an exception if the bounds of a neighborhood are inverted, see the *neighborhood* manipulation"""
+    if before_start and after_start and before_start > after_start:
+        raise Exception("'before_start' cannot be larger than 'after_start'")
+    if before_end and after_end and before_end > after_end:
+        raise Exception("'before_end' cannot be larger than 'after_end'")
+
 ################################################################################
 def strand_to_int(strand):
     if strand == '+': return 1
@@ -207,6 +227,101 @@ def int_to_strand(num):
     if num == -1: return '-'
     return '.'
 
+################################################################################
+def parse_attributes(text):
+    """
+    Split the content of a GTF or GFF attribute column into a list of
+    key and value pairs, preserving their order. Both the ``key "value";``
+    and the ``key=value;`` notations are understood.
+
+    ::
+
+        >>> parse_attributes('gene_id "001"; transcript_id "001.1"; exon_number 2;')
+        [('gene_id', '001'), ('transcript_id', '001.1'), ('exon_number', '2')]
+        >>> parse_attributes('gene_id "A; B"; note "";')
+        [('gene_id', 'A; B'), ('note', '')]
+        >>> parse_attributes('ID=gene1;Name=ABC 1')
+        [('ID', 'gene1'), ('Name', 'ABC 1')]
+    """
+    return [(k, v or w) for k, v, w in attribute_regex.findall(text)]
+
+def attributes_dict(pairs, separator=','):
+    """
+    Make a dictionary out of the key and value pairs returned by
+    `parse_attributes`. Keys that are repeated, such as the ``tag`` of
+    GENCODE files, get all their values joined by *separator*.
+
+    ::
+
+        >>> attributes_dict([('tag', 'basic'), ('gene_id', '001'), ('tag', 'CCDS')]) == {'gene_id': '001', 'tag': 'basic,CCDS'}
+        True
+    """
+    result = {}
+    for key, value in pairs:
+        if key in result: result[key] += separator + value
+        else:             result[key] = value
+    return result
+
+def gtf_attributes(text):
+    """
+    Writes the content of an attribute column in the GTF notation. Text in
+    the GFF ``key=value;`` notation is re-encoded, with its escaped characters
+    decoded, while text already in the GTF notation is returned unchanged.
+
+    ::
+
+        >>> gtf_attributes('ID=gene1;Name=ABC%3B 1')
+        'ID "gene1"; Name "ABC; 1";'
+        >>> gtf_attributes('gene_id "001"; exon_number 2;')
+        'gene_id "001"; exon_number 2;'
+    """
+    if not text or not gff_notation_regex.match(text): return text or ''
+    return ' '.join(['%s "%s";' % (k, urllib.unquote(v)) for k, v in parse_attributes(text)])
+
+class LazyAttributes(object):
+    """
+    A read-only dictionary built on top of the raw text of an attribute
+    column. The text is only decoded the first time a key is requested.
+    Use it like this::
+
+        >>> attrs = LazyAttributes('gene_id "001"; exon_number 2;')
+        >>> attrs['exon_number']
+        '2'
+        >>> attrs.get('gene_name', 'unknown')
+        'unknown'
+    """
+
+    def __init__(self, text):
+        self.text = text or ''
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None: self._data = attributes_dict(parse_attributes(self.text))
+        return self._data
+
+    def __getitem__(self, key): return self.data[key]
+    def __contains__(self, key): return key in self.data
+    def __iter__(self): return iter(self.data)
+    def __len__(self): return len(self.data)
+    def __repr__(self): return "LazyAttributes on '%s'" % self.text
+    def get(self, key, d=None): return self.data.get(key, d)
+    def keys(self): return self.data.keys()
+    def items(self): return self.data.items()
+
+class AttributeRow(SuperRow):
+    """
+    The rows read from a chromosome having an ``attributes`` column. Their
+    ``attrs`` property decodes that column on demand, see `LazyAttributes`::
+
+        import track
+        with track.load('tracks/genes.sql') as t:
+            for row in t.read('chr1'): print row['gene_id'], row.attrs.get('gene_name')
+    """
+
+    @property
+    def attrs(self): return LazyAttributes(self['attributes'])
+
 ################################################################################
 def floats_eq(a,b, epsilon=0.000001):
     """